@@ -0,0 +1,70 @@
+"""
+Checks each sentiment backend's labels and throughput against the reference PyTorch backend.
+
+Run from the repository root:
+    python -m benchmarks.backend_agreement --sample-size 1000 --backends quantized onnx
+"""
+
+import argparse
+
+from src.models.sentiment_backends import check_label_agreement
+from src.processing.preprocess import (
+    combine_csv_data,
+    get_csv_files,
+    remove_twitter_links,
+)
+from src.processing.sentiment_analysis import load_sentiment_backend
+from src.resources.settings import BACKEND_NAMES, REFERENCE_BACKEND
+
+
+def load_held_out_sample(sample_size: int, seed: int):
+    """
+    Samples tweet texts from the data/raw corpus with a fixed seed.
+    """
+    data_frame = combine_csv_data(get_csv_files())
+    texts = remove_twitter_links(data_frame["text"].dropna()).drop_duplicates()
+    return texts.sample(n=min(sample_size, len(texts)), random_state=seed).tolist()
+
+
+def main():
+    """
+    Main function.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sample-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=[name for name in BACKEND_NAMES if name != REFERENCE_BACKEND],
+        default=[name for name in BACKEND_NAMES if name != REFERENCE_BACKEND],
+    )
+    parser.add_argument(
+        "--min-agreement",
+        type=float,
+        default=0.95,
+        help="exit with an error when a backend agrees less often than this",
+    )
+    args = parser.parse_args()
+
+    texts = load_held_out_sample(args.sample_size, args.seed)
+    reference = load_sentiment_backend(REFERENCE_BACKEND)
+
+    failed = []
+    for name in args.backends:
+        report = check_label_agreement(load_sentiment_backend(name), reference, texts)
+        print(
+            f"{report.backend}: {report.agreement:.2%} label agreement with "
+            f"{report.reference} on {report.sample_size} tweets, "
+            f"{report.tweets_per_second:.1f} vs {report.reference_tweets_per_second:.1f} "
+            f"tweets/sec ({report.tweets_per_second / report.reference_tweets_per_second:.2f}x)"
+        )
+        if report.agreement < args.min_agreement:
+            failed.append(name)
+
+    if failed:
+        raise SystemExit(f"Backends below {args.min_agreement:.0%} agreement: {failed}")
+
+
+if __name__ == "__main__":
+    main()
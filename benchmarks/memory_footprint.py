@@ -0,0 +1,51 @@
+"""
+Reports the memory footprint of the raw tweets read untyped with every column
+against the typed, pruned frame the pipeline ingests.
+
+Run from the repository root:
+    python -m benchmarks.memory_footprint
+"""
+
+import argparse
+
+import pandas as pd
+
+from src.processing.preprocess import combine_csv_data, get_csv_files
+from src.processing.schema import get_memory_report
+
+
+def read_untyped(csv_files) -> pd.DataFrame:
+    """
+    Reads every column of the csv files with pandas' default dtypes.
+    """
+    return pd.concat(
+        [pd.read_csv(csv_file, encoding_errors="ignore") for csv_file in csv_files],
+        ignore_index=True,
+    )
+
+
+def main():
+    """
+    Main function.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--output", default=None, help="also write the per-column report to this csv file"
+    )
+    args = parser.parse_args()
+
+    csv_files = get_csv_files()
+    report = get_memory_report(
+        {"untyped": read_untyped(csv_files), "typed": combine_csv_data(csv_files)}
+    )
+    if args.output:
+        report.to_csv(args.output)
+
+    with pd.option_context("display.max_rows", None):
+        print(report)
+    before, after = report.loc["total", "untyped"], report.loc["total", "typed"]
+    print(f"\n{before / 2**20:.1f} MiB -> {after / 2**20:.1f} MiB ({before / after:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Times every pipeline stage over synthetic corpora of growing size and saves the results as JSON.
+
+Sentiment runs a stub model that labels tweets by a hash of their text, so the suite runs
+offline on CPU without torch; its timings cover batching, caching and result assembly,
+not inference. Each size runs in its own working directory holding data/raw, starting from
+no cached sentiment connection, distilled model or open figure.
+
+The plot stage times plot_data as it is: it draws each company's bars onto the current figure
+without clearing it, so later companies also redraw every earlier company's bars and the stage
+grows with the number of companies rather than with the corpus size.
+
+Run from the repository root:
+    python -m benchmarks.pipeline_scaling --sizes 10000,100000 --output results.json
+    python -m benchmarks.pipeline_scaling --sizes 10000 --compare results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+from unittest import mock
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_corpus import add_corpus_arguments, get_corpus_spec, write_corpus
+from src.processing import sentiment_analysis
+from src.processing.instrumentation import RunReport, get_peak_rss_mb, run_report
+from src.processing.sentiment_analysis import SENTIMENT_LABELS
+from src.resources.settings import settings
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+DEFAULT_WORKDIR = Path("data/benchmarks")
+# stages compared between result files, in pipeline order
+STAGES = ["ingest", "filter", "sentiment", "rollup", "themes", "plot"]
+
+
+@dataclass
+class StubDevice:
+    """
+    Stands in for torch.device on the CPU.
+    """
+
+    type: str = "cpu"
+
+
+class StubTokenizer:
+    """
+    Counts whitespace-separated words plus the two special tokens as the token length.
+    """
+
+    def __call__(self, texts: List[str], truncation: bool = True, max_length: int = 512):
+        lengths = (min(len(text.split()) + 2, max_length) for text in texts)
+        return {"input_ids": [range(length) for length in lengths]}
+
+
+class StubSentimentModel:
+    """
+    Labels a text by a stable hash of it, with the interface of the sentiment backends.
+    """
+
+    name = "stub"
+
+    def __init__(self):
+        self.device = StubDevice()
+        self.tokenizer = StubTokenizer()
+
+    def __call__(self, texts: List[str]) -> List[Tuple[str, float]]:
+        hashes = [zlib.crc32(text.encode("utf-8")) for text in texts]
+        return [
+            (SENTIMENT_LABELS[text_hash % len(SENTIMENT_LABELS)], 0.5 + (text_hash % 500) / 1000)
+            for text_hash in hashes
+        ]
+
+
+@contextmanager
+def working_directory(path: Path) -> Iterator[None]:
+    """
+    Runs the enclosed block with path as the working directory, as the pipeline uses relative paths.
+    """
+    previous = Path.cwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def reset_process_state():
+    """
+    Drops what the pipeline keeps for the rest of the process: the sentiment cache connection
+    and distilled model, which were opened under the previous size's working directory,
+    and the figures plot_data drew on.
+    """
+    if sentiment_analysis.get_sentiment_cache.cache_info().currsize:
+        sentiment_analysis.get_sentiment_cache().close()
+    sentiment_analysis.get_sentiment_cache.cache_clear()
+    sentiment_analysis.load_distilled_model.cache_clear()
+    plt.close("all")
+
+
+def run_pipeline(jobs: int) -> RunReport:
+    """
+    Runs every stage over data/raw of the working directory and returns their records.
+    """
+    # pylint: disable=import-outside-toplevel
+    from src.processing.preprocess import preprocess_data
+    from src.processing.theme_analyzer import run_theme_analysis
+    from src.visualization.top_words_and_bigrams import plot_data_main
+
+    first_record = len(run_report.records)
+    company_data_frame_list = preprocess_data()
+    run_theme_analysis(company_data_frame_list, jobs=jobs)
+    plot_data_main()
+
+    report = RunReport()
+    report.records = run_report.records[first_record:]
+    return report
+
+
+def run_size(rows: int, args: argparse.Namespace) -> dict:
+    """
+    Generates the corpus of one size, runs the pipeline over it and returns the timings.
+    """
+    directory = (args.workdir / f"rows_{rows}").resolve()
+    spec = get_corpus_spec(rows, args)
+    start = time.perf_counter()
+    write_corpus(spec, directory / "data" / "raw")
+    generation_seconds = time.perf_counter() - start
+
+    # outputs and the sentiment cache of earlier runs would turn this into an incremental run
+    for output_directory in ["processed", "cache"]:
+        shutil.rmtree(directory / "data" / output_directory, ignore_errors=True)
+    (directory / "data" / "processed" / "companies").mkdir(parents=True)
+    reset_process_state()
+
+    with working_directory(directory), mock.patch.object(
+        sentiment_analysis, "get_sentiment_analyzer", return_value=StubSentimentModel()
+    ):
+        start = time.perf_counter()
+        report = run_pipeline(args.jobs)
+        wall_seconds = time.perf_counter() - start
+
+    return {
+        "rows": rows,
+        "corpus": asdict(spec),
+        "generation_seconds": round(generation_seconds, 3),
+        "wall_seconds": round(wall_seconds, 3),
+        "peak_rss_mb": get_peak_rss_mb(),
+        "summary": report.summary(),
+        "stages": [record.to_dict() for record in report.records],
+    }
+
+
+def get_environment() -> dict:
+    """
+    Describes the commit and machine the results come from.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare_results(baseline: dict, results: dict) -> pd.DataFrame:
+    """
+    Returns the wall seconds of every stage and size in both result files and their ratio.
+    """
+    rows = []
+    baseline_sizes = {size["rows"]: size for size in baseline["sizes"]}
+    for size in results["sizes"]:
+        if size["rows"] not in baseline_sizes:
+            continue
+        baseline_summary = baseline_sizes[size["rows"]]["summary"]
+        for stage in STAGES + ["total"]:
+            if stage == "total":
+                before = baseline_sizes[size["rows"]]["wall_seconds"]
+                after = size["wall_seconds"]
+            elif stage in size["summary"] and stage in baseline_summary:
+                before = baseline_summary[stage]["wall_seconds"]
+                after = size["summary"][stage]["wall_seconds"]
+            else:
+                continue
+            rows.append(
+                {
+                    "rows": size["rows"],
+                    "stage": stage,
+                    "baseline_seconds": before,
+                    "seconds": after,
+                    "ratio": round(after / before, 3) if before else None,
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def print_summary(size: dict):
+    """
+    Prints the wall time and throughput of each stage for one size.
+    """
+    print(f"\n{size['rows']} rows, {size['wall_seconds']:.2f}s, peak {size['peak_rss_mb']:.0f} MiB")
+    for stage in STAGES:
+        totals = size["summary"].get(stage)
+        if totals is None:
+            continue
+        rows_in = totals["rows_in"]
+        rate = rows_in / totals["wall_seconds"] if totals["wall_seconds"] else 0.0
+        print(
+            f"  {stage:<10} {totals['wall_seconds']:>9.3f}s {rows_in:>10} rows in"
+            f" {rate:>12.0f} rows/s"
+        )
+
+
+def main():
+    """
+    Main function.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=DEFAULT_SIZES,
+        help="comma-separated corpus sizes in rows (default: 10k to 10M)",
+    )
+    parser.add_argument(
+        "--workdir",
+        type=Path,
+        default=DEFAULT_WORKDIR,
+        help="where corpora and outputs are kept, corpora are reused (default: %(default)s)",
+    )
+    parser.add_argument("--output", type=Path, default=None, help="JSON file of the results")
+    parser.add_argument(
+        "--compare", type=Path, default=None, help="JSON results of an earlier run to compare to"
+    )
+    parser.add_argument("--jobs", type=int, default=1, help="theme analysis processes")
+    parser.add_argument("--workers", type=int, default=1, help="sentiment processes")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    settings.workers = args.workers
+    settings.jobs = args.jobs
+    results: Dict[str, object] = {"environment": get_environment(), "sizes": []}
+    for rows in args.sizes:
+        size = run_size(rows, args)
+        results["sizes"].append(size)
+        print_summary(size)
+        if args.output:
+            # rewritten after every size so a long run keeps what finished
+            args.output.parent.mkdir(parents=True, exist_ok=True)
+            args.output.write_text(json.dumps(results, indent=2, default=str), encoding="utf-8")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        print(f"\nagainst {baseline['environment'].get('commit')}:")
+        print(compare_results(baseline, results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
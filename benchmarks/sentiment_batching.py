@@ -0,0 +1,87 @@
+"""
+Compares sentiment throughput of fixed-size batches against length-bucketed batches.
+
+Run from the repository root:
+    python -m benchmarks.sentiment_batching --limit 2000
+"""
+
+import argparse
+import time
+
+from src.processing.batching import (
+    DEFAULT_MAX_BATCH_TOKENS,
+    fixed_size_batches,
+    get_token_lengths,
+    padding_efficiency,
+    token_budget_batches,
+)
+from src.processing.preprocess import (
+    combine_csv_data,
+    get_csv_files,
+    remove_twitter_links,
+)
+from src.processing.sentiment_analysis import get_sentiment_analyzer, score_texts
+
+
+def load_texts(limit: int, seed: int):
+    """
+    Samples tweet texts from the data/raw corpus with twitter links removed.
+    """
+    data_frame = combine_csv_data(get_csv_files())
+    texts = remove_twitter_links(data_frame["text"].dropna())
+    if limit and limit < len(texts):
+        texts = texts.sample(n=limit, random_state=seed)
+    return texts.tolist()
+
+
+def time_scoring(texts, bucket_by_length: bool, batch_size: int, max_batch_tokens: int):
+    """
+    Returns the tweets per second of one scoring run.
+    """
+    start = time.perf_counter()
+    score_texts(
+        texts,
+        max_batch_size=batch_size,
+        max_batch_tokens=max_batch_tokens,
+        bucket_by_length=bucket_by_length,
+    )
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    """
+    Main function.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--limit", type=int, default=2000, help="tweets to score, 0 for all")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixed-batch-size", type=int, default=50)
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    parser.add_argument("--max-batch-tokens", type=int, default=DEFAULT_MAX_BATCH_TOKENS)
+    args = parser.parse_args()
+
+    texts = load_texts(args.limit, args.seed)
+    lengths = get_token_lengths(texts, get_sentiment_analyzer().tokenizer)
+    fixed = fixed_size_batches(len(texts), args.fixed_batch_size)
+    bucketed = token_budget_batches(lengths, args.max_batch_tokens, args.max_batch_size)
+
+    # warm up so the first run does not pay for lazy initialization
+    score_texts(texts[:8])
+
+    fixed_rate = time_scoring(texts, False, args.fixed_batch_size, args.max_batch_tokens)
+    bucketed_rate = time_scoring(texts, True, args.max_batch_size, args.max_batch_tokens)
+
+    print(f"tweets: {len(texts)}, mean tokens: {lengths.mean():.1f}")
+    print(
+        f"fixed batches of {args.fixed_batch_size}: {fixed_rate:.1f} tweets/sec, "
+        f"padding efficiency {padding_efficiency(lengths, fixed):.1%}"
+    )
+    print(
+        f"length-bucketed, {args.max_batch_tokens} token budget: {bucketed_rate:.1f} tweets/sec, "
+        f"padding efficiency {padding_efficiency(lengths, bucketed):.1%}"
+    )
+    print(f"speedup: {bucketed_rate / fixed_rate:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Measures how long main.py stages take to start, and checks that stages without
+the model never import torch or transformers.
+
+Run from the repository root:
+    python -m benchmarks.startup_time --repeat 5
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# modules each stage imports before doing any work
+STAGE_MODULES = {
+    "cli": ["main"],
+    "themes": [
+        "main",
+        "src.processing.storage",
+        "src.processing.theme_analyzer",
+    ],
+    "plot": ["main", "src.visualization.top_words_and_bigrams"],
+}
+
+HEAVY_MODULES = ["torch", "transformers"]
+
+
+def time_stage_startup(modules, repeat: int):
+    """
+    Returns the median startup time of a fresh interpreter importing modules,
+    and the heavy modules it pulled in.
+    """
+    code = (
+        "import sys\n"
+        + "".join(f"import {module}\n" for module in modules)
+        + f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    timings = []
+    loaded = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        timings.append(time.perf_counter() - start)
+        loaded = output.stdout.strip()
+    return statistics.median(timings), loaded
+
+
+def main():
+    """
+    Main function.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    for stage, modules in STAGE_MODULES.items():
+        seconds, loaded = time_stage_startup(modules, args.repeat)
+        print(f"{stage}: {seconds:.3f}s to start, heavy modules loaded: {loaded or 'none'}")
+        failed = failed or bool(loaded)
+
+    if failed:
+        raise SystemExit("A stage that does not need the model imported torch or transformers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Generates synthetic tweet csv files in the data/raw schema.
+
+Run from the repository root:
+    python -m benchmarks.synthetic_corpus --rows 100000 --output /tmp/corpus/data/raw
+"""
+
+import argparse
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.resources.brands_data import brands
+from src.resources.word_lists import food_related_keywords, yogurt_keywords
+
+# every column of the raw csv files, in their order
+RAW_COLUMNS = [
+    "Key",
+    "text",
+    "lang",
+    "created_at",
+    "created_day",
+    "timeonly",
+    "created_dateonly",
+    "datetime",
+    "retweet_count",
+    "coordinates",
+    "geo",
+    "place",
+    "retweeted",
+    "truncated",
+    "user_favourites_count",
+    "user_followers_count",
+    "user_following",
+    "user_friends_count",
+    "user_geo_enabled",
+    "user_listed_count",
+    "user_location",
+    "user_statuses_count",
+    "user_time_zone",
+    "user_screen_name",
+    "file",
+]
+
+# filler words, drawn with Zipf-like frequencies in this order so themes have a long tail
+# fmt: off
+FILLER_WORDS = [
+    "love", "today", "morning", "new", "just", "got", "good", "great", "really", "best",
+    "day", "time", "eat", "eating", "want", "need", "lunch", "fruit", "strawberry", "vanilla",
+    "honey", "blueberry", "peach", "coconut", "mango", "cup", "fridge", "store", "bought",
+    "tried", "favorite", "taste", "sweet", "sugar", "free", "organic", "milk", "plain", "whole",
+    "low", "fat", "greek", "gut", "health", "work", "gym", "after", "before", "week", "diet",
+    "kids", "family", "recipe", "smoothie", "granola", "bowl", "parfait", "oats", "berries",
+    "price", "sale", "coupon", "ad", "commercial", "launch", "flavour", "lemon", "cherry",
+    "chocolate", "oh", "wow", "lol", "omg", "yes", "never", "always", "again", "finally",
+    "thanks", "please", "amazing", "gross", "weird", "perfect", "addicted", "obsessed",
+    "craving", "tonight", "weekend", "summer", "winter", "run", "walk", "office", "school",
+]
+# fmt: on
+LANGUAGES = ["en", "es", "fr", "de", "und"]
+LANGUAGE_WEIGHTS = [0.9, 0.04, 0.03, 0.01, 0.02]
+LOCATIONS = ["", "New York, NY", "Los Angeles, CA", "London", "Toronto", "Chicago, IL", "USA"]
+TIME_ZONES = ["", "Eastern Time (US & Canada)", "Pacific Time (US & Canada)", "London"]
+# tweets are spread over this period
+START_TIMESTAMP = pd.Timestamp("2017-06-01")
+PERIOD_SECONDS = 60 * 24 * 3600
+DEFAULT_ROWS_PER_FILE = 500_000
+
+
+@dataclass
+class CorpusSpec:
+    """
+    Parameters of a synthetic corpus. The same spec and seed always give the same files.
+    """
+
+    rows: int
+    # relative weight of each brand key of brands among brand tweets, equal weights when empty
+    brand_mix: Dict[str, float] = field(default_factory=dict)
+    # fraction of tweets that mention a brand, the rest are unrelated
+    brand_rate: float = 0.6
+    # fraction of tweets that copy an earlier tweet, half of them with one word changed
+    duplicate_rate: float = 0.1
+    # mean words per tweet besides the brand mention
+    mean_words: float = 12.0
+    seed: int = 0
+    rows_per_file: int = DEFAULT_ROWS_PER_FILE
+
+    def get_brand_weights(self) -> np.ndarray:
+        """
+        Returns the normalized weight of every brand, in the order of brands.
+        """
+        unknown = set(self.brand_mix) - set(brands)
+        if unknown:
+            raise ValueError(f"Unknown brands {sorted(unknown)}, expected keys of brands")
+        weights = np.array(
+            [self.brand_mix.get(name, 0.0 if self.brand_mix else 1.0) for name in brands]
+        )
+        return weights / weights.sum()
+
+
+def get_brand_mentions() -> List[List[str]]:
+    """
+    Returns the ways each brand can be mentioned, in the order of brands.
+    """
+    return [
+        [
+            brand.brand_name,
+            brand.brand_name.lower(),
+            *brand.twitter_handles,
+            *brand.alternate_names,
+        ]
+        for brand in brands.values()
+    ]
+
+
+def generate_texts(spec: CorpusSpec, rows: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Returns the texts of rows tweets: Zipf-distributed filler words, a brand mention
+    in brand_rate of them, and copies of earlier tweets in duplicate_rate of them.
+    """
+    word_probabilities = 1 / np.arange(1, len(FILLER_WORDS) + 1)
+    word_probabilities /= word_probabilities.sum()
+    lengths = np.maximum(rng.poisson(spec.mean_words, rows), 1)
+    words = np.array(FILLER_WORDS, dtype=object)[
+        rng.choice(len(FILLER_WORDS), size=int(lengths.sum()), p=word_probabilities)
+    ]
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    texts = np.array(
+        [" ".join(words[offsets[row] : offsets[row + 1]]) for row in range(rows)], dtype=object
+    )
+
+    # brand tweets put a mention at a random word and often a yogurt or food keyword at the end
+    mentions = get_brand_mentions()
+    keywords = np.array(yogurt_keywords + food_related_keywords, dtype=object)
+    brand_rows = np.flatnonzero(rng.random(rows) < spec.brand_rate)
+    brand_codes = rng.choice(len(mentions), size=len(brand_rows), p=spec.get_brand_weights())
+    positions = rng.random(len(brand_rows))
+    brand_keywords = np.where(
+        rng.random(len(brand_rows)) < 0.5,
+        keywords[rng.integers(0, len(keywords), len(brand_rows))],
+        "",
+    )
+    for row, code, position, keyword in zip(brand_rows, brand_codes, positions, brand_keywords):
+        brand_mentions = mentions[code]
+        text_words = texts[row].split(" ")
+        text_words.insert(
+            int(position * len(text_words)), brand_mentions[rng.integers(len(brand_mentions))]
+        )
+        texts[row] = " ".join(text_words + [keyword]).strip()
+
+    # duplicates copy a random earlier tweet, near duplicates change its last word
+    duplicate_rows = np.flatnonzero(rng.random(rows) < spec.duplicate_rate)
+    duplicate_rows = duplicate_rows[duplicate_rows > 0]
+    sources = (rng.random(len(duplicate_rows)) * duplicate_rows).astype(np.int64)
+    near = rng.random(len(duplicate_rows)) < 0.5
+    for row, source, is_near in zip(duplicate_rows, sources, near):
+        text = texts[source]
+        if is_near:
+            text = f"{text} {FILLER_WORDS[rng.integers(len(FILLER_WORDS))]}"
+        texts[row] = text
+    return texts
+
+
+def generate_tweets(
+    spec: CorpusSpec, rows: int, first_key: int = 1, rng: Optional[np.random.Generator] = None
+) -> pd.DataFrame:
+    """
+    Returns rows synthetic tweets with every raw column, keyed from first_key.
+    """
+    if rng is None:
+        rng = np.random.default_rng(spec.seed)
+    timestamps = START_TIMESTAMP + pd.to_timedelta(
+        np.sort(rng.integers(0, PERIOD_SECONDS, rows)), unit="s"
+    )
+    timestamps = pd.Series(timestamps)
+    # month and day without leading zeros, like the raw files
+    date_only = (
+        timestamps.dt.month.astype(str)
+        + "/"
+        + timestamps.dt.day.astype(str)
+        + "/"
+        + timestamps.dt.year.astype(str)
+    )
+    retweet_count = rng.geometric(0.5, rows) - 1
+    companies = np.array(
+        [brand.brand_name.lower().replace(" ", "_") for brand in brands.values()], dtype=object
+    )
+    data_frame = pd.DataFrame(
+        {
+            "Key": np.arange(first_key, first_key + rows),
+            "text": generate_texts(spec, rows, rng),
+            "lang": rng.choice(LANGUAGES, size=rows, p=LANGUAGE_WEIGHTS),
+            "created_at": timestamps.dt.strftime("%a %b %d %H:%M:%S "),
+            "created_day": timestamps.dt.strftime("%a"),
+            "timeonly": timestamps.dt.strftime("%H:%M:%S"),
+            "created_dateonly": date_only,
+            "datetime": date_only + timestamps.dt.strftime(" %H:%M"),
+            "retweet_count": retweet_count,
+            "coordinates": "",
+            "geo": "",
+            "place": "",
+            "retweeted": np.where(retweet_count > 0, "TRUE", "FALSE"),
+            "truncated": np.where(rng.random(rows) < 0.05, "TRUE", "FALSE"),
+            "user_favourites_count": rng.geometric(1e-3, rows),
+            "user_followers_count": rng.lognormal(6, 2, rows).astype(np.int64),
+            "user_following": "FALSE",
+            "user_friends_count": rng.lognormal(5, 1.5, rows).astype(np.int64),
+            "user_geo_enabled": np.where(rng.random(rows) < 0.3, "TRUE", "FALSE"),
+            "user_listed_count": rng.geometric(0.05, rows),
+            "user_location": rng.choice(LOCATIONS, size=rows),
+            "user_statuses_count": rng.geometric(1e-4, rows),
+            "user_time_zone": rng.choice(TIME_ZONES, size=rows),
+            "user_screen_name": [
+                f"user{user}" for user in rng.integers(0, max(rows // 4, 1), rows)
+            ],
+            "file": [f"jsonfile_{company}.j" for company in rng.choice(companies, size=rows)],
+        },
+        columns=RAW_COLUMNS,
+    )
+    return data_frame
+
+
+def iter_corpus_files(spec: CorpusSpec) -> Iterator[pd.DataFrame]:
+    """
+    Yields the corpus in files of at most rows_per_file rows, each from its own seed.
+    """
+    for file_index, first_row in enumerate(range(0, spec.rows, spec.rows_per_file)):
+        rows = min(spec.rows_per_file, spec.rows - first_row)
+        rng = np.random.default_rng([spec.seed, file_index])
+        yield generate_tweets(spec, rows, first_key=first_row + 1, rng=rng)
+
+
+def write_corpus(spec: CorpusSpec, directory: Path) -> List[Path]:
+    """
+    Writes the corpus as csv files into directory along with a corpus.json of its spec,
+    reusing files already written there from the same spec.
+    """
+    spec_path = directory / "corpus.json"
+    csv_files = [
+        directory / f"synthetic_{file_index:04d}.csv"
+        for file_index in range(-(-spec.rows // spec.rows_per_file))
+    ]
+    if (
+        spec_path.exists()
+        and json.loads(spec_path.read_text(encoding="utf-8")) == asdict(spec)
+        and all(csv_file.exists() for csv_file in csv_files)
+    ):
+        return csv_files
+
+    directory.mkdir(parents=True, exist_ok=True)
+    for stale_file in directory.glob("*.csv"):
+        stale_file.unlink()
+    spec_path.unlink(missing_ok=True)
+    for csv_file, data_frame in zip(csv_files, iter_corpus_files(spec)):
+        data_frame.to_csv(csv_file, index=False)
+    # written last so an interrupted run is regenerated
+    spec_path.write_text(json.dumps(asdict(spec), indent=2), encoding="utf-8")
+    return csv_files
+
+
+def parse_brand_mix(value: str) -> Dict[str, float]:
+    """
+    Parses "Chobani=3,Yoplait=1" into brand weights.
+    """
+    brand_mix = {}
+    for item in filter(None, value.split(",")):
+        name, _, weight = item.partition("=")
+        brand_mix[name.strip()] = float(weight or 1)
+    return brand_mix
+
+
+def add_corpus_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the CorpusSpec options except rows to a parser.
+    """
+    defaults = CorpusSpec(rows=0)
+    parser.add_argument(
+        "--brand-mix",
+        type=parse_brand_mix,
+        default={},
+        help='brand weights among brand tweets, e.g. "Chobani=3,Yoplait=1" (default: equal)',
+    )
+    parser.add_argument(
+        "--brand-rate",
+        type=float,
+        default=defaults.brand_rate,
+        help="fraction of tweets mentioning a brand (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--duplicate-rate",
+        type=float,
+        default=defaults.duplicate_rate,
+        help="fraction of exact or near-duplicate tweets (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--mean-words",
+        type=float,
+        default=defaults.mean_words,
+        help="mean words per tweet (default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--rows-per-file", type=int, default=defaults.rows_per_file)
+
+
+def get_corpus_spec(rows: int, args: argparse.Namespace) -> CorpusSpec:
+    """
+    Builds a CorpusSpec from the options added by add_corpus_arguments.
+    """
+    return CorpusSpec(
+        rows=rows,
+        brand_mix=args.brand_mix,
+        brand_rate=args.brand_rate,
+        duplicate_rate=args.duplicate_rate,
+        mean_words=args.mean_words,
+        seed=args.seed,
+        rows_per_file=args.rows_per_file,
+    )
+
+
+def main():
+    """
+    Main function.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--output", type=Path, required=True, help="directory of the csv files")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    csv_files = write_corpus(get_corpus_spec(args.rows, args), args.output)
+    print(f"{args.rows} tweets in {len(csv_files)} files under {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Compares the per-tweet theme extraction the pipeline used to run against the batch encoder.
+
+Run from the repository root:
+    python -m benchmarks.theme_extraction --repeat 3
+"""
+
+import argparse
+import statistics
+import string
+import time
+from collections import defaultdict
+
+import numpy as np
+from nltk import bigrams
+from nltk.corpus import stopwords
+from nltk.tokenize import TweetTokenizer
+
+from src.processing.brand_partition import (
+    get_brand_tweet_ids,
+    partition_tweets_by_brand,
+    select_brand_tweets,
+)
+from src.processing.preprocess import combine_csv_data, get_csv_files
+from src.processing.theme_analyzer import (
+    custom_stopwords,
+    encode_tweets,
+    ensure_nltk_resources,
+    top_k_indices,
+)
+from src.resources.brands_data import brands
+from src.resources.word_lists import (
+    food_related_keywords,
+    secondary_yogurt_brand_accounts,
+    secondary_yogurt_brands,
+    yogurt_brand_accounts,
+    yogurt_brand_names,
+    yogurt_keywords,
+)
+
+
+def per_tweet_themes(texts):
+    """
+    Baseline: a tokenizer and word filter rebuilt per tweet, counting with dict loops.
+    """
+    filtered_tweets = []
+    for text in texts:
+        tokens = TweetTokenizer().tokenize(text)
+        non_informative_words = set(
+            food_related_keywords
+            + yogurt_brand_names
+            + yogurt_brand_accounts
+            + yogurt_keywords
+            + secondary_yogurt_brand_accounts
+            + secondary_yogurt_brands
+        )
+        non_informative_words.update(stopwords.words("english"))
+        non_informative_words.update(custom_stopwords)
+        non_informative_words.update(string.punctuation)
+        filtered_tweets.append(
+            [word.lower() for word in tokens if word.lower() not in non_informative_words]
+        )
+    flat_list = [word for tweet in filtered_tweets for word in tweet]
+    word_freq = defaultdict(int)
+    bigram_freq = defaultdict(int)
+    for word in flat_list:
+        word_freq[word] += 1
+    for bigram in bigrams(flat_list):
+        bigram_freq[bigram] += 1
+    return sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:10]
+
+
+def batch_themes(texts):
+    """
+    Batch encoder with integer ids counted by bincount.
+    """
+    encoded_tweets = encode_tweets(texts)
+    word_freq = np.bincount(encoded_tweets.token_ids, minlength=len(encoded_tweets.vocabulary))
+    word_ids = np.arange(len(word_freq))
+    bigram_codes = encoded_tweets.token_ids[:-1] * len(word_freq) + encoded_tweets.token_ids[1:]
+    np.unique(bigram_codes, return_index=True, return_counts=True)
+    return [
+        (encoded_tweets.vocabulary[word_id], int(word_freq[word_id]))
+        for word_id in top_k_indices(word_freq, word_ids, 10)
+    ]
+
+
+def time_companies(extract, company_texts, repeat: int) -> float:
+    """
+    Returns the median seconds extract takes over every company.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for texts in company_texts:
+            extract(texts)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    """
+    Main function.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data_frame = combine_csv_data(get_csv_files()).dropna(subset=["text"])
+    data_frame = data_frame.reset_index(drop=True)
+    brand_tweet_ids = get_brand_tweet_ids(partition_tweets_by_brand(data_frame))
+    company_texts = [
+        select_brand_tweets(data_frame, brand_tweet_ids, brand)["text"].tolist()
+        for brand in brands.values()
+    ]
+    company_texts = [texts for texts in company_texts if texts]
+    ensure_nltk_resources()
+
+    for texts in company_texts:
+        assert per_tweet_themes(texts) == batch_themes(texts)
+
+    baseline = time_companies(per_tweet_themes, company_texts, args.repeat)
+    batched = time_companies(batch_themes, company_texts, args.repeat)
+    tweets = sum(len(texts) for texts in company_texts)
+    print(f"per tweet: {baseline:.3f}s for {tweets} tweets")
+    print(f"batched:   {batched:.3f}s ({baseline / batched:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
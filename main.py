@@ -1,15 +1,405 @@
-from src.processing.preprocess import preprocess_data
-from src.processing.theme_analyzer import theme_analyzer_main
-from src.visualization.top_words_and_bigrams import plot_data_main
+import argparse
+from dataclasses import asdict
+from pathlib import Path
+from typing import Callable, Tuple
 
-def main():
+from src.resources.settings import BACKEND_NAMES, THEME_WEIGHT_COLUMNS, settings
+
+STAGES = ["all", "themes", "rollup", "index", "plot", "stream", "distill"]
+
+
+def parse_language_model(value: str) -> Tuple[str, str]:
     """
-    Main function.
+    Parses a LANG=MODEL option into its language and model name.
+    """
+    language, separator, model_name = value.partition("=")
+    if not separator or not language.strip() or not model_name.strip():
+        raise argparse.ArgumentTypeError(f"expected LANG=MODEL, got {value!r}")
+    return language.strip(), model_name.strip()
+
+
+def parse_args() -> argparse.Namespace:
     """
+    Parses the command line options into the pipeline settings.
+    """
+    parser = argparse.ArgumentParser(description="Yogurt brand tweet analysis.")
+    parser.add_argument(
+        "--stage",
+        choices=STAGES,
+        default="all",
+        help="all: full pipeline, themes: recount themes from processed tweets, "
+        "rollup: rebuild sentiment rollups from processed tweets, "
+        "index: rebuild the tweet search index, "
+        "plot: replot saved themes, "
+        "stream: score tweet records from --stream-file or --stream-port as they arrive, "
+        "distill: train the cheap model of --cascade on the sentiment model's labels "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.workers,
+        help="sentiment inference processes on CPU (default: number of cores)",
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=settings.threads_per_worker,
+        help="torch threads per inference process (default: cores / workers)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKEND_NAMES,
+        default=settings.backend,
+        help="sentiment model backend (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="only use locally installed models and NLTK data, failing fast when missing",
+    )
+    parser.add_argument(
+        "--no-csv",
+        action="store_true",
+        help="only store outputs as parquet, without the csv copies",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only process raw files that changed since the last run",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="collapse duplicate and near-duplicate tweets into one row with a multiplicity",
+    )
+    parser.add_argument(
+        "--dedup-similarity",
+        type=float,
+        default=settings.dedup_similarity,
+        help="estimated Jaccard similarity above which tweets collapse (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=settings.jobs,
+        help="theme analysis processes (default: number of cores)",
+    )
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        default=settings.top_k,
+        help="top words and bigrams kept per company (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--theme-weight",
+        choices=THEME_WEIGHT_COLUMNS,
+        default=settings.theme_weight,
+        help="count each tweet once plus this column instead of once",
+    )
+    parser.add_argument(
+        "--approximate-themes",
+        action="store_true",
+        help="count themes with fixed-memory sketches, reporting error bounds",
+    )
+    parser.add_argument(
+        "--sketch-epsilon",
+        type=float,
+        default=settings.sketch_epsilon,
+        help="sketch error as a fraction of all counted terms (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--sketch-delta",
+        type=float,
+        default=settings.sketch_delta,
+        help="probability of exceeding the sketch error (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--languages",
+        type=lambda value: [language.strip() for language in value.split(",") if language.strip()],
+        default=settings.languages,
+        help="comma-separated tweet languages scored by the sentiment model, "
+        "others are skipped and counted (default: en,und)",
+    )
+    parser.add_argument(
+        "--language-model",
+        type=parse_language_model,
+        action="append",
+        default=[],
+        metavar="LANG=MODEL",
+        help="score tweets in LANG with another Hugging Face model, "
+        "e.g. es=cardiffnlp/twitter-xlm-roberta-base-sentiment; repeatable",
+    )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="label tweets with the distilled model first and send only uncertain ones "
+        "to the sentiment model, after --stage distill",
+    )
+    parser.add_argument(
+        "--cascade-threshold",
+        type=float,
+        default=settings.cascade_threshold,
+        help="distilled-model confidence needed to keep its label (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cascade-validation-rate",
+        type=float,
+        default=settings.cascade_validation_rate,
+        help="share of kept distilled labels checked against the sentiment model "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--distill-size",
+        type=int,
+        default=settings.distill_size,
+        help="distill stage: most stored tweets to train on (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--stream-file",
+        default=settings.stream_file,
+        help="stream stage: append-only JSON lines file of tweet records to tail",
+    )
+    parser.add_argument(
+        "--stream-port",
+        type=int,
+        default=settings.stream_port,
+        help="stream stage: local port accepting JSON lines of tweet records",
+    )
+    parser.add_argument(
+        "--stream-host",
+        default=settings.stream_host,
+        help="stream stage: address to listen on (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-follow",
+        action="store_true",
+        help="stream stage: stop at the end of --stream-file instead of waiting for more",
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=settings.stream_max_batch_size,
+        help="stream stage: most tweets per model batch (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=settings.stream_max_wait_ms,
+        help="stream stage: longest a tweet waits for its batch to fill (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=settings.stream_queue_size,
+        help="stream stage: tweets queued before reading pauses (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--run-report",
+        default=settings.run_report_path,
+        help="where to write the JSON report of stage timings (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        default=settings.profile_path,
+        help="write a cProfile dump of the run to PATH, readable with pstats or snakeviz; "
+        "for sampling instead, attach py-spy to the process",
+    )
+    return parser.parse_args()
+
+
+# stages import their modules when they run so that stages without the model start quickly
+# pylint: disable=import-outside-toplevel
+def run_all():
+    """
+    Runs preprocessing, sentiment and theme analysis over data/raw.
+    """
+    from src.processing.preprocess import preprocess_data
+    from src.processing.theme_analyzer import run_theme_analysis
+
     company_data_frame_list = preprocess_data()
-    for data_frame in company_data_frame_list:
-        theme_analyzer_main(data_frame)
+    run_theme_analysis(company_data_frame_list, jobs=settings.jobs)
+    run_index()
     # plot_data_main()
 
+
+def run_themes():
+    """
+    Recounts themes from the per-company tweets of a previous run.
+    """
+    from src.processing.storage import read_all_company_tweets
+    from src.processing.theme_analyzer import run_theme_analysis
+
+    columns = ["text", "company_name", "multiplicity"]
+    if settings.theme_weight:
+        columns.append(settings.theme_weight)
+    run_theme_analysis(read_all_company_tweets(columns), jobs=settings.jobs)
+
+
+def run_rollup():
+    """
+    Rebuilds the sentiment rollups from the per-company tweets of a previous run.
+    Companies whose stored tweets were collapsed by dedup keep their rollup, which was built
+    from every copy before collapsing and cannot be rebuilt from the collapsed rows.
+    """
+    from src.processing.instrumentation import run_report
+    from src.processing.rollup import build_rollup
+    from src.processing.storage import (
+        TWEETS_DATASET,
+        list_companies,
+        read_company_tweets,
+        write_company_rollup,
+    )
+
+    for company_name in list_companies(TWEETS_DATASET):
+        with run_report.stage("rollup", company_name) as record:
+            company_tweets = read_company_tweets(company_name)
+            if "multiplicity" in company_tweets and (company_tweets["multiplicity"] > 1).any():
+                print(f"{company_name}: tweets are collapsed, keeping the stored rollup")
+                continue
+            rollup = build_rollup(company_tweets)
+            write_company_rollup(rollup, company_name)
+            record.rows_in, record.rows_out = len(company_tweets), len(rollup)
+
+
+def run_index():
+    """
+    Rebuilds the inverted index searched by src.features.tweet_search.
+    """
+    from src.features.tweet_search import build_tweet_index
+    from src.processing.instrumentation import run_report
+
+    with run_report.stage("index") as record:
+        record.rows_out = len(build_tweet_index())
+
+
+def run_plot():
+    """
+    Plots the saved top words and bigrams.
+    """
+    from src.visualization.top_words_and_bigrams import plot_data_main
+
+    plot_data_main()
+
+
+def run_stream():
+    """
+    Scores tweet records from a file or socket in micro-batches as they arrive.
+    """
+    import asyncio
+
+    from src.processing.instrumentation import run_report
+    from src.processing.stream_service import StreamService, serve_socket, tail_jsonl_file
+
+    if settings.stream_file is None and settings.stream_port is None:
+        raise SystemExit("The stream stage needs --stream-file or --stream-port")
+
+    async def serve() -> StreamService:
+        service = StreamService(
+            max_batch_size=settings.stream_max_batch_size,
+            max_wait=settings.stream_max_wait_ms / 1000,
+            queue_size=settings.stream_queue_size,
+        )
+        sources = []
+        if settings.stream_file is not None:
+            sources.append(
+                tail_jsonl_file(service, Path(settings.stream_file), settings.stream_follow)
+            )
+        if settings.stream_port is not None:
+            sources.append(serve_socket(service, settings.stream_host, settings.stream_port))
+        await service.run(*sources)
+        return service
+
+    with run_report.stage("stream") as record:
+        service = asyncio.run(serve())
+        metrics = service.snapshot()
+        record.rows_in, record.rows_out = metrics["received"], metrics["scored"]
+        # measured in the scorer thread, gathered by the service
+        record.batch_latencies.extend(service.metrics.batch_latencies)
+        record.counters.update(service.metrics.counters)
+    print(metrics)
+
+
+def run_distill():
+    """
+    Trains the cheap first tier of the sentiment cascade on the labels of the sentiment model.
+    """
+    from src.processing.distillation import (
+        DISTILLATION_REPORT_PATH,
+        distill_sentiment_model,
+        print_distillation_report,
+        write_distillation_report,
+    )
+    from src.processing.instrumentation import run_report
+
+    with run_report.stage("distill") as record:
+        report = distill_sentiment_model(settings.distill_size)
+        record.rows_in = report.train_size + report.calibration_size + report.validation_size
+    write_distillation_report(report)
+    print_distillation_report(report)
+    print(f"Distillation report written to {DISTILLATION_REPORT_PATH}")
+
+
+def load_stage(stage: str) -> Callable[[], None]:
+    """
+    Returns the function running a stage.
+    """
+    return {
+        "all": run_all,
+        "themes": run_themes,
+        "rollup": run_rollup,
+        "index": run_index,
+        "plot": run_plot,
+        "stream": run_stream,
+        "distill": run_distill,
+    }[stage]
+
+
+def main():
+    """
+    Main function.
+    """
+    args = parse_args()
+    settings.workers = args.workers
+    settings.threads_per_worker = args.threads_per_worker
+    settings.backend = args.backend
+    settings.offline = args.offline
+    settings.csv_export = not args.no_csv
+    settings.incremental = args.incremental
+    settings.dedup = args.dedup
+    settings.dedup_similarity = args.dedup_similarity
+    settings.jobs = args.jobs
+    settings.top_k = args.top_k
+    settings.theme_weight = args.theme_weight
+    settings.approximate_themes = args.approximate_themes
+    settings.sketch_epsilon = args.sketch_epsilon
+    settings.sketch_delta = args.sketch_delta
+    settings.languages = args.languages
+    settings.language_models = dict(args.language_model)
+    settings.cascade = args.cascade
+    settings.cascade_threshold = args.cascade_threshold
+    settings.cascade_validation_rate = args.cascade_validation_rate
+    settings.distill_size = args.distill_size
+    settings.stream_file = args.stream_file
+    settings.stream_port = args.stream_port
+    settings.stream_host = args.stream_host
+    settings.stream_follow = not args.no_follow
+    settings.stream_max_batch_size = args.max_batch_size
+    settings.stream_max_wait_ms = args.max_wait_ms
+    settings.stream_queue_size = args.queue_size
+    settings.run_report_path = args.run_report
+    settings.profile_path = args.profile
+
+    from src.processing.instrumentation import profile_to, run_report
+
+    try:
+        with profile_to(settings.profile_path):
+            load_stage(args.stage)()
+    finally:
+        run_report.write(Path(settings.run_report_path), asdict(settings))
+        print(f"Run report written to {settings.run_report_path}")
+
+
 if __name__ == "__main__":
     main()
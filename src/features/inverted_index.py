@@ -0,0 +1,228 @@
+import bisect
+import string
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.processing.theme_analyzer import encode_tweets, get_tokenizer
+
+# tokens left out of the index, every word is kept so any of them can be searched
+INDEX_EXCLUDED_WORDS = frozenset(string.punctuation)
+# columns kept with every indexed tweet to show in results
+DOCUMENT_COLUMNS = ["company_name", "datetime", "sentiment", "sentiment_score", "text"]
+# field terms are stored as "field:value" next to the words
+FIELD_COLUMNS = {"brand": "company_name", "sentiment": "sentiment"}
+
+
+def get_varint_lengths(values: np.ndarray) -> np.ndarray:
+    """
+    Returns how many bytes encode_varints takes for each value.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    byte_counts = np.ones(len(values), dtype=np.int64)
+    for bits in (7, 14, 21, 28):
+        byte_counts += values >= np.uint64(1 << bits)
+    return byte_counts
+
+
+def encode_varints(values: np.ndarray) -> np.ndarray:
+    """
+    Encodes non-negative integers below 2**35 as LEB128 variable-length bytes:
+    7 bits per byte, the high bit set on every byte but a value's last.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    byte_counts = get_varint_lengths(values)
+    starts = np.cumsum(byte_counts) - byte_counts
+    encoded = np.empty(int(byte_counts.sum()), dtype=np.uint8)
+    for byte in range(5):
+        has_byte = byte_counts > byte
+        payload = (values[has_byte] >> np.uint64(7 * byte)) & np.uint64(0x7F)
+        continues = (byte_counts[has_byte] > byte + 1).astype(np.uint64) << np.uint64(7)
+        encoded[starts[has_byte] + byte] = payload | continues
+    return encoded
+
+
+def decode_varints(encoded: np.ndarray) -> np.ndarray:
+    """
+    Decodes bytes written by encode_varints.
+    """
+    encoded = np.asarray(encoded, dtype=np.uint8)
+    if len(encoded) == 0:
+        return np.array([], dtype=np.uint64)
+    is_last = encoded < 0x80
+    value_of_byte = np.cumsum(is_last) - is_last
+    starts = np.flatnonzero(np.r_[True, is_last[:-1]])
+    byte_in_value = np.arange(len(encoded)) - starts[value_of_byte]
+    shifted = (encoded & np.uint8(0x7F)).astype(np.uint64) << (
+        np.uint64(7) * byte_in_value.astype(np.uint64)
+    )
+    return np.bitwise_or.reduceat(shifted, starts)
+
+
+def tokenize_query_words(text: str) -> List[str]:
+    """
+    Tokenizes words of a query the way tweets are indexed.
+    """
+    return [
+        token.lower()
+        for token in get_tokenizer().tokenize(text)
+        if token.lower() not in INDEX_EXCLUDED_WORDS
+    ]
+
+
+@dataclass
+class InvertedIndex:
+    """
+    Sorted terms with the delta- and varint-encoded ids of the tweets containing them,
+    plus each tweet's term ids in order to check phrases. Field terms such as
+    "brand:fage" and "sentiment:negative" are posted like words.
+    """
+
+    # sorted terms, searched with bisect
+    terms: Sequence[str]
+    # postings[posting_offsets[t]:posting_offsets[t + 1]] are the encoded tweet ids of term t
+    postings: np.ndarray
+    posting_offsets: np.ndarray
+    # tokens[token_offsets[d]:token_offsets[d + 1]] are the term ids of tweet d
+    tokens: np.ndarray
+    token_offsets: np.ndarray
+    documents: pa.Table
+
+    @classmethod
+    def from_frame(cls, data_frame: pd.DataFrame) -> "InvertedIndex":
+        """
+        Indexes the words and fields of scored tweets, numbered in the order of the frame.
+        """
+        encoded_tweets = encode_tweets(data_frame["text"], INDEX_EXCLUDED_WORDS)
+        document_count = len(data_frame)
+        terms = list(encoded_tweets.vocabulary)
+        term_ids = [encoded_tweets.token_ids]
+        document_ids = [np.repeat(np.arange(document_count), np.diff(encoded_tweets.offsets))]
+        for field, column in FIELD_COLUMNS.items():
+            codes, values = pd.factorize(data_frame[column].astype(str))
+            term_ids.append(codes + len(terms))
+            document_ids.append(np.arange(document_count))
+            terms.extend(f"{field}:{value}" for value in values)
+
+        # term ids are positions in the sorted terms
+        order = np.argsort(np.array(terms, dtype=object), kind="stable")
+        sorted_id = np.empty(len(order), dtype=np.int64)
+        sorted_id[order] = np.arange(len(order))
+        tokens = sorted_id[encoded_tweets.token_ids].astype(np.uint32)
+
+        # distinct (term, tweet) pairs, sorted by term then tweet
+        stride = max(document_count, 1)
+        pairs = np.unique(
+            sorted_id[np.concatenate(term_ids)] * stride + np.concatenate(document_ids)
+        )
+        pair_terms = pairs // stride
+        pair_documents = pairs % stride
+
+        # each posting list stores its first id and the gaps after it
+        gaps = np.diff(pair_documents, prepend=0)
+        first_of_term = np.diff(pair_terms, prepend=-1) != 0
+        gaps[first_of_term] = pair_documents[first_of_term]
+        postings = encode_varints(gaps)
+        byte_counts = np.bincount(
+            pair_terms, weights=get_varint_lengths(gaps), minlength=len(terms)
+        ).astype(np.int64)
+        posting_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(byte_counts, out=posting_offsets[1:])
+
+        documents = data_frame[DOCUMENT_COLUMNS].reset_index(drop=True)
+        return cls(
+            terms=[terms[term] for term in order],
+            postings=postings,
+            posting_offsets=posting_offsets,
+            tokens=tokens,
+            token_offsets=encoded_tweets.offsets,
+            documents=pa.Table.from_pandas(documents, preserve_index=False),
+        )
+
+    def __len__(self) -> int:
+        return self.documents.num_rows
+
+    def get_term_id(self, term: str) -> int:
+        """
+        Returns the id of a term, or -1 when no tweet has it.
+        """
+        position = bisect.bisect_left(self.terms, term)
+        if position < len(self.terms) and self.terms[position] == term:
+            return position
+        return -1
+
+    def get_postings(self, term: str) -> np.ndarray:
+        """
+        Returns the sorted ids of the tweets containing a term.
+        """
+        term_id = self.get_term_id(term)
+        if term_id < 0:
+            return np.array([], dtype=np.int64)
+        start, end = self.posting_offsets[term_id], self.posting_offsets[term_id + 1]
+        encoded = self.postings[start:end]
+        return np.cumsum(decode_varints(encoded)).astype(np.int64)
+
+    def get_phrase_postings(self, words: List[str]) -> np.ndarray:
+        """
+        Returns the sorted ids of the tweets containing the words next to each other, in order.
+        """
+        if not words:
+            return np.array([], dtype=np.int64)
+        candidates = self.get_postings(words[0])
+        for word in words[1:]:
+            candidates = np.intersect1d(candidates, self.get_postings(word), assume_unique=True)
+        if len(words) == 1:
+            return candidates
+        phrase = np.array([self.get_term_id(word) for word in words], dtype=np.int64)
+
+        # token positions of every candidate tweet, where a phrase could start
+        starts = np.asarray(self.token_offsets[candidates], dtype=np.int64)
+        ends = np.asarray(self.token_offsets[candidates + 1], dtype=np.int64)
+        lengths = ends - starts
+        candidate_of_position = np.repeat(np.arange(len(candidates)), lengths)
+        positions = np.arange(int(lengths.sum())) + np.repeat(
+            starts - (np.cumsum(lengths) - lengths), lengths
+        )
+        matches = positions + len(phrase) <= ends[candidate_of_position]
+        for offset, term_id in enumerate(phrase):
+            matches[matches] &= self.tokens[positions[matches] + offset] == term_id
+        return np.unique(candidates[candidate_of_position[matches]])
+
+    def get_documents(self, document_ids: np.ndarray) -> pd.DataFrame:
+        """
+        Returns the stored columns of tweets by id.
+        """
+        return self.documents.take(pa.array(document_ids, type=pa.int64())).to_pandas()
+
+    def save(self, directory: Path):
+        """
+        Writes the index to a directory, arrays as .npy files that load memory-mapped.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        pq.write_table(
+            pa.table({"term": pa.array(self.terms, pa.string())}), directory / "terms.parquet"
+        )
+        pq.write_table(self.documents, directory / "documents.parquet", compression="zstd")
+        for name in ["postings", "posting_offsets", "tokens", "token_offsets"]:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: Path) -> "InvertedIndex":
+        """
+        Opens an index written by save, memory-mapping its arrays.
+        """
+        arrays = {
+            name: np.load(directory / f"{name}.npy", mmap_mode="r")
+            for name in ["postings", "posting_offsets", "tokens", "token_offsets"]
+        }
+        terms = pq.read_table(directory / "terms.parquet", memory_map=True).column("term")
+        return cls(
+            terms=terms.to_pylist(),
+            documents=pq.read_table(directory / "documents.parquet", memory_map=True),
+            **arrays,
+        )
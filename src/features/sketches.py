@@ -0,0 +1,224 @@
+import io
+import math
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# keys of pandas' stable string hash, two keys give two independent hashes per term
+HASH_KEYS = ("0123456789123456", "6543219876543210")
+
+
+def hash_terms(terms: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns two 64-bit hashes of each term that are the same in every process and run.
+    """
+    values = np.asarray(terms, dtype=object)
+    return tuple(
+        pd.util.hash_array(values, hash_key=hash_key, categorize=False) for hash_key in HASH_KEYS
+    )
+
+
+class CountMinSketch:
+    """
+    Fixed-size table of counters that overestimates a term's count by at most
+    epsilon times the total count, with probability 1 - delta.
+    """
+
+    def __init__(self, epsilon: float, delta: float):
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError(f"epsilon and delta must be in (0, 1), got {epsilon}, {delta}")
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+
+    def _columns(self, terms: Sequence[str]) -> np.ndarray:
+        # row i hashes to h1 + i * h2, which is as good as depth independent hashes
+        first, second = hash_terms(terms)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((first + rows * second) % np.uint64(self.width)).astype(np.int64)
+
+    def update(self, terms: Sequence[str], counts: np.ndarray):
+        """
+        Adds counts[i] to terms[i].
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        for row, columns in enumerate(self._columns(terms)):
+            np.add.at(self.table[row], columns, counts)
+        self.total += int(counts.sum())
+
+    def estimate(self, terms: Sequence[str]) -> np.ndarray:
+        """
+        Returns an upper bound of each term's count.
+        """
+        if len(terms) == 0:
+            return np.array([], dtype=np.int64)
+        columns = self._columns(terms)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def error_bound(self) -> int:
+        """
+        Returns how much estimate overcounts at most, with probability 1 - delta.
+        """
+        return math.ceil(self.epsilon * self.total)
+
+    def merge(self, other: "CountMinSketch"):
+        """
+        Adds the counts of a sketch built with the same epsilon and delta.
+        """
+        if self.table.shape != other.table.shape:
+            raise ValueError(
+                f"Cannot merge sketches of shape {self.table.shape} and {other.table.shape}"
+            )
+        self.table += other.table
+        self.total += other.total
+
+
+class SpaceSaving:
+    """
+    Keeps the capacity heaviest terms, each with a count that overestimates
+    its true count by at most its error, and error at most total / capacity.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+        self.capacity = capacity
+        self.terms = np.array([], dtype=object)
+        self.counts = np.array([], dtype=np.int64)
+        self.errors = np.array([], dtype=np.int64)
+        # upper bound of the count of any term that is not kept
+        self.floor = 0
+
+    def update(self, terms: Sequence[str], counts: np.ndarray):
+        """
+        Adds the exact counts of distinct terms.
+        """
+        exact = SpaceSaving(max(len(terms), 1))
+        exact.terms = np.asarray(terms, dtype=object)
+        exact.counts = np.asarray(counts, dtype=np.int64)
+        exact.errors = np.zeros(len(terms), dtype=np.int64)
+        self.merge(exact)
+
+    def merge(self, other: "SpaceSaving"):
+        """
+        Combines with another summary; terms missing from one side count as its floor.
+        """
+        own = pd.DataFrame({"count": self.counts, "error": self.errors}, index=self.terms)
+        theirs = pd.DataFrame({"count": other.counts, "error": other.errors}, index=other.terms)
+        own, theirs = own.align(theirs, join="outer")
+        merged_counts = (
+            own["count"].fillna(self.floor) + theirs["count"].fillna(other.floor)
+        ).to_numpy(dtype=np.int64)
+        merged_errors = (
+            own["error"].fillna(self.floor) + theirs["error"].fillna(other.floor)
+        ).to_numpy(dtype=np.int64)
+        merged_terms = own.index.to_numpy(dtype=object)
+
+        floor = self.floor + other.floor
+        if len(merged_terms) > self.capacity:
+            kept = np.argpartition(-merged_counts, self.capacity - 1)[: self.capacity]
+            dropped = np.ones(len(merged_terms), dtype=bool)
+            dropped[kept] = False
+            floor = max(floor, int(merged_counts[dropped].max()))
+            merged_terms = merged_terms[kept]
+            merged_counts = merged_counts[kept]
+            merged_errors = merged_errors[kept]
+
+        self.terms, self.counts, self.errors = merged_terms, merged_counts, merged_errors
+        self.floor = floor
+
+
+@dataclass
+class TermEstimate:
+    """
+    Approximate count of a term: the true count is between frequency - error and frequency.
+    """
+
+    term: str
+    frequency: int
+    error: int
+
+
+class TermSketch:
+    """
+    Count-Min Sketch with a Space-Saving summary of the heavy hitters, in memory fixed
+    by epsilon and delta. Sketches with the same settings can be merged and serialized.
+    """
+
+    def __init__(self, epsilon: float = 1e-4, delta: float = 0.01):
+        self.count_min = CountMinSketch(epsilon, delta)
+        self.heavy_hitters = SpaceSaving(math.ceil(1 / epsilon))
+
+    def update(self, terms: Sequence[str], counts: np.ndarray):
+        """
+        Adds the exact counts of a batch of distinct terms.
+        """
+        if len(terms) == 0:
+            return
+        self.count_min.update(terms, counts)
+        self.heavy_hitters.update(terms, counts)
+
+    def merge(self, other: "TermSketch"):
+        """
+        Adds the counts of another sketch, e.g. from another chunk or process.
+        """
+        self.count_min.merge(other.count_min)
+        self.heavy_hitters.merge(other.heavy_hitters)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the sketch.
+        """
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            settings=np.array([self.count_min.epsilon, self.count_min.delta]),
+            totals=np.array([self.count_min.total, self.heavy_hitters.floor]),
+            table=self.count_min.table,
+            terms=self.heavy_hitters.terms.astype(str),
+            counts=self.heavy_hitters.counts,
+            errors=self.heavy_hitters.errors,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TermSketch":
+        """
+        Restores a sketch serialized with to_bytes.
+        """
+        arrays = np.load(io.BytesIO(data), allow_pickle=False)
+        epsilon, delta = arrays["settings"]
+        sketch = cls(float(epsilon), float(delta))
+        sketch.count_min.total, sketch.heavy_hitters.floor = (int(x) for x in arrays["totals"])
+        sketch.count_min.table = arrays["table"]
+        sketch.heavy_hitters.terms = arrays["terms"].astype(object)
+        sketch.heavy_hitters.counts = arrays["counts"]
+        sketch.heavy_hitters.errors = arrays["errors"]
+        return sketch
+
+    def top_k(self, k: int) -> List[TermEstimate]:
+        """
+        Returns the k terms with the highest estimated counts, ties broken by term.
+        """
+        heavy_hitters = self.heavy_hitters
+        # both structures only overcount, so the smaller upper bound is the tighter one
+        upper = np.minimum(heavy_hitters.counts, self.count_min.estimate(heavy_hitters.terms))
+        lower = np.maximum(
+            heavy_hitters.counts - heavy_hitters.errors,
+            upper - self.count_min.error_bound(),
+        )
+        lower = np.clip(lower, 0, None)
+        order = np.lexsort((heavy_hitters.terms.astype(str), -upper))[:k]
+        return [
+            TermEstimate(
+                term=str(heavy_hitters.terms[index]),
+                frequency=int(upper[index]),
+                error=int(upper[index] - lower[index]),
+            )
+            for index in order
+        ]
@@ -0,0 +1,193 @@
+"""
+Searches the processed tweets through the inverted index.
+
+Build the index with `python main.py --stage index`, then from the repository root:
+    python -m src.features.tweet_search 'brand:fage protein sentiment:negative'
+    python -m src.features.tweet_search '"greek yogurt" AND (brand:chobani OR brand:fage)' --page 2
+
+Words are matched lowercased. Terms next to each other must all match; AND, OR, NOT and
+parentheses combine them, "quoted words" must appear next to each other in that order,
+and brand:<company> and sentiment:<label> select by field.
+"""
+
+import argparse
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from src.features.inverted_index import (
+    DOCUMENT_COLUMNS,
+    FIELD_COLUMNS,
+    InvertedIndex,
+    tokenize_query_words,
+)
+from src.processing.schema import concat_typed, empty_typed_frame
+from src.processing.storage import INDEX_DIRECTORY, read_all_company_tweets
+
+QUERY_TOKEN_REGEX = re.compile(r'\(|\)|"[^"]*"|[^\s()"]+')
+OPERATORS = {"AND", "OR", "NOT"}
+DEFAULT_PAGE_SIZE = 20
+
+
+class QueryParser:
+    """
+    Evaluates a boolean query to the sorted ids of the matching tweets, by recursive descent:
+    or := and ("OR" and)*, and := not ("AND"? not)*, not := "NOT" not | "(" or ")" | term.
+    """
+
+    def __init__(self, index: InvertedIndex, query: str):
+        self.index = index
+        self.tokens = QUERY_TOKEN_REGEX.findall(query)
+        self.position = 0
+
+    def parse(self) -> np.ndarray:
+        """
+        Returns the ids of the tweets matching the whole query.
+        """
+        if not self.tokens:
+            raise ValueError("Empty query")
+        document_ids = self._parse_or()
+        if self.position < len(self.tokens):
+            raise ValueError(f"Unexpected {self.tokens[self.position]!r} in query")
+        return document_ids
+
+    def _peek(self) -> str:
+        return self.tokens[self.position] if self.position < len(self.tokens) else ""
+
+    def _parse_or(self) -> np.ndarray:
+        document_ids = self._parse_and()
+        while self._peek() == "OR":
+            self.position += 1
+            document_ids = np.union1d(document_ids, self._parse_and())
+        return document_ids
+
+    def _parse_and(self) -> np.ndarray:
+        document_ids = self._parse_not()
+        while self._peek() not in ("", "OR", ")"):
+            if self._peek() == "AND":
+                self.position += 1
+            document_ids = np.intersect1d(document_ids, self._parse_not(), assume_unique=True)
+        return document_ids
+
+    def _parse_not(self) -> np.ndarray:
+        token = self._peek()
+        if token == "NOT":
+            self.position += 1
+            return np.setdiff1d(np.arange(len(self.index)), self._parse_not(), assume_unique=True)
+        if token == "(":
+            self.position += 1
+            document_ids = self._parse_or()
+            if self._peek() != ")":
+                raise ValueError("Missing ) in query")
+            self.position += 1
+            return document_ids
+        if token in ("", ")") or token in OPERATORS:
+            raise ValueError(f"Expected a term in query, got {token or 'the end'!r}")
+        self.position += 1
+        return self._get_term_postings(token)
+
+    def _get_term_postings(self, token: str) -> np.ndarray:
+        """
+        Returns the tweets matching a field term, a quoted phrase or a word.
+        """
+        field, separator, value = token.partition(":")
+        if separator and field.lower() in FIELD_COLUMNS:
+            return self.index.get_postings(f"{field.lower()}:{value.lower()}")
+        # a word the tokenizer splits, e.g. with an apostrophe, is matched as a phrase
+        return self.index.get_phrase_postings(tokenize_query_words(token.strip('"')))
+
+
+@dataclass
+class SearchPage:
+    """
+    One page of the tweets matching a query.
+    """
+
+    query: str
+    total: int
+    page: int
+    page_size: int
+    tweets: pd.DataFrame
+
+    @property
+    def page_count(self) -> int:
+        """
+        Number of pages of page_size tweets.
+        """
+        return -(-self.total // self.page_size)
+
+
+def search_tweets(
+    index: InvertedIndex, query: str, page: int = 1, page_size: int = DEFAULT_PAGE_SIZE
+) -> SearchPage:
+    """
+    Returns the given 1-based page of the tweets matching a query, in index order.
+    """
+    if page < 1 or page_size < 1:
+        raise ValueError(f"page and page_size must be at least 1, got {page}, {page_size}")
+    document_ids = QueryParser(index, query).parse()
+    start = (page - 1) * page_size
+    return SearchPage(
+        query=query,
+        total=len(document_ids),
+        page=page,
+        page_size=page_size,
+        tweets=index.get_documents(document_ids[start : start + page_size]),
+    )
+
+
+def build_tweet_index(directory: Path = INDEX_DIRECTORY) -> InvertedIndex:
+    """
+    Indexes the stored tweets of every company and saves the index.
+    """
+    company_tweets: List[pd.DataFrame] = [
+        data_frame for data_frame in read_all_company_tweets(DOCUMENT_COLUMNS) if len(data_frame)
+    ]
+    if company_tweets:
+        tweets = concat_typed(company_tweets, ignore_index=True)
+    else:
+        # nothing processed yet, an empty index makes every search return no tweets
+        tweets = empty_typed_frame().assign(
+            company_name=pd.Series(dtype="str"),
+            sentiment=pd.Series(dtype="str"),
+            sentiment_score=pd.Series(dtype="float64"),
+        )[DOCUMENT_COLUMNS]
+    index = InvertedIndex.from_frame(tweets)
+    index.save(directory)
+    return index
+
+
+def main():
+    """
+    Main function.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("query")
+    parser.add_argument("--page", type=int, default=1)
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument("--index", type=Path, default=INDEX_DIRECTORY)
+    args = parser.parse_args()
+
+    index = InvertedIndex.load(args.index)
+    start = time.perf_counter()
+    try:
+        results = search_tweets(index, args.query, args.page, args.page_size)
+    except ValueError as error:
+        parser.error(str(error))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    print(
+        f"{results.total} tweets match, page {results.page} of {max(results.page_count, 1)} "
+        f"({elapsed_ms:.1f} ms)"
+    )
+    with pd.option_context("display.max_colwidth", 120, "display.width", 200):
+        print(results.tweets.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import torch
+from transformers import (
+    AutoConfig,
+    AutoModelForSequenceClassification,
+    AutoTokenizer,
+    pipeline,
+)
+
+from src.resources.settings import REFERENCE_BACKEND
+
+MAX_LENGTH = 512
+ONNX_CACHE_DIRECTORY = Path("data/cache/onnx")
+
+
+class SentimentBackend(ABC):
+    """
+    Runs a sentiment model over a batch of texts and returns (label, score) pairs.
+    """
+
+    name = ""
+
+    def __init__(self, model_name: str, device: torch.device):
+        self.model_name = model_name
+        self.device = device
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    @abstractmethod
+    def __call__(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """
+        Returns the label and score of each text.
+        """
+
+
+class PipelineBackend(SentimentBackend):
+    """
+    The full-precision PyTorch transformers pipeline.
+    """
+
+    name = REFERENCE_BACKEND
+
+    def __init__(self, model_name: str, device: torch.device):
+        super().__init__(model_name, device)
+        self.pipeline = pipeline(
+            "text-classification",
+            model=self.load_model(),
+            tokenizer=self.tokenizer,
+            device=self.device,
+            max_length=MAX_LENGTH,
+            truncation=True,
+        )
+
+    def load_model(self):
+        """
+        Loads the model the pipeline runs.
+        """
+        return AutoModelForSequenceClassification.from_pretrained(self.model_name)
+
+    def __call__(self, texts: List[str]) -> List[Tuple[str, float]]:
+        output = self.pipeline(texts, batch_size=len(texts))
+        return [(res["label"], float(res["score"])) for res in output]
+
+
+class QuantizedBackend(PipelineBackend):
+    """
+    The PyTorch pipeline with its linear layers dynamically quantized to int8, CPU only.
+    """
+
+    name = "quantized"
+
+    def __init__(self, model_name: str, device: torch.device):
+        super().__init__(model_name, torch.device("cpu"))
+
+    def load_model(self):
+        model = super().load_model().eval()
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxBackend(SentimentBackend):
+    """
+    The model exported to ONNX and run through onnxruntime on CPU.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_name: str, device: torch.device):
+        super().__init__(model_name, torch.device("cpu"))
+        import onnxruntime  # pylint: disable=import-outside-toplevel
+
+        model_path = export_onnx_model(model_name, self.tokenizer)
+        self.session = onnxruntime.InferenceSession(
+            str(model_path), providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        config = AutoConfig.from_pretrained(model_name)
+        self.labels = [config.id2label[i] for i in range(len(config.id2label))]
+
+    def __call__(self, texts: List[str]) -> List[Tuple[str, float]]:
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=MAX_LENGTH,
+            return_tensors="np",
+        )
+        inputs = {
+            name: value.astype(np.int64)
+            for name, value in encoded.items()
+            if name in self.input_names
+        }
+        (logits,) = self.session.run(None, inputs)
+        probabilities = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        best = probabilities.argmax(axis=1)
+        return [
+            (self.labels[label], float(probabilities[row, label])) for row, label in enumerate(best)
+        ]
+
+
+def export_onnx_model(model_name: str, tokenizer) -> Path:
+    """
+    Exports the model to ONNX once and returns the path of the exported file.
+    """
+    model_path = ONNX_CACHE_DIRECTORY / model_name.replace("/", "__") / "model.onnx"
+    if model_path.exists():
+        return model_path
+
+    model_path.parent.mkdir(parents=True, exist_ok=True)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    dynamic_axes = {
+        "input_ids": {0: "batch", 1: "sequence"},
+        "attention_mask": {0: "batch", 1: "sequence"},
+        "logits": {0: "batch"},
+    }
+    torch.onnx.export(
+        model,
+        (sample["input_ids"], sample["attention_mask"]),
+        str(model_path),
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes=dynamic_axes,
+        opset_version=14,
+    )
+    return model_path
+
+
+BACKENDS: Dict[str, Callable[[str, torch.device], SentimentBackend]] = {
+    PipelineBackend.name: PipelineBackend,
+    QuantizedBackend.name: QuantizedBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def load_backend(name: str, model_name: str, device: torch.device) -> SentimentBackend:
+    """
+    Builds the named sentiment backend.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown sentiment backend {name!r}, expected one of {list(BACKENDS)}")
+    return BACKENDS[name](model_name, device)
+
+
+@dataclass
+class AgreementReport:
+    """
+    Label agreement and throughput of a backend against the reference backend.
+    """
+
+    backend: str
+    reference: str
+    sample_size: int
+    agreement: float
+    tweets_per_second: float
+    reference_tweets_per_second: float
+
+
+def check_label_agreement(
+    backend: SentimentBackend,
+    reference: SentimentBackend,
+    texts: List[str],
+    batch_size: int = 64,
+) -> AgreementReport:
+    """
+    Scores texts with both backends and reports how often their labels agree.
+    """
+    labels, rate = _score_with_rate(backend, texts, batch_size)
+    reference_labels, reference_rate = _score_with_rate(reference, texts, batch_size)
+    matching = sum(label == expected for label, expected in zip(labels, reference_labels))
+    return AgreementReport(
+        backend=backend.name,
+        reference=reference.name,
+        sample_size=len(texts),
+        agreement=matching / len(texts) if texts else 1.0,
+        tweets_per_second=rate,
+        reference_tweets_per_second=reference_rate,
+    )
+
+
+def _score_with_rate(
+    backend: SentimentBackend, texts: List[str], batch_size: int
+) -> Tuple[List[str], float]:
+    start = time.perf_counter()
+    labels = []
+    for i in range(0, len(texts), batch_size):
+        labels.extend(label for label, _ in backend(texts[i : i + batch_size]))
+    elapsed = time.perf_counter() - start
+    return labels, len(texts) / elapsed if elapsed else 0.0
@@ -0,0 +1,56 @@
+from typing import List
+
+import numpy as np
+
+DEFAULT_MAX_BATCH_TOKENS = 8192
+DEFAULT_MAX_LENGTH = 512
+
+
+def get_token_lengths(
+    texts: List[str], tokenizer, max_length: int = DEFAULT_MAX_LENGTH
+) -> np.ndarray:
+    """
+    Returns the truncated token count of every text, special tokens included.
+    """
+    input_ids = tokenizer(texts, truncation=True, max_length=max_length)["input_ids"]
+    return np.fromiter((len(ids) for ids in input_ids), dtype=np.int32, count=len(texts))
+
+
+def fixed_size_batches(count: int, batch_size: int) -> List[np.ndarray]:
+    """
+    Splits positions 0..count into consecutive batches of batch_size rows.
+    """
+    return [np.arange(i, min(i + batch_size, count)) for i in range(0, count, batch_size)]
+
+
+def token_budget_batches(
+    lengths: np.ndarray,
+    max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+    max_batch_size: int = 256,
+) -> List[np.ndarray]:
+    """
+    Sorts positions by token length and groups them so that each padded batch
+    (rows times its longest row) stays within max_batch_tokens.
+    """
+    order = np.argsort(lengths, kind="stable")
+    batches = []
+    start = 0
+    for end in range(1, len(order) + 1):
+        if end == len(order):
+            batches.append(order[start:end])
+            break
+        rows = end + 1 - start
+        # positions are sorted, so the next row is always the longest in the batch
+        padded_tokens = rows * int(lengths[order[end]])
+        if padded_tokens > max_batch_tokens or rows > max_batch_size:
+            batches.append(order[start:end])
+            start = end
+    return batches
+
+
+def padding_efficiency(lengths: np.ndarray, batches: List[np.ndarray]) -> float:
+    """
+    Returns the share of real tokens among all padded tokens the batches would feed the model.
+    """
+    padded = sum(len(batch) * int(lengths[batch].max()) for batch in batches if len(batch))
+    return float(lengths.sum()) / padded if padded else 1.0
@@ -0,0 +1,73 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.processing.keyword_matcher import (
+    KeywordMatches,
+    brand_relevance_mask,
+    build_keyword_matcher,
+    get_keyword_matcher,
+    negative_keyword_mask,
+)
+from src.resources.brands_data import Brand, brands
+
+
+def partition_tweets_by_brand(
+    data_frame: pd.DataFrame,
+    brand_list: Optional[List[Brand]] = None,
+    matches: Optional[KeywordMatches] = None,
+) -> pd.DataFrame:
+    """
+    Assigns every tweet to each brand whose relevance rules and negative keywords it passes.
+    The text is scanned once; the result is a long-format (tweet_id, brand) index where
+    tweet_id is the index label of the tweet in data_frame.
+    """
+    if brand_list is None:
+        brand_list = list(brands.values())
+        matcher = get_keyword_matcher()
+    else:
+        matcher = build_keyword_matcher(brand_list)
+    if matches is None:
+        matches = matcher.match(data_frame["text"])
+
+    positions = []
+    brand_codes = []
+    for code, brand in enumerate(brand_list):
+        relevant = brand_relevance_mask(matches, brand) & ~negative_keyword_mask(matches, brand)
+        brand_positions = np.flatnonzero(relevant)
+        positions.append(brand_positions)
+        brand_codes.append(np.full(len(brand_positions), code, dtype=np.int32))
+
+    positions = np.concatenate(positions) if positions else np.array([], dtype=np.int64)
+    brand_codes = np.concatenate(brand_codes) if brand_codes else np.array([], dtype=np.int32)
+    return pd.DataFrame(
+        {
+            "tweet_id": data_frame.index.to_numpy()[positions],
+            "brand": pd.Categorical.from_codes(
+                brand_codes, categories=[brand.brand_name for brand in brand_list]
+            ),
+        }
+    )
+
+
+def get_brand_tweet_ids(partition_index: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Groups the partition index into the tweet ids of each brand.
+    """
+    return {
+        str(brand_name): tweet_ids.to_numpy()
+        for brand_name, tweet_ids in partition_index.groupby("brand", observed=True)["tweet_id"]
+    }
+
+
+def select_brand_tweets(
+    data_frame: pd.DataFrame,
+    brand_tweet_ids: Dict[str, np.ndarray],
+    brand: Brand,
+) -> pd.DataFrame:
+    """
+    Returns the rows of data_frame assigned to the brand.
+    """
+    tweet_ids = brand_tweet_ids.get(brand.brand_name, np.array([], dtype=np.int64))
+    return data_frame.loc[tweet_ids]
@@ -0,0 +1,148 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.processing.sentiment_cache import normalize_text
+
+# MinHash signature length, split into LSH_BANDS bands of equal size
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 8
+# texts are compared as sets of lowercased character shingles of this size
+SHINGLE_SIZE = 5
+DEFAULT_SIMILARITY = 0.8
+
+# permutations are (a * x + b) mod a Mersenne prime over 32-bit shingle hashes,
+# which stays inside uint64 without overflowing
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+MINHASH_SEED = 1234
+# shingles hashed per block when computing signatures, bounding the temporary arrays
+SHINGLE_BLOCK_SIZE = 100_000
+
+
+def get_shingles(text: str) -> List[str]:
+    """
+    Returns the character shingles of a lowercased text, or the text itself when it is shorter.
+    """
+    text = text.lower()
+    if len(text) <= SHINGLE_SIZE:
+        return [text]
+    return [text[start : start + SHINGLE_SIZE] for start in range(len(text) - SHINGLE_SIZE + 1)]
+
+
+def minhash_signatures(texts: List[str], num_permutations: int = NUM_PERMUTATIONS) -> np.ndarray:
+    """
+    Returns a (len(texts), num_permutations) MinHash signature matrix. The fraction of equal
+    entries of two rows estimates the Jaccard similarity of the texts' shingle sets.
+    """
+    shingles = [get_shingles(text) for text in texts]
+    lengths = np.array([len(text_shingles) for text_shingles in shingles], dtype=np.int64)
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    flat_shingles = [shingle for text_shingles in shingles for shingle in text_shingles]
+    hashes = pd.util.hash_array(np.array(flat_shingles, dtype=object)) & np.uint64(0xFFFFFFFF)
+
+    rng = np.random.default_rng(MINHASH_SEED)
+    multipliers = rng.integers(1, MERSENNE_PRIME, num_permutations, dtype=np.uint64)
+    increments = rng.integers(0, MERSENNE_PRIME, num_permutations, dtype=np.uint64)
+
+    signatures = np.empty((len(texts), num_permutations), dtype=np.uint64)
+    start_text = 0
+    while start_text < len(texts):
+        # blocks hold whole texts so each text's minimum comes from a single reduceat
+        block_end = np.searchsorted(offsets, offsets[start_text] + SHINGLE_BLOCK_SIZE, side="right")
+        end_text = max(int(block_end) - 1, start_text + 1)
+        block = hashes[offsets[start_text] : offsets[end_text], None]
+        permuted = (block * multipliers + increments) % MERSENNE_PRIME
+        signatures[start_text:end_text] = np.minimum.reduceat(
+            permuted, offsets[start_text:end_text] - offsets[start_text], axis=0
+        )
+        start_text = end_text
+    return signatures
+
+
+def find_root(parents: np.ndarray, node: int) -> int:
+    """
+    Returns the representative of a node's cluster, compressing the path to it.
+    """
+    root = node
+    while parents[root] != root:
+        root = parents[root]
+    while parents[node] != root:
+        parents[node], node = root, parents[node]
+    return root
+
+
+def cluster_near_duplicates(
+    signatures: np.ndarray, similarity: float = DEFAULT_SIMILARITY, bands: int = LSH_BANDS
+) -> np.ndarray:
+    """
+    Groups rows whose signatures agree on at least the similarity fraction of entries.
+    Only rows sharing an LSH band are compared. Returns the cluster of each row,
+    numbered by the cluster's first row.
+    """
+    parents = np.arange(len(signatures))
+    rows_per_band = signatures.shape[1] // bands
+    for band in range(bands):
+        band_signatures = signatures[:, band * rows_per_band : (band + 1) * rows_per_band]
+        _, bucket_of_row = np.unique(band_signatures, axis=0, return_inverse=True)
+        bucket_of_row = bucket_of_row.ravel()
+        order = np.argsort(bucket_of_row, kind="stable")
+        starts = np.flatnonzero(np.diff(bucket_of_row[order], prepend=-1))
+        for bucket_rows in np.split(order, starts[1:]):
+            if len(bucket_rows) < 2:
+                continue
+            first = bucket_rows[0]
+            agreement = (signatures[bucket_rows[1:]] == signatures[first]).mean(axis=1)
+            for row in bucket_rows[1:][agreement >= similarity]:
+                first_root, row_root = find_root(parents, first), find_root(parents, row)
+                parents[max(first_root, row_root)] = min(first_root, row_root)
+    return np.array([find_root(parents, row) for row in range(len(parents))])
+
+
+def get_duplicate_clusters(texts: pd.Series, similarity: float = DEFAULT_SIMILARITY) -> np.ndarray:
+    """
+    Returns a cluster id per text shared by its exact and near duplicates.
+    Exact copies share a normalized text and are only hashed once.
+    """
+    text_codes, unique_texts = pd.factorize(texts.map(normalize_text))
+    unique_clusters = cluster_near_duplicates(minhash_signatures(list(unique_texts)), similarity)
+    return unique_clusters[text_codes]
+
+
+def collapse_duplicates(
+    data_frame: pd.DataFrame,
+    clusters: Optional[np.ndarray] = None,
+    similarity: float = DEFAULT_SIMILARITY,
+) -> pd.DataFrame:
+    """
+    Collapses exact and near-duplicate tweets into the first row of each group, with a
+    multiplicity column counting the rows it stands for. Rows that already carry a
+    multiplicity contribute it instead of 1. Pass the rows' clusters if they were
+    computed over a larger frame.
+    """
+    multiplicity = (
+        data_frame["multiplicity"].to_numpy(dtype=np.int64)
+        if "multiplicity" in data_frame
+        else np.ones(len(data_frame), dtype=np.int64)
+    )
+    if clusters is None:
+        clusters = get_duplicate_clusters(data_frame["text"], similarity)
+
+    _, first_rows, cluster_codes = np.unique(clusters, return_index=True, return_inverse=True)
+    collapsed = data_frame.iloc[np.sort(first_rows)].copy()
+    cluster_multiplicity = np.bincount(cluster_codes.ravel(), weights=multiplicity)
+    collapsed["multiplicity"] = cluster_multiplicity[np.argsort(first_rows)].astype(np.int32)
+    return collapsed
+
+
+def spread_to_duplicates(
+    collapsed_values: pd.DataFrame, collapsed_clusters: np.ndarray, clusters: np.ndarray
+) -> pd.DataFrame:
+    """
+    Repeats the values of each collapsed row for every tweet of its cluster: row i of the
+    result holds the values of the collapsed row of clusters[i]. collapsed_clusters holds
+    the cluster of each collapsed row, once each.
+    """
+    positions = pd.Index(collapsed_clusters).get_indexer(clusters)
+    return collapsed_values.iloc[positions].reset_index(drop=True)
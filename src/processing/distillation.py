@@ -0,0 +1,169 @@
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from src.models.distilled_sentiment import DistilledSentimentModel, get_distilled_model_path
+from src.processing.sentiment_analysis import SENTIMENT_LABELS, get_model_id, score_texts_cached
+from src.processing.storage import PROCESSED_DIRECTORY, read_all_company_tweets
+
+DISTILLATION_REPORT_PATH = PROCESSED_DIRECTORY / "distillation_report.json"
+# share of the labeled tweets held out to measure agreement with the transformer
+VALIDATION_FRACTION = 0.1
+# share of the labeled tweets held out to calibrate the distilled model's confidence
+CALIBRATION_FRACTION = 0.1
+# confidence thresholds the report shows routing and agreement at
+REPORT_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99]
+
+
+@dataclass
+class ThresholdReport:
+    """
+    Routing and agreement with the transformer of a cascade at one confidence threshold.
+    """
+
+    threshold: float
+    # share of tweets the distilled model keeps, the rest go to the transformer
+    distilled_share: float
+    # agreement of the distilled labels that are kept
+    distilled_agreement: float
+    # agreement of the cascade's labels, escalated tweets agreeing by construction
+    cascade_agreement: float
+
+
+@dataclass
+class DistillationReport:
+    """
+    Size, speed and agreement with its teacher of a distilled sentiment model,
+    measured on held-out tweets.
+    """
+
+    teacher: str
+    train_size: int
+    calibration_size: int
+    validation_size: int
+    # softmax temperature fitted on the calibration tweets
+    temperature: float
+    train_seconds: float
+    tweets_per_second: float
+    # agreement when the distilled model labels every tweet
+    agreement: float
+    thresholds: List[ThresholdReport] = field(default_factory=list)
+
+
+def get_teacher_labels(texts: List[str]) -> List[str]:
+    """
+    Returns the selected backend's label of each text, from the sentiment cache where possible.
+    """
+    keys, results, _ = score_texts_cached(texts)
+    return [results[key][0] for key in keys]
+
+
+def evaluate_thresholds(
+    probabilities: np.ndarray, predicted: np.ndarray, expected: np.ndarray
+) -> List[ThresholdReport]:
+    """
+    Measures routing and agreement at each of REPORT_THRESHOLDS.
+    """
+    confidences = probabilities.max(axis=1)
+    agrees = predicted == expected
+    reports = []
+    for threshold in REPORT_THRESHOLDS:
+        kept = confidences >= threshold
+        reports.append(
+            ThresholdReport(
+                threshold=threshold,
+                distilled_share=round(float(kept.mean()), 4),
+                distilled_agreement=round(float(agrees[kept].mean()), 4) if kept.any() else 1.0,
+                cascade_agreement=round(float((agrees | ~kept).mean()), 4),
+            )
+        )
+    return reports
+
+
+def distill_sentiment_model(max_tweets: int, seed: int = 0) -> DistillationReport:
+    """
+    Trains the cascade's distilled model on the transformer's labels of up to max_tweets
+    distinct stored tweets and saves it. Labels come from the sentiment cache, which only
+    holds transformer results, so run the pipeline without the cascade first; uncached
+    tweets are scored. The model's confidence is calibrated on one held-out slice and
+    its agreement measured on another.
+    """
+    texts = pd.unique(
+        pd.concat([data_frame["text"] for data_frame in read_all_company_tweets(["text"])])
+    ).tolist()
+    if not texts:
+        raise ValueError("No stored tweets to distill from, run the pipeline first")
+    rng = np.random.default_rng(seed)
+    if len(texts) > max_tweets:
+        sample = np.sort(rng.choice(len(texts), max_tweets, replace=False))
+        texts = [texts[position] for position in sample]
+    labels = np.array(get_teacher_labels(texts), dtype=object)
+
+    slices = rng.random(len(texts))
+    is_validation = slices < VALIDATION_FRACTION
+    is_calibration = ~is_validation & (slices < VALIDATION_FRACTION + CALIBRATION_FRACTION)
+    train_positions = np.flatnonzero(~is_validation & ~is_calibration)
+    calibration_positions = np.flatnonzero(is_calibration)
+    validation_positions = np.flatnonzero(is_validation)
+    train_texts = [texts[position] for position in train_positions]
+    calibration_texts = [texts[position] for position in calibration_positions]
+    validation_texts = [texts[position] for position in validation_positions]
+
+    start = time.perf_counter()
+    model = DistilledSentimentModel.fit(
+        train_texts,
+        labels[train_positions],
+        label_names=SENTIMENT_LABELS,
+        teacher=get_model_id(),
+        seed=seed,
+    )
+    model.calibrate(calibration_texts, labels[calibration_positions])
+    train_seconds = time.perf_counter() - start
+    model.save(get_distilled_model_path(model.teacher))
+
+    start = time.perf_counter()
+    probabilities = model.predict_proba(validation_texts)
+    predict_seconds = time.perf_counter() - start
+    predicted = np.array(model.labels, dtype=object)[probabilities.argmax(axis=1)]
+    expected = labels[validation_positions]
+    return DistillationReport(
+        teacher=model.teacher,
+        train_size=len(train_texts),
+        calibration_size=len(calibration_texts),
+        validation_size=len(validation_texts),
+        temperature=round(model.temperature, 4),
+        train_seconds=round(train_seconds, 3),
+        tweets_per_second=(
+            round(len(validation_texts) / predict_seconds, 1) if predict_seconds > 0 else 0.0
+        ),
+        agreement=round(float((predicted == expected).mean()), 4) if len(expected) else 1.0,
+        thresholds=evaluate_thresholds(probabilities, predicted, expected),
+    )
+
+
+def write_distillation_report(report: DistillationReport, path: Path = DISTILLATION_REPORT_PATH):
+    """
+    Writes a distillation report as JSON.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(asdict(report), file, indent=2)
+
+
+def print_distillation_report(report: DistillationReport):
+    """
+    Prints the agreement and routing of the distilled model at every threshold.
+    """
+    print(
+        f"Distilled from {report.teacher} on {report.train_size} tweets in "
+        f"{report.train_seconds:.1f}s, {report.tweets_per_second:.0f} tweets/s, "
+        f"{report.agreement:.1%} agreement on {report.validation_size} held-out tweets, "
+        f"temperature {report.temperature:.2f} from {report.calibration_size} tweets"
+    )
+    thresholds = pd.DataFrame([asdict(threshold) for threshold in report.thresholds])
+    print(thresholds.to_string(index=False))
@@ -0,0 +1,86 @@
+import atexit
+import multiprocessing
+import os
+from typing import Callable, Iterable, Iterator, List, Optional, TypeVar
+
+from src.resources.settings import Settings, settings
+
+Result = TypeVar("Result")
+
+
+def _init_worker(threads_per_worker: int, parent_settings: Settings):
+    # the thread count is set before the worker loads the model on its first batch
+    import torch  # pylint: disable=import-outside-toplevel
+
+    settings.__dict__.update(parent_settings.__dict__)
+    torch.set_num_threads(threads_per_worker)
+
+
+def get_threads_per_worker(workers: int, threads_per_worker: Optional[int] = None) -> int:
+    """
+    Returns the torch thread count of each worker, splitting the cores evenly by default.
+    """
+    if threads_per_worker:
+        return threads_per_worker
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+class ProcessPoolInferenceEngine:
+    """
+    Fans batches out to a pool of worker processes that each hold the model,
+    streaming the results back in input order. Workers are spawned rather than forked:
+    by the time the pool starts, the parent has run the tokenizer's and possibly torch's
+    thread pools, which a forked child inherits in a broken state.
+    """
+
+    def __init__(
+        self,
+        score_batch: Callable[[List[str]], List[Result]],
+        workers: int,
+        threads_per_worker: Optional[int] = None,
+    ):
+        self.score_batch = score_batch
+        self.workers = workers
+        context = multiprocessing.get_context("spawn")
+        self.pool = context.Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(get_threads_per_worker(workers, threads_per_worker), settings),
+        )
+
+    def imap(self, batches: Iterable[List[str]]) -> Iterator[List[Result]]:
+        """
+        Scores the batches across the pool and yields each batch's results in order.
+        """
+        return self.pool.imap(self.score_batch, batches)
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        self.pool.close()
+        self.pool.join()
+
+
+_engines = {}
+
+
+def get_inference_engine(
+    score_batch: Callable[[List[str]], List[Result]],
+    workers: int,
+    threads_per_worker: Optional[int] = None,
+) -> ProcessPoolInferenceEngine:
+    """
+    Returns a pool for score_batch that is started once and reused for every brand.
+    """
+    key = (score_batch, workers, threads_per_worker)
+    if key not in _engines:
+        _engines[key] = ProcessPoolInferenceEngine(score_batch, workers, threads_per_worker)
+    return _engines[key]
+
+
+@atexit.register
+def _close_engines():
+    for engine in _engines.values():
+        engine.close()
+    _engines.clear()
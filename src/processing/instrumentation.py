@@ -0,0 +1,230 @@
+import cProfile
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+DEFAULT_RUN_REPORT_PATH = Path("data/processed/run_report.json")
+LATENCY_PERCENTILES = [50, 90, 99]
+
+
+def get_peak_rss_mb() -> Optional[float]:
+    """
+    Returns the highest resident memory of this process so far in MiB, if the platform reports it.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kibibytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+@dataclass
+class StageRecord:
+    """
+    Timing, row counts and memory of one stage, for one company or the whole run.
+    """
+
+    stage: str
+    company: Optional[str] = None
+    # tweet language of a stage run per language, e.g. sentiment_language
+    language: Optional[str] = None
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    wall_seconds: float = 0.0
+    rows_per_second: Optional[float] = None
+    # high-water mark of the process that ran the stage, when it finished
+    peak_rss_mb: Optional[float] = None
+    batch_count: int = 0
+    # model batch latency percentiles in milliseconds, by percentile
+    batch_latency_ms: Dict[str, float] = field(default_factory=dict)
+    batch_latencies: List[float] = field(default_factory=list, repr=False)
+    # stage-specific counts, e.g. how many tweets each sentiment cascade tier answered
+    counters: Dict[str, int] = field(default_factory=dict)
+
+    def finish(self, wall_seconds: float):
+        """
+        Fills in the derived figures once the stage is done.
+        """
+        self.wall_seconds = round(wall_seconds, 6)
+        rows = self.rows_in if self.rows_in is not None else self.rows_out
+        if rows is not None and wall_seconds > 0:
+            self.rows_per_second = round(rows / wall_seconds, 2)
+        self.peak_rss_mb = get_peak_rss_mb()
+        self.batch_count = len(self.batch_latencies)
+        if self.batch_latencies:
+            latencies_ms = np.percentile(np.array(self.batch_latencies) * 1000, LATENCY_PERCENTILES)
+            self.batch_latency_ms = {
+                f"p{percentile}": round(float(latency), 3)
+                for percentile, latency in zip(LATENCY_PERCENTILES, latencies_ms)
+            }
+
+    def to_dict(self) -> dict:
+        """
+        Returns the record as JSON-serializable values, without the raw latencies.
+        """
+        record = asdict(self)
+        del record["batch_latencies"]
+        return record
+
+
+# stages being timed, per thread so that a stage only collects what its own thread measures
+_thread_state = threading.local()
+
+
+def _get_active_records() -> List[StageRecord]:
+    """
+    Returns the stages being timed in this thread, innermost last.
+    """
+    if not hasattr(_thread_state, "active_records"):
+        _thread_state.active_records = []
+    return _thread_state.active_records
+
+
+@contextmanager
+def time_stage(
+    stage: str,
+    company: Optional[str] = None,
+    rows_in: Optional[int] = None,
+    language: Optional[str] = None,
+) -> Iterator[StageRecord]:
+    """
+    Times the enclosed block. Set rows_out on the yielded record before the block ends.
+    """
+    record = StageRecord(stage=stage, company=company, language=language, rows_in=rows_in)
+    active_records = _get_active_records()
+    active_records.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        active_records.remove(record)
+        record.finish(time.perf_counter() - start)
+
+
+def record_batch_latency(seconds: float):
+    """
+    Adds a model batch latency to every stage being timed in this thread, e.g. to a company's
+    sentiment stage and the language stage nested in it.
+    """
+    for record in _get_active_records():
+        record.batch_latencies.append(seconds)
+
+
+def record_counters(**counts: int):
+    """
+    Adds counts to the counters of every stage being timed in this thread.
+    """
+    for record in _get_active_records():
+        for name, count in counts.items():
+            record.counters[name] = record.counters.get(name, 0) + int(count)
+
+
+class RunReport:
+    """
+    Stage records of a pipeline run, written as a JSON report.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.records: List[StageRecord] = []
+
+    def add(self, record: StageRecord):
+        """
+        Adds a finished record, e.g. one measured in a worker process.
+        """
+        self.records.append(record)
+
+    @contextmanager
+    def stage(
+        self,
+        stage: str,
+        company: Optional[str] = None,
+        rows_in: Optional[int] = None,
+        language: Optional[str] = None,
+    ) -> Iterator[StageRecord]:
+        """
+        Times the enclosed block and adds its record to the report.
+        """
+        with time_stage(stage, company, rows_in, language) as record:
+            yield record
+        self.add(record)
+
+    def summary(self) -> Dict[str, dict]:
+        """
+        Totals wall time, rows and counters per stage over every company,
+        and wall time, rows and throughput per language for stages run per language.
+        """
+        summary: Dict[str, dict] = {}
+        for record in self.records:
+            totals = summary.setdefault(
+                record.stage, {"records": 0, "wall_seconds": 0.0, "rows_in": 0, "rows_out": 0}
+            )
+            totals["records"] += 1
+            totals["wall_seconds"] = round(totals["wall_seconds"] + record.wall_seconds, 6)
+            totals["rows_in"] += record.rows_in or 0
+            totals["rows_out"] += record.rows_out or 0
+            for name, count in record.counters.items():
+                counters = totals.setdefault("counters", {})
+                counters[name] = counters.get(name, 0) + count
+            if record.language is not None:
+                language = totals.setdefault("languages", {}).setdefault(
+                    record.language, {"wall_seconds": 0.0, "rows_in": 0, "rows_per_second": None}
+                )
+                language["wall_seconds"] = round(language["wall_seconds"] + record.wall_seconds, 6)
+                language["rows_in"] += record.rows_in or 0
+                if language["wall_seconds"] > 0:
+                    language["rows_per_second"] = round(
+                        language["rows_in"] / language["wall_seconds"], 2
+                    )
+        return summary
+
+    def write(self, path: Path = DEFAULT_RUN_REPORT_PATH, run_settings: Optional[dict] = None):
+        """
+        Writes the records, per-stage totals and the run's settings as JSON.
+        """
+        report = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started_at)),
+            "wall_seconds": round(time.time() - self.started_at, 3),
+            "argv": sys.argv,
+            "settings": run_settings or {},
+            "peak_rss_mb": get_peak_rss_mb(),
+            "summary": self.summary(),
+            "stages": [record.to_dict() for record in self.records],
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, default=str)
+
+
+run_report = RunReport()
+
+
+@contextmanager
+def profile_to(path: Optional[str]) -> Iterator[None]:
+    """
+    Runs the enclosed block under cProfile and dumps pstats to path, or does nothing without a path.
+    The dump opens with pstats, snakeviz or any tool reading cProfile output.
+    """
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(path)
@@ -0,0 +1,209 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.resources.brands_data import Brand, brands
+from src.resources.word_lists import (
+    food_related_keywords,
+    language_keywords,
+    secondary_yogurt_brand_accounts,
+    secondary_yogurt_brands,
+    yogurt_brand_accounts,
+    yogurt_brand_names,
+    yogurt_keywords,
+)
+
+# keyword lists shared by every brand filter
+KEYWORD_LIST_GROUPS: Dict[str, List[str]] = {
+    "yogurt_keywords": yogurt_keywords,
+    "food_related_keywords": food_related_keywords,
+    "yogurt_brand_accounts": yogurt_brand_accounts,
+    "secondary_yogurt_brands": secondary_yogurt_brands,
+    "secondary_yogurt_brand_accounts": secondary_yogurt_brand_accounts,
+}
+
+
+def brand_group(brand: Brand) -> str:
+    """
+    Name of the group holding a brand's handles, name and alternate names.
+    """
+    return f"brand:{brand.brand_name}"
+
+
+def brand_name_group(brand_name: str) -> str:
+    """
+    Name of the group holding a single entry of yogurt_brand_names.
+    """
+    return f"brand_name:{brand_name}"
+
+
+def negative_keyword_group(brand: Brand) -> str:
+    """
+    Name of the group holding a brand's negative keywords.
+    """
+    return f"negative:{brand.brand_name}"
+
+
+def get_brand_keywords(brand: Brand) -> List[str]:
+    """
+    Returns the keywords that count as a mention of the brand.
+    """
+    return brand.twitter_handles + [brand.brand_name.lower()] + brand.alternate_names
+
+
+@dataclass
+class KeywordMatches:
+    """
+    Per-tweet bitsets of the keyword groups found in each tweet.
+    """
+
+    bitsets: np.ndarray
+    group_index: Dict[str, int]
+    index: pd.Index
+
+    def has(self, group: str) -> np.ndarray:
+        """
+        Returns a boolean array that is True for tweets containing the group.
+        """
+        bit = self.group_index[group]
+        return ((self.bitsets[:, bit // 8] >> (bit % 8)) & 1).astype(bool)
+
+    def has_any(self, groups: Iterable[str]) -> np.ndarray:
+        """
+        Returns a boolean array that is True for tweets containing any of the groups.
+        """
+        result = np.zeros(len(self.bitsets), dtype=bool)
+        for group in groups:
+            result |= self.has(group)
+        return result
+
+
+class KeywordMatcher:
+    """
+    Finds every keyword group of a tweet with a single scan of its lowercased text.
+    """
+
+    def __init__(self, keyword_groups: Dict[str, List[str]]):
+        self.group_index = {group: bit for bit, group in enumerate(keyword_groups)}
+        self.n_bytes = max(1, (len(self.group_index) + 7) // 8)
+
+        keyword_masks: Dict[str, int] = {}
+        for group, keywords in keyword_groups.items():
+            bit = 1 << self.group_index[group]
+            for keyword in keywords:
+                keyword = keyword.lower()
+                if keyword:
+                    keyword_masks[keyword] = keyword_masks.get(keyword, 0) | bit
+
+        # a keyword found in a tweet means every keyword it contains is in the tweet too,
+        # so only the longest keyword starting at each position needs to be reported
+        self.keyword_masks: Dict[str, int] = {}
+        for keyword in keyword_masks:
+            mask = 0
+            for other, other_mask in keyword_masks.items():
+                if other in keyword:
+                    mask |= other_mask
+            self.keyword_masks[keyword] = mask
+
+        self.pattern: Optional[re.Pattern] = None
+        if self.keyword_masks:
+            alternation = "|".join(
+                re.escape(keyword) for keyword in sorted(self.keyword_masks, key=len, reverse=True)
+            )
+            # the lookahead reports a match at every position so overlapping keywords are kept
+            self.pattern = re.compile(f"(?=({alternation}))")
+
+    def match(self, texts: pd.Series) -> KeywordMatches:
+        """
+        Returns the keyword group bitsets for every tweet in texts.
+        """
+        masks = []
+        if self.pattern is not None:
+            findall = self.pattern.findall
+            keyword_masks = self.keyword_masks
+            for text in texts.fillna("").astype(str).str.lower():
+                mask = 0
+                for keyword in findall(text):
+                    mask |= keyword_masks[keyword]
+                masks.append(mask)
+        else:
+            masks = [0] * len(texts)
+
+        packed = b"".join(mask.to_bytes(self.n_bytes, "little") for mask in masks)
+        bitsets = np.frombuffer(packed, dtype=np.uint8).reshape(len(masks), self.n_bytes)
+        return KeywordMatches(bitsets, self.group_index, texts.index)
+
+
+def build_keyword_matcher(
+    brand_list: Iterable[Brand], extra_keywords: Optional[Dict[str, List[str]]] = None
+) -> KeywordMatcher:
+    """
+    Builds a matcher over the shared keyword lists, every yogurt brand name,
+    every brand and every brand's negative keywords.
+    extra_keywords adds keywords to shared lists by group name, e.g. another language's words.
+    """
+    extra_keywords = extra_keywords or {}
+    keyword_groups = {
+        group: keywords + extra_keywords.get(group, [])
+        for group, keywords in KEYWORD_LIST_GROUPS.items()
+    }
+    for brand_name in yogurt_brand_names:
+        keyword_groups[brand_name_group(brand_name)] = [brand_name]
+    for brand in brand_list:
+        keyword_groups[brand_group(brand)] = get_brand_keywords(brand)
+        if brand.negative_keywords:
+            keyword_groups[negative_keyword_group(brand)] = brand.negative_keywords
+    return KeywordMatcher(keyword_groups)
+
+
+@lru_cache(maxsize=None)
+def get_keyword_matcher() -> KeywordMatcher:
+    """
+    Returns the matcher for all brands, built once per process.
+    """
+    return build_keyword_matcher(brands.values())
+
+
+@lru_cache(maxsize=None)
+def get_language_keyword_matcher(language: str) -> KeywordMatcher:
+    """
+    Returns the matcher for all brands with the shared keyword lists extended by
+    a language's keywords, built once per process. Its groups are those of get_keyword_matcher.
+    """
+    if language not in language_keywords:
+        return get_keyword_matcher()
+    return build_keyword_matcher(brands.values(), language_keywords[language])
+
+
+def brand_relevance_mask(matches: KeywordMatches, brand: Brand) -> np.ndarray:
+    """
+    Returns a boolean array that is True for tweets relevant to the brand.
+    """
+    mentions_brand = matches.has(brand_group(brand))
+    if not brand.is_nonspecific_name:
+        # the brand's own keywords are part of the combined keyword list,
+        # so a mention of the brand is enough
+        return mentions_brand
+
+    # If the brand name is a common word, unaffiliated name or brand,
+    # we need to at least have another brand mention or yogurt keyword
+    brand_name_lower = brand.brand_name.lower()
+    other_brand_names = [
+        brand_name_group(brand_name)
+        for brand_name in yogurt_brand_names
+        if brand_name != brand_name_lower
+    ]
+    return mentions_brand & matches.has_any(list(KEYWORD_LIST_GROUPS) + other_brand_names)
+
+
+def negative_keyword_mask(matches: KeywordMatches, brand: Brand) -> np.ndarray:
+    """
+    Returns a boolean array that is True for tweets containing one of the brand's negative keywords.
+    """
+    if not brand.negative_keywords:
+        return np.zeros(len(matches.bitsets), dtype=bool)
+    return matches.has(negative_keyword_group(brand))
@@ -0,0 +1,75 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from src.processing.brand_partition import partition_tweets_by_brand
+from src.processing.instrumentation import record_counters
+from src.processing.keyword_matcher import get_language_keyword_matcher
+from src.resources.settings import settings
+
+# Twitter's lang code for tweets whose language it could not determine
+UNDETERMINED_LANGUAGE = "und"
+
+
+def get_tweet_languages(data_frame: pd.DataFrame) -> np.ndarray:
+    """
+    Returns the lang of each tweet, undetermined where the column or the value is missing.
+    """
+    if "lang" not in data_frame:
+        return np.full(len(data_frame), UNDETERMINED_LANGUAGE, dtype=object)
+    return data_frame["lang"].astype(object).fillna(UNDETERMINED_LANGUAGE).to_numpy()
+
+
+def group_by_language(languages: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Returns the sorted positions of the tweets in each language.
+    """
+    codes, unique_languages = pd.factorize(languages)
+    order = np.argsort(codes, kind="stable")
+    boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+    return {
+        str(unique_languages[codes[positions[0]]]): positions
+        for positions in np.split(order, boundaries)
+        if len(positions)
+    }
+
+
+def is_language_routed(language: str) -> bool:
+    """
+    Whether tweets in a language are scored, by the sentiment model or a language's own model.
+    """
+    return language in settings.languages or language in settings.language_models
+
+
+def partition_tweets_by_language(data_frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Assigns tweets to brands like partition_tweets_by_brand, matching the tweets of each
+    routed language against that language's keyword sets. Tweets in other languages are
+    dropped without being scanned. The tweets and brand-relevant tweets of every routed
+    language and the skipped tweets of every other go to the counters of the stage being timed.
+    """
+    languages = get_tweet_languages(data_frame)
+    partitions = []
+    counts: Dict[str, int] = {}
+    for language, positions in group_by_language(languages).items():
+        if not is_language_routed(language):
+            counts[f"skipped_{language}"] = len(positions)
+            continue
+        tweets = data_frame if len(positions) == len(data_frame) else data_frame.iloc[positions]
+        partition = partition_tweets_by_brand(
+            tweets, matches=get_language_keyword_matcher(language).match(tweets["text"])
+        )
+        counts[f"routed_{language}"] = len(positions)
+        counts[f"relevant_{language}"] = partition["tweet_id"].nunique()
+        partitions.append(partition)
+    record_counters(**counts)
+
+    if not partitions:
+        return partition_tweets_by_brand(data_frame.iloc[:0])
+    if len(partitions) == 1:
+        return partitions[0]
+    # same order as a single partition: by brand, then by tweet
+    return pd.concat(partitions, ignore_index=True).sort_values(
+        ["brand", "tweet_id"], kind="stable", ignore_index=True
+    )
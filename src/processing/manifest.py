@@ -0,0 +1,138 @@
+import hashlib
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List
+
+from src.processing.storage import PROCESSED_DIRECTORY
+from src.resources import brands_data, word_lists
+from src.resources.settings import settings
+
+MANIFEST_PATH = PROCESSED_DIRECTORY / "manifest.json"
+
+# changes to these files change which tweets are relevant, so they force a full rebuild
+CONFIG_FILES = [
+    Path(word_lists.__file__),
+    Path(brands_data.__file__),
+]
+
+# settings that change the stored rows, so changing them also forces a full rebuild;
+# the scored languages and their models are part of the model id
+STORED_ROW_SETTINGS = [
+    "dedup",
+    "dedup_similarity",
+    "cascade",
+    "cascade_threshold",
+    "cascade_validation_rate",
+]
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+@dataclass
+class Manifest:
+    """
+    Hashes of the inputs the processed outputs were built from.
+    """
+
+    config_hash: str = ""
+    files: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class IncrementalPlan:
+    """
+    What an incremental run has to reprocess.
+    """
+
+    full_rebuild: bool
+    # new or changed raw files to process
+    changed_files: List[str]
+    # raw files whose previous rows must be dropped from the outputs
+    replaced_files: List[str]
+    manifest: Manifest
+
+
+def hash_file(path: Path) -> str:
+    """
+    Returns the sha256 of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_config_hash(model_id: str) -> str:
+    """
+    Returns a hash of the word lists, brand configuration, the settings that change
+    stored rows and sentiment model id, which may name the model of every scored language.
+    """
+    digest = hashlib.sha256(model_id.encode("utf-8"))
+    for path in CONFIG_FILES:
+        digest.update(path.read_bytes())
+    stored_row_settings = {name: getattr(settings, name) for name in STORED_ROW_SETTINGS}
+    digest.update(json.dumps(stored_row_settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def read_manifest() -> Manifest:
+    """
+    Reads the manifest of the previous run, or an empty one.
+    """
+    if not MANIFEST_PATH.exists():
+        return Manifest()
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as file:
+        return Manifest(**json.load(file))
+
+
+def write_manifest(manifest: Manifest):
+    """
+    Records the inputs the current outputs were built from.
+    """
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as file:
+        json.dump(asdict(manifest), file, indent=2, sort_keys=True)
+
+
+def invalidate_manifest():
+    """
+    Removes the manifest while outputs are rewritten, so an interrupted run forces a full rebuild.
+    """
+    MANIFEST_PATH.unlink(missing_ok=True)
+
+
+def plan_incremental_run(
+    csv_files: List[str], model_id: str, full_rebuild: bool = False
+) -> IncrementalPlan:
+    """
+    Compares the raw files and configuration against the previous manifest.
+    Falls back to a full rebuild when asked to, when there is no manifest,
+    when the configuration changed or when dedup is on: duplicates are collapsed across
+    all raw files, and a stored row does not record which files its copies came from.
+    """
+    previous = read_manifest()
+    manifest = Manifest(
+        config_hash=get_config_hash(model_id),
+        files={csv_file: hash_file(Path(csv_file)) for csv_file in csv_files},
+    )
+
+    if (
+        full_rebuild
+        or settings.dedup
+        or not previous.files
+        or previous.config_hash != manifest.config_hash
+    ):
+        return IncrementalPlan(True, list(csv_files), [], manifest)
+
+    changed_files = [
+        csv_file
+        for csv_file, file_hash in manifest.files.items()
+        if previous.files.get(csv_file) != file_hash
+    ]
+    removed_files = [csv_file for csv_file in previous.files if csv_file not in manifest.files]
+    replaced_files = [
+        csv_file for csv_file in changed_files if csv_file in previous.files
+    ] + removed_files
+    return IncrementalPlan(False, changed_files, replaced_files, manifest)
@@ -1,18 +1,43 @@
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Optional, Tuple
 
 import pandas as pd
 
-from src.processing.sentiment_analysis import analyze
-from src.resources.brands_data import Brand, brands
-from src.resources.word_lists import (
-    food_related_keywords,
-    yogurt_keywords,
-    secondary_yogurt_brand_accounts,
-    secondary_yogurt_brands,
-    yogurt_brand_accounts,
-    yogurt_brand_names,
+from src.processing.brand_partition import (
+    get_brand_tweet_ids,
+    partition_tweets_by_brand,
+    select_brand_tweets,
 )
+from src.processing.dedup import (
+    collapse_duplicates,
+    get_duplicate_clusters,
+    spread_to_duplicates,
+)
+from src.processing.instrumentation import run_report
+from src.processing.language_routing import partition_tweets_by_language
+from src.processing.manifest import (
+    invalidate_manifest,
+    plan_incremental_run,
+    write_manifest,
+)
+from src.processing.profiler import DataProfile
+from src.processing.rollup import build_rollup
+from src.processing.schema import (
+    RAW_DTYPES,
+    apply_schema,
+    concat_typed,
+    empty_typed_frame,
+)
+from src.processing.sentiment_analysis import analyze, get_language_routing_id
+from src.processing.storage import (
+    merge_company_rollup,
+    merge_company_tweets,
+    write_combined_tweets,
+    write_company_rollup,
+    write_company_tweets,
+)
+from src.resources.brands_data import brands
+from src.resources.settings import settings
 
 
 def get_csv_files() -> List[str]:
@@ -23,27 +48,76 @@ def get_csv_files() -> List[str]:
     return csv_files
 
 
+# raw rows read from a csv file at a time, bounds the memory of ingest
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def iter_csv_chunks(
+    csv_files: List[str], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[pd.DataFrame]:
+    """
+    Reads the csv files in chunks of chunk_size rows holding only the RAW_DTYPES columns,
+    plus the source_file each row was read from, typed by apply_schema.
+    """
+    for csv_file in csv_files:
+        with open(csv_file, "r", encoding="utf-8", errors="ignore") as file:
+            for chunk in pd.read_csv(
+                file,
+                usecols=lambda column: column in RAW_DTYPES,
+                dtype=RAW_DTYPES,
+                chunksize=chunk_size,
+            ):
+                # remember which raw file each row came from for incremental runs
+                chunk["source_file"] = csv_file
+                yield apply_schema(chunk)
+
+
 def combine_csv_data(csv_files: List[str]) -> pd.DataFrame:
     """
     Combines all csv files into a single pandas dataframe.
     """
-    data_frames = []
-    for file in csv_files:
-        with open(file, "r", encoding="utf-8", errors="ignore") as file:
-            data_frames.append(pd.read_csv(file))
-    data_frame = pd.concat(data_frames, ignore_index=True)
+    data_frame = concat_typed(iter_csv_chunks(csv_files), ignore_index=True)
     return data_frame
 
 
-def write_data_quality_text_file(data_frame: pd.DataFrame):
+def iter_relevant_chunks(
+    csv_files: List[str], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame, int]]:
+    """
+    Streams the csv files chunk by chunk, removing twitter links and keeping only tweets
+    in a scored language relevant to at least one brand. Yields the relevant rows, their
+    (tweet_id, brand) partition and the number of raw rows in the chunk.
+    Tweet ids are unique across chunks.
+    """
+    offset = 0
+    for chunk in iter_csv_chunks(csv_files, chunk_size):
+        raw_row_count = len(chunk)
+        chunk.index = pd.RangeIndex(offset, offset + raw_row_count)
+        offset += raw_row_count
+
+        chunk["text"] = remove_twitter_links(chunk["text"])
+        partition_index = partition_tweets_by_language(chunk)
+        relevant_tweets = chunk.loc[partition_index["tweet_id"].unique()]
+        yield relevant_tweets, partition_index, raw_row_count
+
+
+def remove_twitter_links(text: pd.Series) -> pd.Series:
+    """
+    Removes t.co links so that copies of a tweet with different links dedupe.
+    """
+    # regex test here https://regex101.com/r/wZ0dAP/1
+    return text.str.replace(r"http[s]?://t\.[^\s]*|[^[$]]", "", regex=True)
+
+
+def write_data_quality_text_file(profile: DataProfile):
     """
     Writes a text file with data quality information about the dataset.
     """
     with open(Path("data/processed/data_quality.txt"), "w", encoding="utf-8") as file:
-        file.write(f"Column names:\n{data_frame.columns}\n\n")
-        file.write(f"Number of rows:\n{data_frame.shape[0]}\n\n")
-        file.write(f"Number of null rows:\n{data_frame.isnull().sum()}\n\n")
-        file.write(f"Number of duplicate rows:\n{data_frame.duplicated().sum()}\n\n")
+        file.write(f"Column names:\n{profile.columns}\n\n")
+        file.write(f"Number of rows:\n{profile.row_count}\n\n")
+        file.write(f"Number of null rows:\n{profile.null_counts}\n\n")
+        file.write(f"Number of duplicate rows:\n{profile.duplicate_count}\n\n")
 
         columns_to_remove_from_retweet_data = [
             "lang",
@@ -66,213 +140,166 @@ def write_data_quality_text_file(data_frame: pd.DataFrame):
             "user_time_zone",
             "file",
         ]
-        file.write(
-            f"""highest retweet count entries:\n
-            {data_frame.nlargest(5, 'retweet_count')
-            .drop(columns=columns_to_remove_from_retweet_data)
-            }"""
-        )
+        file.write(f"""highest retweet count entries:\n
+            {profile.top_retweeted
+            .drop(columns=columns_to_remove_from_retweet_data, errors="ignore")
+            }""")
 
-        data_frame.describe().to_csv("data/processed/data_describe.csv")
+        profile.describe().to_csv("data/processed/data_describe.csv")
     file.close()
 
 
-def write_data_quality_csv_file(data_frame: pd.DataFrame):
+def write_data_quality_csv_file(profile: DataProfile):
     """
     Writes a csv file with data quality information about the dataset.
     """
-    statistics_df = pd.DataFrame(
-        {
-            "metric": [
-                "total number of rows",
-                "number of null rows",
-                "number of duplicate rows",
-                "percentage that are retweets",
-            ],
-            "count": [
-                data_frame.shape[0],
-                data_frame.isnull().sum().sum(),
-                data_frame.duplicated().sum(),
-                round(
-                    (
-                        data_frame[data_frame["retweeted"] == "TRUE"].shape[0]
-                        / data_frame.shape[0]
-                    )
-                    * 100,
-                    2,
-                ),
-            ],
-        }
-    )
     csv_path = Path("data/processed/statistics.csv")
-    statistics_df.to_csv(csv_path, index=False)
+    profile.statistics().to_csv(csv_path, index=False)
 
 
-def filter_irrelevant_data(
+def prepare_data_for_filtering(
     data_frame: pd.DataFrame,
-    brand: Brand,
-    relevancy_threshold=5,
-) -> pd.DataFrame:
-    """
-    Returns a filtered DataFrame if the input DataFrame is full of overwhelmingly irrelevant tweets.
-    """
-    # initialize relevant_tweets as an empty DataFrame
-    relevant_tweets = pd.DataFrame()
-    company_twitter_handles = brand.twitter_handles
-    brand_name = brand.brand_name
-    alternate_names = brand.alternate_names
-    brand_name_lower = brand_name.lower()
-
-    company_name_snake_case = brand_name_lower.replace(" ", "_")
-    company_keywords = company_twitter_handles + [brand_name_lower] + alternate_names
-
-    combined_keywords = []
-
-    combined_keywords = (
-        yogurt_keywords
-        + company_keywords
-        + yogurt_brand_names
-        + yogurt_brand_accounts
-        + secondary_yogurt_brands
-        + secondary_yogurt_brand_accounts
-        + (food_related_keywords if brand.has_food_related_name else [])
-    )
-
-    if not brand.has_food_related_name:
-        combined_keywords.extend(food_related_keywords)
-
-    # If the brand name is a common word, unaffiliated name or brand,
-    # we need to at least have another brand mention or yogurt keyword
-    if brand.is_nonspecific_name:
-        # remove the current brand name from the list of yogurt brands
-        if brand_name_lower in yogurt_brand_names:
-            yogurt_brand_names.remove(brand_name_lower)
-
-        relevant_tweets = data_frame[
-            data_frame["text"].apply(
-                lambda x: (
-                    (
-                        brand_name_lower in x.lower()
-                        or any(word in x.lower() for word in company_keywords)
-                    )
-                    and (
-                        (
-                            # if the tweet mentions any yogurt keywords
-                            any(word in x.lower() for word in yogurt_keywords)
-                            # or if the tweet mentions any food related keywords
-                            or any(word in x.lower() for word in food_related_keywords)
-                        )
-                        # if the tweet mentions another yogurt brand
-                        or (
-                            any(word in x.lower() for word in yogurt_brand_names)
-                            or any(word in x.lower() for word in yogurt_brand_accounts)
-                            or any(
-                                word in x.lower() for word in secondary_yogurt_brands
-                            )
-                            or any(
-                                word in x.lower()
-                                for word in secondary_yogurt_brand_accounts
-                            )
-                        )
-                    )
-                )
-            )
-        ]
-    else:
-        relevant_tweets = data_frame[
-            (
-                data_frame["text"].str.contains(brand_name_lower, case=False)
-                | data_frame["text"].apply(
-                    lambda x: any(word in x.lower() for word in company_keywords)
-                )
-            )
-            & data_frame["text"].apply(
-                lambda x: any(word in x.lower() for word in combined_keywords)
-            )
-        ]
-    print(f"Number of relevant {brand_name} tweets found: {len(relevant_tweets)}")
-
-    # if the filtered data_frame is over the specified threshold
-    if len(relevant_tweets) >= relevancy_threshold:
-        return relevant_tweets
-
-    print(f"BELOW RELEVANCY THRESHOLD for {brand_name} tweets. Filtering out...\n\n")
-
-    return relevant_tweets[
-        ~relevant_tweets["file"].str.contains(company_name_snake_case)
-    ]
-
-
-def prepare_data_for_filtering(data_frame: pd.DataFrame) -> List[pd.DataFrame]:
+    partition_index: Optional[pd.DataFrame] = None,
+    replaced_files: Optional[List[str]] = None,
+) -> List[pd.DataFrame]:
     """
     Prepares brand dict to filter out of dataset if they do not have relevant yogurt tweets.
+    Pass the (tweet_id, brand) partition of data_frame if it was already computed while streaming.
+    When replaced_files is given, the results are merged into each company's stored tweets,
+    replacing the rows previously read from those raw files.
     """
     company_data_frame_list = []
 
-    print(f"\n\nTotal Raw Tweets ::: {len(data_frame)}")
+    if partition_index is None:
+        print(f"\n\nTotal Raw Tweets ::: {len(data_frame)}")
+        # assign every tweet to its brands with a single scan of the text
+        partition_index = partition_tweets_by_language(data_frame)
+    brand_tweet_ids = get_brand_tweet_ids(partition_index)
+
+    if settings.dedup:
+        # clusters are found once over all tweets, then collapsed within each brand
+        duplicate_clusters = pd.Series(
+            get_duplicate_clusters(data_frame["text"], settings.dedup_similarity),
+            index=data_frame.index,
+        )
 
     for values in brands.values():
-        filtered_data_frame = filter_irrelevant_data(
-            data_frame,
-            brand=values,
-            relevancy_threshold=0,
-        )
-        filtered_data_frame = remove_tweets_with_negative_keywords(
-            filtered_data_frame, values
-        )
+        company_name = values.brand_name.lower().replace(" ", "_")
+        with run_report.stage("filter", company_name) as filter_record:
+            filtered_data_frame = select_brand_tweets(data_frame, brand_tweet_ids, values)
+            print(
+                f"Number of relevant {values.brand_name} tweets found: {len(filtered_data_frame)}"
+            )
+            filter_record.rows_in = len(filtered_data_frame)
+            uncollapsed_data_frame = filtered_data_frame
+            if settings.dedup:
+                filtered_data_frame = collapse_duplicates(
+                    filtered_data_frame,
+                    duplicate_clusters.loc[filtered_data_frame.index].to_numpy(),
+                )
+                print(f"{len(filtered_data_frame)} after collapsing duplicates")
+            filter_record.rows_out = len(filtered_data_frame)
 
         # send filtered data_frame to sentiment analysis
         copied_df = analyze(
             data_frame=filtered_data_frame,
-            company_name=values.brand_name.lower().replace(" ", "_"),
+            company_name=company_name,
+            write_output=False,
         )
+        rollup_rows = copied_df
+        if settings.dedup:
+            # the rollup counts every copy at its own time and raw file, with the sentiment
+            # of the row it was collapsed into
+            sentiments = spread_to_duplicates(
+                copied_df[["sentiment", "sentiment_score"]],
+                duplicate_clusters.loc[filtered_data_frame.index].to_numpy(),
+                duplicate_clusters.loc[uncollapsed_data_frame.index].to_numpy(),
+            )
+            rollup_rows = uncollapsed_data_frame.reset_index(drop=True).assign(
+                sentiment=sentiments["sentiment"], sentiment_score=sentiments["sentiment_score"]
+            )
+        with run_report.stage("rollup", company_name, rows_in=len(rollup_rows)) as rollup_record:
+            # built from the new tweets only, then merged into the stored rollup
+            rollup = build_rollup(rollup_rows)
+            if replaced_files is not None:
+                rollup = merge_company_rollup(rollup, company_name, replaced_files)
+            write_company_rollup(rollup, company_name)
+            rollup_record.rows_out = len(rollup)
+
+        if replaced_files is not None:
+            copied_df = merge_company_tweets(copied_df, company_name, replaced_files)
+        write_company_tweets(copied_df, company_name)
 
         company_data_frame_list.append(copied_df)
 
-    combined_filtered_data_frame = pd.concat(
+    combined_filtered_data_frame = concat_typed(
         company_data_frame_list, ignore_index=True
     ).drop_duplicates()
-    combined_filtered_data_frame.to_csv(
-        "data/processed/combined_filtered_data_frame.csv", index=False
-    )
-    write_data_quality_text_file(combined_filtered_data_frame)
-    write_data_quality_csv_file(combined_filtered_data_frame)
+    write_combined_tweets(combined_filtered_data_frame)
+    # both reports come from a single pass over the combined tweets
+    profile = DataProfile.from_frame(combined_filtered_data_frame)
+    write_data_quality_text_file(profile)
+    write_data_quality_csv_file(profile)
 
     return company_data_frame_list
 
 
-def remove_tweets_with_negative_keywords(
-    data_frame: pd.DataFrame, brand: Brand
-) -> pd.DataFrame:
-    """
-    Removes tweets with negative keywords from the dataset.
-    """
-    negative_keywords = brand.negative_keywords
-    if len(negative_keywords) == 0:
-        return data_frame
-    negative_keywords_regex = "|".join(negative_keywords).lower()
-    return data_frame[
-        ~data_frame["text"]
-        .str.lower()
-        .str.contains(negative_keywords_regex, case=False)
-    ]
-
-
-def preprocess_data() -> List[pd.DataFrame]:
+def preprocess_data(chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[pd.DataFrame]:
     """
     Calls other functions to preprocess the data.
+    The raw csv files are streamed in chunks so only relevant tweets are held in memory.
+    In incremental mode only new or changed raw files are processed and merged into the outputs.
     """
     csv_list = get_csv_files()
 
-    combined_data_frame = combine_csv_data(csv_list)
-
-    # remove twitter links - regex test here https://regex101.com/r/wZ0dAP/1
-    combined_data_frame["text"] = combined_data_frame["text"].str.replace(
-        r"http[s]?://t\.[^\s]*|[^[$]]", "", regex=True
+    # every run records a manifest so that later incremental runs know what was processed
+    plan = plan_incremental_run(
+        csv_list, get_language_routing_id(), full_rebuild=not settings.incremental
     )
+    replaced_files = None
+    if settings.incremental and plan.full_rebuild:
+        print(
+            "Incremental run: no manifest, configuration changed or dedup on, "
+            "rebuilding everything"
+        )
+    elif settings.incremental:
+        print(
+            f"Incremental run: {len(plan.changed_files)} new or changed raw files, "
+            f"{len(plan.replaced_files)} replaced or removed"
+        )
+        csv_list = plan.changed_files
+        replaced_files = plan.replaced_files
+    invalidate_manifest()
+
+    with run_report.stage("ingest") as ingest_record:
+        relevant_chunks = []
+        partition_chunks = []
+        raw_row_count = 0
+        for relevant_tweets, partition_index, chunk_row_count in iter_relevant_chunks(
+            csv_list, chunk_size
+        ):
+            relevant_chunks.append(relevant_tweets)
+            partition_chunks.append(partition_index)
+            raw_row_count += chunk_row_count
+
+        print(f"\n\nTotal Raw Tweets ::: {raw_row_count}")
+
+        if relevant_chunks:
+            relevant_data_frame = concat_typed(relevant_chunks)
+            partition_index = pd.concat(partition_chunks, ignore_index=True)
+        else:
+            relevant_data_frame = empty_typed_frame()
+            partition_index = partition_tweets_by_brand(relevant_data_frame)
+        ingest_record.rows_in = raw_row_count
+        ingest_record.rows_out = len(relevant_data_frame)
 
     # filter out irrelevant data
-    return prepare_data_for_filtering(combined_data_frame)
+    company_data_frame_list = prepare_data_for_filtering(
+        relevant_data_frame, partition_index, replaced_files
+    )
+
+    write_manifest(plan.manifest)
+    return company_data_frame_list
 
 
 if __name__ == "__main__":
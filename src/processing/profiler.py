@@ -0,0 +1,214 @@
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.processing.schema import concat_typed
+
+DEFAULT_TOP_N = 5
+# rows kept to estimate quantiles, the quantiles are exact for frames up to this size
+DEFAULT_SAMPLE_SIZE = 10_000
+QUANTILES = [0.25, 0.5, 0.75]
+
+
+@dataclass
+class NumericMoments:
+    """
+    Mergeable count, mean, sum of squared deviations, min and max of numeric columns.
+    """
+
+    count: pd.Series
+    mean: pd.Series
+    squared_deviations: pd.Series
+    minimum: pd.Series
+    maximum: pd.Series
+
+    @classmethod
+    def from_frame(cls, numeric: pd.DataFrame) -> "NumericMoments":
+        """
+        Computes the moments of every column of a numeric frame, skipping nulls.
+        """
+        values = numeric.astype("float64")
+        mean = values.mean()
+        return cls(
+            count=values.count(),
+            mean=mean.fillna(0.0),
+            squared_deviations=((values - mean) ** 2).sum(),
+            minimum=values.min(),
+            maximum=values.max(),
+        )
+
+    def merge(self, other: "NumericMoments") -> "NumericMoments":
+        """
+        Combines the moments of two disjoint sets of rows.
+        """
+        count = self.count.add(other.count, fill_value=0)
+        delta = other.mean.sub(self.mean, fill_value=0)
+        own_count = self.count.reindex(count.index, fill_value=0)
+        other_count = other.count.reindex(count.index, fill_value=0)
+        safe_count = count.where(count > 0, 1)
+        mean = (
+            self.mean.mul(own_count, fill_value=0).add(
+                other.mean.mul(other_count, fill_value=0), fill_value=0
+            )
+            / safe_count
+        )
+        squared_deviations = (
+            self.squared_deviations.add(other.squared_deviations, fill_value=0)
+            + delta**2 * own_count * other_count / safe_count
+        )
+        return NumericMoments(
+            count=count,
+            mean=mean,
+            squared_deviations=squared_deviations,
+            minimum=pd.concat([self.minimum, other.minimum], axis=1).min(axis=1),
+            maximum=pd.concat([self.maximum, other.maximum], axis=1).max(axis=1),
+        )
+
+
+@dataclass
+class DataProfile:
+    """
+    Data quality statistics of a set of rows, computed in one pass and mergeable
+    across chunks or companies.
+    """
+
+    columns: pd.Index
+    row_count: int
+    null_counts: pd.Series
+    # distinct row hashes, the duplicate count is the rows beyond them
+    row_hashes: np.ndarray
+    retweet_count: int
+    # rows with the highest retweet_count
+    top_retweeted: pd.DataFrame
+    moments: NumericMoments
+    # numeric values of the rows with the smallest hashes, a deterministic uniform sample
+    quantile_sample: pd.DataFrame
+    top_n: int = DEFAULT_TOP_N
+    sample_size: int = DEFAULT_SAMPLE_SIZE
+
+    @classmethod
+    def from_frame(
+        cls,
+        data_frame: pd.DataFrame,
+        top_n: int = DEFAULT_TOP_N,
+        sample_size: int = DEFAULT_SAMPLE_SIZE,
+    ) -> "DataProfile":
+        """
+        Profiles a frame, hashing each row once.
+        """
+        row_hashes = pd.util.hash_pandas_object(data_frame, index=False).to_numpy()
+        numeric = data_frame.select_dtypes("number")
+        sampled_rows = np.argsort(row_hashes, kind="stable")[:sample_size]
+        quantile_sample = numeric.iloc[sampled_rows].astype("float64")
+        quantile_sample.insert(0, "_row_hash", row_hashes[sampled_rows])
+
+        return cls(
+            columns=data_frame.columns,
+            row_count=len(data_frame),
+            null_counts=data_frame.isnull().sum(),
+            row_hashes=np.unique(row_hashes),
+            retweet_count=int(data_frame["retweeted"].fillna(False).sum()),
+            top_retweeted=data_frame.nlargest(top_n, "retweet_count"),
+            moments=NumericMoments.from_frame(numeric),
+            quantile_sample=quantile_sample.reset_index(drop=True),
+            top_n=top_n,
+            sample_size=sample_size,
+        )
+
+    def merge(self, other: "DataProfile") -> "DataProfile":
+        """
+        Combines the profiles of two disjoint sets of rows.
+        """
+        quantile_sample = pd.concat(
+            [self.quantile_sample, other.quantile_sample], ignore_index=True
+        )
+        quantile_sample = quantile_sample.iloc[
+            np.argsort(quantile_sample["_row_hash"].to_numpy(), kind="stable")[: self.sample_size]
+        ].reset_index(drop=True)
+
+        return DataProfile(
+            columns=self.columns.union(other.columns, sort=False),
+            row_count=self.row_count + other.row_count,
+            null_counts=self.null_counts.add(other.null_counts, fill_value=0).astype("int64"),
+            row_hashes=np.union1d(self.row_hashes, other.row_hashes),
+            retweet_count=self.retweet_count + other.retweet_count,
+            top_retweeted=concat_typed([self.top_retweeted, other.top_retweeted]).nlargest(
+                self.top_n, "retweet_count"
+            ),
+            moments=self.moments.merge(other.moments),
+            quantile_sample=quantile_sample,
+            top_n=self.top_n,
+            sample_size=self.sample_size,
+        )
+
+    @property
+    def duplicate_count(self) -> int:
+        """
+        Number of rows identical to an earlier row.
+        """
+        return self.row_count - len(self.row_hashes)
+
+    @property
+    def retweet_percentage(self) -> float:
+        """
+        Percentage of rows flagged as retweets.
+        """
+        if self.row_count == 0:
+            return 0.0
+        return round(self.retweet_count / self.row_count * 100, 2)
+
+    def describe(self) -> pd.DataFrame:
+        """
+        Returns the numeric summary in the layout of DataFrame.describe.
+        """
+        moments = self.moments
+        sample = self.quantile_sample.drop(columns="_row_hash")
+        # sample variance, like describe, undefined for a single value
+        variance = moments.squared_deviations / (moments.count - 1).where(moments.count > 1)
+        summary = pd.DataFrame(
+            {
+                "count": moments.count,
+                "mean": moments.mean.where(moments.count > 0),
+                "std": np.sqrt(variance),
+                "min": moments.minimum,
+                **{f"{quantile:.0%}": sample.quantile(quantile) for quantile in QUANTILES},
+                "max": moments.maximum,
+            }
+        )
+        return summary.T
+
+    def statistics(self) -> pd.DataFrame:
+        """
+        Returns the metrics of the csv data quality report.
+        """
+        return pd.DataFrame(
+            {
+                "metric": [
+                    "total number of rows",
+                    "number of null rows",
+                    "number of duplicate rows",
+                    "percentage that are retweets",
+                ],
+                "count": [
+                    self.row_count,
+                    int(self.null_counts.sum()),
+                    self.duplicate_count,
+                    self.retweet_percentage,
+                ],
+            }
+        )
+
+
+def profile_data_frames(data_frames: Iterable[pd.DataFrame], **kwargs) -> DataProfile:
+    """
+    Profiles chunks or per-company frames one at a time, merging as it goes.
+    """
+    profile: Optional[DataProfile] = None
+    for data_frame in data_frames:
+        chunk_profile = DataProfile.from_frame(data_frame, **kwargs)
+        profile = chunk_profile if profile is None else profile.merge(chunk_profile)
+    if profile is None:
+        raise ValueError("No data frames to profile")
+    return profile
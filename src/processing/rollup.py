@@ -0,0 +1,148 @@
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.processing.schema import concat_typed
+
+# time buckets the rollup is kept at, weeks start on Monday
+GRANULARITIES = ["hour", "day", "week"]
+
+# rows are unique by these keys; source_file lets incremental runs replace a raw file's rows
+ROLLUP_KEYS = ["granularity", "bucket", "sentiment", "source_file"]
+
+# additive measures, so rollups of disjoint tweets merge by summing
+# the weighted sums weight each tweet by 1 + its retweets or followers, like the theme weights
+ROLLUP_MEASURES = [
+    "tweets",
+    "retweets",
+    "followers",
+    "score_sum",
+    "retweet_weighted_score_sum",
+    "follower_weighted_score_sum",
+]
+
+
+def get_time_buckets(timestamps: pd.Series, granularity: str) -> pd.Series:
+    """
+    Returns the start of the hour, day or week each timestamp falls in.
+    """
+    if granularity == "hour":
+        return timestamps.dt.floor("h")
+    if granularity == "day":
+        return timestamps.dt.normalize()
+    if granularity == "week":
+        return timestamps.dt.normalize() - pd.to_timedelta(timestamps.dt.dayofweek, unit="D")
+    raise ValueError(f"Unknown granularity {granularity!r}, expected one of {GRANULARITIES}")
+
+
+def build_rollup(data_frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregates scored tweets into tweet counts and score sums per time bucket,
+    sentiment label and raw file, at every granularity. Tweets without a timestamp are left out.
+    Every row counts as one tweet, so with dedup pass the rows before they were collapsed:
+    each copy has its own time, raw file, retweets and followers.
+    """
+    data_frame = data_frame[data_frame["datetime"].notna()]
+    scores = data_frame["sentiment_score"].to_numpy(dtype=np.float64)
+    retweets = data_frame["retweet_count"].fillna(0).to_numpy(dtype=np.int64)
+    followers = data_frame["user_followers_count"].fillna(0).to_numpy(dtype=np.int64)
+    measures = pd.DataFrame(
+        {
+            "sentiment": data_frame["sentiment"].to_numpy(),
+            "source_file": data_frame["source_file"].to_numpy(),
+            "tweets": np.ones(len(data_frame), dtype=np.int64),
+            "retweets": retweets,
+            "followers": followers,
+            "score_sum": scores,
+            "retweet_weighted_score_sum": scores * (1 + retweets),
+            "follower_weighted_score_sum": scores * (1 + followers),
+        }
+    )
+
+    rollups = []
+    for granularity in GRANULARITIES:
+        buckets = get_time_buckets(data_frame["datetime"], granularity).to_numpy()
+        rollup = (
+            measures.assign(bucket=buckets)
+            .groupby(["bucket", "sentiment", "source_file"], observed=True, sort=True)[
+                ROLLUP_MEASURES
+            ]
+            .sum()
+            .reset_index()
+        )
+        rollup.insert(0, "granularity", granularity)
+        rollups.append(rollup)
+    return compact_rollup(concat_typed(rollups, ignore_index=True))
+
+
+def compact_rollup(rollup: pd.DataFrame) -> pd.DataFrame:
+    """
+    Stores the keys as categoricals and the counts in the smallest integer type that holds them.
+    """
+    rollup = rollup.astype(
+        {"granularity": pd.CategoricalDtype(GRANULARITIES), "sentiment": "category"}
+    )
+    rollup["source_file"] = rollup["source_file"].astype("category")
+    for column in ["tweets", "retweets", "followers"]:
+        rollup[column] = pd.to_numeric(rollup[column], downcast="integer")
+    return rollup[ROLLUP_KEYS + ROLLUP_MEASURES]
+
+
+def merge_rollups(rollups: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Sums rollups of disjoint tweets that may share keys.
+    """
+    combined = concat_typed(rollups, ignore_index=True)
+    merged = (
+        combined.groupby(ROLLUP_KEYS, observed=True, sort=True)[ROLLUP_MEASURES].sum().reset_index()
+    )
+    return compact_rollup(merged)
+
+
+def summarize_rollup(
+    rollup: pd.DataFrame,
+    granularity: str = "day",
+    start: Optional[pd.Timestamp] = None,
+    end: Optional[pd.Timestamp] = None,
+) -> pd.DataFrame:
+    """
+    Returns one row per bucket and sentiment label between start and end: tweet count,
+    share of the bucket's tweets, mean score and retweet- and follower-weighted mean scores.
+    Reads only the rollup, so the cost grows with the number of buckets, not tweets.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity!r}, expected one of {GRANULARITIES}")
+    selected = rollup[rollup["granularity"] == granularity]
+    if start is not None:
+        selected = selected[selected["bucket"] >= start]
+    if end is not None:
+        selected = selected[selected["bucket"] < end]
+
+    summary = (
+        selected.groupby(["bucket", "sentiment"], observed=True, sort=True)[ROLLUP_MEASURES]
+        .sum()
+        .reset_index()
+    )
+    bucket_tweets = summary.groupby("bucket")["tweets"].transform("sum")
+    summary["share"] = summary["tweets"] / bucket_tweets
+    summary["mean_score"] = summary["score_sum"] / summary["tweets"]
+    summary["retweet_weighted_mean_score"] = summary["retweet_weighted_score_sum"] / (
+        summary["tweets"] + summary["retweets"]
+    )
+    summary["follower_weighted_mean_score"] = summary["follower_weighted_score_sum"] / (
+        summary["tweets"] + summary["followers"]
+    )
+    return summary[
+        [
+            "bucket",
+            "sentiment",
+            "tweets",
+            "share",
+            "mean_score",
+            "retweet_weighted_mean_score",
+            "follower_weighted_mean_score",
+            "retweets",
+            "followers",
+        ]
+    ]
@@ -0,0 +1,113 @@
+from typing import Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+# columns read from the raw csv files and the dtype read_csv parses them as,
+# created_at, timeonly and created_dateonly are left out as datetime holds the same timestamp
+RAW_DTYPES = {
+    "Key": "Int64",
+    "text": "str",
+    "lang": "category",
+    "datetime": "str",
+    "retweet_count": "Int64",
+    "retweeted": "boolean",
+    "truncated": "boolean",
+    "user_favourites_count": "Int64",
+    "user_followers_count": "Int64",
+    "user_friends_count": "Int64",
+    "user_location": "category",
+    "user_time_zone": "category",
+    "user_screen_name": "str",
+    "file": "category",
+}
+
+# low-cardinality columns, including the ones added by later stages
+CATEGORICAL_COLUMNS = [
+    "lang",
+    "file",
+    "user_time_zone",
+    "user_location",
+    "source_file",
+    "sentiment",
+    "company_name",
+]
+
+# timestamps parsed once at ingest, by column and format
+DATETIME_FORMATS = {
+    "datetime": "%m/%d/%Y %H:%M",
+}
+
+# counts downcast to the smallest nullable integer type that holds them
+COUNT_COLUMNS = [
+    "Key",
+    "retweet_count",
+    "user_favourites_count",
+    "user_followers_count",
+    "user_friends_count",
+]
+
+
+def apply_schema(data_frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Types the columns of a raw chunk in place: categoricals, parsed timestamps and downcast counts.
+    """
+    for column, datetime_format in DATETIME_FORMATS.items():
+        if column in data_frame and not pd.api.types.is_datetime64_any_dtype(data_frame[column]):
+            data_frame[column] = pd.to_datetime(
+                data_frame[column], format=datetime_format, errors="coerce"
+            )
+    for column in COUNT_COLUMNS:
+        if column in data_frame:
+            data_frame[column] = pd.to_numeric(data_frame[column], downcast="integer")
+    for column in CATEGORICAL_COLUMNS:
+        if column in data_frame and not isinstance(data_frame[column].dtype, pd.CategoricalDtype):
+            data_frame[column] = data_frame[column].astype("category")
+    return data_frame
+
+
+def concat_typed(frames: Iterable[pd.DataFrame], ignore_index: bool = False) -> pd.DataFrame:
+    """
+    Concatenates frames, unioning the categories of categorical columns
+    so that they stay categorical instead of falling back to object.
+    """
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame()
+    categorical_columns = [
+        column
+        for column, dtype in frames[0].dtypes.items()
+        if isinstance(dtype, pd.CategoricalDtype) and all(column in frame for frame in frames)
+    ]
+    dtypes = {}
+    for column in categorical_columns:
+        categories = [
+            frame[column].astype("category").cat.categories.to_numpy(dtype=object)
+            for frame in frames
+        ]
+        dtypes[column] = pd.CategoricalDtype(pd.Index(np.concatenate(categories)).unique())
+    return pd.concat([frame.astype(dtypes) for frame in frames], ignore_index=ignore_index)
+
+
+def empty_typed_frame() -> pd.DataFrame:
+    """
+    Returns a frame without rows holding the raw columns with their ingest dtypes.
+    """
+    data_frame = pd.DataFrame(
+        {column: pd.Series(dtype=dtype) for column, dtype in RAW_DTYPES.items()}
+    ).assign(source_file=pd.Series(dtype="str"))
+    return apply_schema(data_frame)
+
+
+def get_memory_report(data_frames: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Returns the deep memory usage in bytes of each column of the named frames, plus a total row.
+    """
+    report = pd.DataFrame(
+        {
+            name: data_frame.memory_usage(index=False, deep=True)
+            for name, data_frame in data_frames.items()
+        }
+    )
+    report.loc["total"] = report.sum()
+    return report.fillna(0).astype("int64")
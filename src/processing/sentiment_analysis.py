@@ -1,97 +1,486 @@
 import logging
 import os
+import time
 from dataclasses import dataclass
-from typing import List
+from functools import lru_cache
+from itertools import repeat
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
-import torch
 from tqdm import tqdm
-from transformers import pipeline
+
+from src.processing.batching import (
+    DEFAULT_MAX_BATCH_TOKENS,
+    fixed_size_batches,
+    get_token_lengths,
+    token_budget_batches,
+)
+from src.processing.inference_engine import get_inference_engine
+from src.processing.instrumentation import (
+    record_batch_latency,
+    record_counters,
+    run_report,
+    time_stage,
+)
+from src.processing.language_routing import get_tweet_languages, group_by_language
+from src.processing.sentiment_cache import SentimentCache, get_cache_key
+from src.processing.storage import write_company_tweets
+from src.resources.settings import REFERENCE_BACKEND, settings
 
 logging.getLogger("transformers").setLevel(logging.ERROR)
 
 MODEL_NAME = "cardiffnlp/twitter-roberta-base-sentiment-latest"
 
-# Check if MPS is available
-if torch.backends.mps.is_available():
-    device = torch.device("mps")
-    print("Using MPS (Metal GPU) device.")
-elif torch.cuda.is_available():
-    device = torch.device("cuda")
-    print("Using CUDA device.")
-else:
-    device = torch.device("cpu")
+
+# torch and transformers take seconds to import, so they are only loaded once a stage needs
+# the model
+# pylint: disable=import-outside-toplevel
+@lru_cache(maxsize=None)
+def get_device():
+    """
+    Picks the device the model runs on, once per process.
+    """
+    import torch
+
+    # Check if MPS is available
+    if torch.backends.mps.is_available():
+        print("Using MPS (Metal GPU) device.")
+        return torch.device("mps")
+    if torch.cuda.is_available():
+        print("Using CUDA device.")
+        return torch.device("cuda")
     print("Using CPU.")
+    return torch.device("cpu")
+
+
+@lru_cache(maxsize=None)
+def load_sentiment_backend(backend_name: str, model_name: str = MODEL_NAME):
+    """
+    Loads a sentiment backend of a model once per process.
+    In offline mode only the local Hugging Face cache is used and a missing model fails fast.
+    """
+    if settings.offline:
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+
+    from src.models.sentiment_backends import load_backend
+
+    try:
+        return load_backend(backend_name, model_name, get_device())
+    except OSError as error:
+        if settings.offline:
+            raise OSError(
+                f"{model_name} is not in the local Hugging Face cache and offline mode is on"
+            ) from error
+        raise
 
-sentiment_analyzer = pipeline(
-    "text-classification",
-    model=MODEL_NAME,
-    device=device,
-    max_length=512,
-    truncation=True,
-)
 
-@dataclass
+def get_sentiment_analyzer(model_name: str = MODEL_NAME):
+    """
+    Returns a model, MODEL_NAME by default, on the sentiment backend selected in settings.
+    """
+    return load_sentiment_backend(settings.backend, model_name)
+
+
+def get_model_id(model_name: str = MODEL_NAME) -> str:
+    """
+    Identifies the model and backend whose results are cached.
+    """
+    if settings.backend == REFERENCE_BACKEND:
+        return model_name
+    return f"{model_name}:{settings.backend}"
+
+
+def get_language_model(language: str) -> str:
+    """
+    Returns the model scoring tweets in a language: its own model if one is configured,
+    otherwise MODEL_NAME.
+    """
+    return settings.language_models.get(language, MODEL_NAME)
+
+
+def get_language_routing_id() -> str:
+    """
+    Identifies the scored languages and the model and backend of each.
+    """
+    languages = sorted(set(settings.languages) | set(settings.language_models))
+    return ";".join(
+        f"{language}={get_model_id(get_language_model(language))}" for language in languages
+    )
+
+
+@lru_cache(maxsize=None)
+def load_distilled_model(path: Path):
+    """
+    Loads a distilled model once per process.
+    """
+    from src.models.distilled_sentiment import DistilledSentimentModel
+
+    return DistilledSentimentModel.load(path)
+
+
+def get_distilled_model():
+    """
+    Returns the cheap model distilled from the selected backend's labels, the first cascade tier.
+    """
+    from src.models.distilled_sentiment import get_distilled_model_path
+
+    path = get_distilled_model_path(get_model_id())
+    if not path.exists():
+        raise FileNotFoundError(
+            f"No model distilled from {get_model_id()} at {path}, "
+            "run `python main.py --stage distill` first"
+        )
+    return load_distilled_model(path)
+
+
+# labels of MODEL_NAME, stored as categorical codes in this order
+SENTIMENT_LABELS = ["negative", "neutral", "positive"]
+
+
+@dataclass(slots=True)
 class Sentiment:
     """
     Sentiment object
     """
+
     tweet_text: str = ""
     score: float = 0.0
     label: str = ""
     brand_risk: bool = False
 
 
-def analyze(data_frame: pd.DataFrame, batch_size: int=50, company_name: str="") -> pd.DataFrame:
+@lru_cache(maxsize=None)
+def get_sentiment_cache() -> SentimentCache:
     """
-    Analyzes the sentiment of a given text by a set batch size.
+    Returns the on-disk sentiment cache shared by every brand in this process.
     """
-    # Reset the index of the data frame
-    copied_data_frame = data_frame.copy().reset_index(drop=True)
-    raw_tweets_text = get_raw_tweet_text_data(data_frame)
-    sentiments = []
-    for i in tqdm(
-        range(0, len(raw_tweets_text), batch_size), desc="Analyzing sentiments"
-    ):
-        batch = raw_tweets_text[i : i + batch_size]
-        result = sentiment_analyzer(batch)
-
-        sentiment_raw = []
-        sentiment_scores = []
-        sentiment_labels = []
-        # pair up the batch with the result
-        for tweet, res in zip(batch, result):
-            sentiment_raw.append(Sentiment(tweet, float(res["score"]), res["label"]))
-            sentiment_scores.append(res["score"])
-            sentiment_labels.append(res["label"])
-        end_index = i + len(batch) - 1
-
-        copied_data_frame.loc[i : end_index, "sentiment_score"] = sentiment_scores
-        copied_data_frame.loc[i : end_index, "sentiment"] = sentiment_labels
-        copied_data_frame.loc[i : end_index, "company_name"] = company_name
-        sentiments.extend(sentiment_raw)
-
-    write_company_data_frame_to_csv(copied_data_frame, company_name)
+    return SentimentCache()
+
+
+def analyze(
+    data_frame: pd.DataFrame,
+    batch_size: int = 256,
+    company_name: str = "",
+    use_cache: bool = True,
+    max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+    write_output: bool = True,
+) -> pd.DataFrame:
+    """
+    Analyzes the sentiment of a given text in length-bucketed batches of at most
+    batch_size rows and max_batch_tokens padded tokens, with the model of each tweet's language.
+    Each unique normalized text is only sent to the model once and only if it is not cached.
+    """
+    with run_report.stage("sentiment", company_name, rows_in=len(data_frame)) as record:
+        # new columns go on a shallow copy with a fresh index, the tweets themselves are not copied
+        copied_data_frame = data_frame.copy(deep=False)
+        copied_data_frame.index = pd.RangeIndex(len(copied_data_frame))
+        raw_tweets_text = get_raw_tweet_text_data(data_frame)
+        keys, results, scored_count = score_texts_by_language(
+            raw_tweets_text,
+            get_tweet_languages(data_frame),
+            company_name=company_name,
+            use_cache=use_cache,
+            max_batch_size=batch_size,
+            max_batch_tokens=max_batch_tokens,
+            cascade=settings.cascade,
+        )
+
+        sources = (
+            "cache, duplicates or the distilled model"
+            if settings.cascade
+            else "cache or duplicates"
+        )
+        print(
+            f"{company_name}: {len(keys)} tweets, {len(keys) - scored_count} "
+            f"served from {sources}, {scored_count} sent to the model"
+        )
+        if settings.cascade:
+            print_cascade_counters(company_name, record.counters)
+
+        scores, labels = assemble_sentiments(keys, results)
+        copied_data_frame["sentiment_score"] = scores
+        copied_data_frame["sentiment"] = labels
+        copied_data_frame["company_name"] = pd.Categorical.from_codes(
+            np.zeros(len(copied_data_frame), dtype=np.int8), categories=[company_name]
+        )
+        record.rows_out = len(copied_data_frame)
+
+    if write_output:
+        write_company_tweets(copied_data_frame, company_name)
     return copied_data_frame
 
-def get_raw_tweet_text_data(data_frame: pd.DataFrame) -> List[str]:
+
+def score_texts_by_language(
+    texts: List[str],
+    languages: np.ndarray,
+    company_name: Optional[str] = None,
+    report_languages: bool = True,
+    cascade: bool = False,
+    **score_options,
+) -> Tuple[List[str], Dict[str, Tuple[str, float]], int]:
     """
-    Get all the text data for all tweets.
+    Scores each language's texts with score_texts_cached and the language's model, and returns
+    the same as score_texts_cached for all texts. Only MODEL_NAME tweets go through the cascade,
+    as the distilled model learned its labels. Each language is timed as a sentiment_language
+    stage, added to the run report when report_languages is on, and the tweets scored per
+    language go to the counters of the enclosing stages.
     """
-    return data_frame["text"].tolist()
+    keys = np.empty(len(texts), dtype=object)
+    results: Dict[str, Tuple[str, float]] = {}
+    scored_count = 0
+    for language, positions in group_by_language(languages).items():
+        model_name = get_language_model(language)
+        with time_stage(
+            "sentiment_language", company_name, rows_in=len(positions), language=language
+        ) as record:
+            language_keys, language_results, language_scored_count = score_texts_cached(
+                [texts[position] for position in positions],
+                cascade=cascade and model_name == MODEL_NAME,
+                model_name=model_name,
+                **score_options,
+            )
+            record.rows_out = len(positions)
+            record_counters(**{f"scored_{language}": len(positions)})
+        if report_languages:
+            run_report.add(record)
+        keys[positions] = language_keys
+        results.update(language_results)
+        scored_count += language_scored_count
+    return keys.tolist(), results, scored_count
+
+
+def score_texts_cached(
+    texts: List[str],
+    use_cache: bool = True,
+    max_batch_size: int = 256,
+    max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+    bucket_by_length: bool = True,
+    cascade: bool = False,
+    model_name: str = MODEL_NAME,
+) -> Tuple[List[str], Dict[str, Tuple[str, float]], int]:
+    """
+    Returns the cache key of each text, the (label, score) result of each key and how many
+    texts were sent to the model. Each unique normalized text is scored at most once,
+    and only if it is not cached. With cascade, uncached texts go through score_texts_cascade;
+    only the transformer's results are cached, so cached labels never come from the cheap tier.
+    """
+    model_id = get_model_id(model_name)
+    keys = [get_cache_key(text, model_id) for text in texts]
+
+    cache = get_sentiment_cache() if use_cache else None
+    results = cache.get_many(set(keys)) if cache is not None else {}
+
+    pending_texts = {}
+    for key, text in zip(keys, texts):
+        if key not in results and key not in pending_texts:
+            pending_texts[key] = text
 
-def write_company_data_frame_to_csv(
-    filtered_data_frame: pd.DataFrame,
-    company_name_snake_case: str,
-):
+    if cascade:
+        new_results, model_results = score_texts_cascade(
+            list(pending_texts),
+            list(pending_texts.values()),
+            max_batch_size=max_batch_size,
+            max_batch_tokens=max_batch_tokens,
+            bucket_by_length=bucket_by_length,
+        )
+    else:
+        scored = score_texts(
+            list(pending_texts.values()),
+            max_batch_size=max_batch_size,
+            max_batch_tokens=max_batch_tokens,
+            bucket_by_length=bucket_by_length,
+            model_name=model_name,
+        )
+        new_results = model_results = dict(zip(pending_texts, scored))
+    if cache is not None:
+        cache.put_many(model_results)
+    results.update(new_results)
+    return keys, results, len(model_results)
+
+
+def in_validation_slice(key: str, rate: float) -> bool:
     """
-    Writes a csv file with sentiment analysis of the dataset.
+    Whether a cache key falls in the given share of keys, the same share on every run.
     """
-    directory_path = f"data/processed/companies/{company_name_snake_case}"
-    if not os.path.exists(directory_path):
-        os.makedirs(directory_path)
+    return int(key[:8], 16) < rate * 2**32
+
+
+def score_texts_cascade(
+    keys: List[str],
+    texts: List[str],
+    max_batch_size: int = 256,
+    max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+    bucket_by_length: bool = True,
+) -> Tuple[Dict[str, Tuple[str, float]], Dict[str, Tuple[str, float]]]:
+    """
+    Scores texts with the distilled model and escalates those it labels with a confidence
+    below settings.cascade_threshold to the transformer. A validation slice of the confident
+    ones, chosen by key, is also sent to the transformer to measure how often the two agree,
+    and keeps the transformer's label. Returns the result of every key and the transformer's
+    results among them. Tier counts go to the counters of the stage being timed.
+    """
+    distilled = get_distilled_model()(texts) if texts else []
+    escalated = []
+    validated = []
+    for position, (_, confidence) in enumerate(distilled):
+        if confidence < settings.cascade_threshold:
+            escalated.append(position)
+        elif in_validation_slice(keys[position], settings.cascade_validation_rate):
+            validated.append(position)
+
+    model_positions = escalated + validated
+    scored = score_texts(
+        [texts[position] for position in model_positions],
+        max_batch_size=max_batch_size,
+        max_batch_tokens=max_batch_tokens,
+        bucket_by_length=bucket_by_length,
+    )
+    model_results = {keys[position]: result for position, result in zip(model_positions, scored)}
+    record_counters(
+        cascade_distilled=len(texts) - len(escalated),
+        cascade_escalated=len(escalated),
+        cascade_validated=len(validated),
+        cascade_validation_agreed=sum(
+            distilled[position][0] == model_results[keys[position]][0] for position in validated
+        ),
+    )
+
+    results = dict(zip(keys, distilled))
+    results.update(model_results)
+    return results, model_results
+
 
-    filtered_data_frame_path = (
-        f"{directory_path}/{company_name_snake_case}_relevant_tweets.csv"
+def print_cascade_counters(company_name: str, counters: Dict[str, int]):
+    """
+    Prints how many tweets each cascade tier answered and the agreement on the validation slice.
+    """
+    distilled = counters.get("cascade_distilled", 0)
+    escalated = counters.get("cascade_escalated", 0)
+    validated = counters.get("cascade_validated", 0)
+    agreed = counters.get("cascade_validation_agreed", 0)
+    routed = distilled + escalated
+    agreement = f"{agreed / validated:.1%}" if validated else "n/a"
+    print(
+        f"{company_name}: cascade kept {distilled} distilled labels "
+        f"({distilled / routed if routed else 0:.1%}), escalated {escalated}, "
+        f"validation agreement {agreement} on {validated} tweets"
     )
-    filtered_data_frame.to_csv(filtered_data_frame_path, index=False, encoding="utf-8")
+
+
+def assemble_sentiments(
+    keys: List[str], results: Dict[str, Tuple[str, float]]
+) -> Tuple[np.ndarray, pd.Categorical]:
+    """
+    Gathers the (label, score) result of each key into a float32 score array
+    and categorical labels, looking each distinct key up once.
+    """
+    key_codes, unique_keys = pd.factorize(pd.Series(keys, dtype=object))
+    unique_scores = np.empty(len(unique_keys), dtype=np.float32)
+    unique_label_codes = np.empty(len(unique_keys), dtype=np.int8)
+    label_codes = {label: code for code, label in enumerate(SENTIMENT_LABELS)}
+    for position, key in enumerate(unique_keys):
+        label, score = results[key]
+        unique_scores[position] = score
+        unique_label_codes[position] = label_codes.setdefault(label, len(label_codes))
+
+    labels = pd.Categorical.from_codes(unique_label_codes[key_codes], categories=list(label_codes))
+    return unique_scores[key_codes], labels
+
+
+def get_sentiments(data_frame: pd.DataFrame) -> List[Sentiment]:
+    """
+    Returns a Sentiment per row of a frame returned by analyze.
+    """
+    return [
+        Sentiment(tweet_text, float(score), label)
+        for tweet_text, score, label in zip(
+            data_frame["text"], data_frame["sentiment_score"], data_frame["sentiment"]
+        )
+    ]
+
+
+def score_texts(
+    texts: List[str],
+    max_batch_size: int = 256,
+    max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+    bucket_by_length: bool = True,
+    model_name: str = MODEL_NAME,
+) -> List[Tuple[str, float]]:
+    """
+    Runs a model over texts and returns (label, score) pairs in input order.
+    With bucket_by_length, texts of similar token length are batched together so
+    little of each batch is padding; otherwise batches follow the input order.
+    On CPU, batches are spread over settings.workers processes.
+    """
+    if not texts:
+        return []
+    if bucket_by_length:
+        lengths = get_token_lengths(texts, get_sentiment_analyzer(model_name).tokenizer)
+        batches = token_budget_batches(lengths, max_batch_tokens, max_batch_size)
+    else:
+        batches = fixed_size_batches(len(texts), max_batch_size)
+
+    batch_texts = [[texts[position] for position in positions] for positions in batches]
+    analyzer = get_sentiment_analyzer(model_name)
+    if analyzer.device.type == "cpu" and settings.workers > 1 and len(batches) > 1:
+        engine = get_inference_engine(
+            timed_score_model_batch, settings.workers, settings.threads_per_worker
+        )
+        outputs = engine.imap((model_name, batch) for batch in batch_texts)
+    else:
+        outputs = map(timed_score_batch, batch_texts, repeat(model_name))
+
+    results: List[Tuple[str, float]] = [("", 0.0)] * len(texts)
+    for positions, (latency, output) in zip(
+        batches,
+        tqdm(
+            outputs,
+            total=len(batches),
+            desc="Analyzing sentiments",
+            disable=len(batches) < 2,
+        ),
+    ):
+        record_batch_latency(latency)
+        # scatter the batch back to the original positions
+        for position, result in zip(positions, output):
+            results[position] = result
+    return results
+
+
+def score_batch(batch: List[str], model_name: str = MODEL_NAME) -> List[Tuple[str, float]]:
+    """
+    Runs a model over one batch and returns its (label, score) pairs.
+    """
+    return get_sentiment_analyzer(model_name)(batch)
+
+
+def timed_score_batch(
+    batch: List[str], model_name: str = MODEL_NAME
+) -> Tuple[float, List[Tuple[str, float]]]:
+    """
+    Scores one batch and returns how many seconds the model took with its results.
+    """
+    start = time.perf_counter()
+    output = score_batch(batch, model_name)
+    return time.perf_counter() - start, output
+
+
+def timed_score_model_batch(
+    model_batch: Tuple[str, List[str]],
+) -> Tuple[float, List[Tuple[str, float]]]:
+    """
+    Scores a (model name, batch) pair with timed_score_batch, for the inference engine
+    that passes a single argument.
+    """
+    model_name, batch = model_batch
+    return timed_score_batch(batch, model_name)
+
+
+def get_raw_tweet_text_data(data_frame: pd.DataFrame) -> List[str]:
+    """
+    Get all the text data for all tweets.
+    """
+    return data_frame["text"].tolist()
@@ -0,0 +1,125 @@
+import hashlib
+import re
+import sqlite3
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+DEFAULT_CACHE_PATH = Path("data/cache/sentiment_cache.sqlite")
+DEFAULT_MAX_ENTRIES = 2_000_000
+
+# sqlite allows at most 999 bound parameters per statement on older builds
+QUERY_CHUNK_SIZE = 500
+
+WHITESPACE_REGEX = re.compile(r"\s+")
+
+CachedSentiment = Tuple[str, float]
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes tweet text so that copies differing only in whitespace or unicode form share a key.
+    """
+    return WHITESPACE_REGEX.sub(" ", unicodedata.normalize("NFC", str(text))).strip()
+
+
+def get_cache_key(text: str, model_name: str) -> str:
+    """
+    Returns the cache key of a tweet text for the given model.
+    """
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class SentimentCache:
+    """
+    Persistent sentiment results keyed by normalized text and model, evicting the least
+    recently used.
+    """
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_CACHE_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(self.path))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS sentiments (
+                key TEXT PRIMARY KEY,
+                label TEXT NOT NULL,
+                score REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """)
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS sentiments_last_used ON sentiments (last_used)"
+        )
+        self.connection.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, CachedSentiment]:
+        """
+        Returns the cached (label, score) of every known key and marks them as recently used.
+        """
+        keys = list(keys)
+        found: Dict[str, CachedSentiment] = {}
+        for chunk in _chunks(keys, QUERY_CHUNK_SIZE):
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                f"SELECT key, label, score FROM sentiments WHERE key IN ({placeholders})",
+                chunk,
+            )
+            for key, label, score in rows:
+                found[key] = (label, score)
+
+        now = time.time()
+        self.connection.executemany(
+            "UPDATE sentiments SET last_used = ? WHERE key = ?",
+            ((now, key) for key in found),
+        )
+        self.connection.commit()
+        return found
+
+    def put_many(self, results: Dict[str, CachedSentiment]):
+        """
+        Stores new results and evicts the oldest entries beyond max_entries.
+        """
+        if not results:
+            return
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO sentiments (key, label, score, last_used) VALUES (?, ?, ?, ?)",
+            ((key, label, float(score), now) for key, (label, score) in results.items()),
+        )
+        self.evict()
+        self.connection.commit()
+
+    def evict(self):
+        """
+        Deletes the least recently used entries beyond max_entries.
+        """
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM sentiments").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self.connection.execute(
+                """
+                DELETE FROM sentiments WHERE key IN (
+                    SELECT key FROM sentiments ORDER BY last_used LIMIT ?
+                )
+                """,
+                (overflow,),
+            )
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+        """
+        self.connection.close()
+
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
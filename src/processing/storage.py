@@ -0,0 +1,229 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.processing.rollup import merge_rollups
+from src.processing.schema import concat_typed
+from src.resources.settings import settings
+
+PROCESSED_DIRECTORY = Path("data/processed")
+COMPANIES_DIRECTORY = PROCESSED_DIRECTORY / "companies"
+PARQUET_DIRECTORY = PROCESSED_DIRECTORY / "parquet"
+INDEX_DIRECTORY = PROCESSED_DIRECTORY / "index"
+STREAM_DIRECTORY = PROCESSED_DIRECTORY / "stream"
+
+# datasets stored as parquet partitioned by company
+TWEETS_DATASET = "tweets"
+TOP_WORDS_DATASET = "top_words"
+TOP_BIGRAMS_DATASET = "top_bigrams"
+ROLLUP_DATASET = "sentiment_rollup"
+
+# error is how much an approximate frequency may overcount, 0 when counted exactly
+TOP_WORDS_SCHEMA = pa.schema(
+    [("word", pa.string()), ("frequency", pa.int64()), ("error", pa.int64())]
+)
+TOP_BIGRAMS_SCHEMA = pa.schema(
+    [("bigram", pa.list_(pa.string())), ("frequency", pa.int64()), ("error", pa.int64())]
+)
+
+PARQUET_COMPRESSION = "zstd"
+
+
+def get_company_parquet_path(dataset: str, company_name: str) -> Path:
+    """
+    Returns the parquet file of a company's partition of a dataset.
+    """
+    return PARQUET_DIRECTORY / dataset / f"company={company_name}" / "part-0.parquet"
+
+
+def write_table(table: pa.Table, path: Path):
+    """
+    Writes a table to parquet, creating its directory.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, path, compression=PARQUET_COMPRESSION)
+
+
+def read_company_table(
+    dataset: str, company_name: str, columns: Optional[List[str]] = None
+) -> pa.Table:
+    """
+    Reads a company's partition of a dataset as a memory-mapped Arrow table.
+    Requested columns the partition does not have are left out.
+    """
+    path = get_company_parquet_path(dataset, company_name)
+    if columns is not None:
+        stored_columns = set(pq.read_schema(path).names)
+        columns = [column for column in columns if column in stored_columns]
+    return pq.read_table(path, columns=columns, memory_map=True)
+
+
+def list_companies(dataset: str = TWEETS_DATASET) -> List[str]:
+    """
+    Returns the companies with a partition in the dataset.
+    """
+    return sorted(
+        path.name.split("=", 1)[1] for path in (PARQUET_DIRECTORY / dataset).glob("company=*")
+    )
+
+
+def write_company_tweets(data_frame: pd.DataFrame, company_name: str):
+    """
+    Stores a company's relevant tweets as parquet, and as csv unless csv export is off.
+    """
+    write_table(
+        pa.Table.from_pandas(data_frame, preserve_index=False),
+        get_company_parquet_path(TWEETS_DATASET, company_name),
+    )
+    if settings.csv_export:
+        directory_path = COMPANIES_DIRECTORY / company_name
+        directory_path.mkdir(parents=True, exist_ok=True)
+        data_frame.to_csv(
+            directory_path / f"{company_name}_relevant_tweets.csv",
+            index=False,
+            encoding="utf-8",
+        )
+
+
+def read_company_tweets(company_name: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Reads a company's relevant tweets.
+    """
+    return read_company_table(TWEETS_DATASET, company_name, columns).to_pandas()
+
+
+def merge_company_tweets(
+    data_frame: pd.DataFrame, company_name: str, replaced_files: List[str]
+) -> pd.DataFrame:
+    """
+    Appends new tweets to a company's stored tweets, dropping stored rows from replaced raw files.
+    """
+    if not get_company_parquet_path(TWEETS_DATASET, company_name).exists():
+        return data_frame
+    stored = read_company_tweets(company_name)
+    stored = stored[~stored["source_file"].isin(replaced_files)]
+    return concat_typed([stored, data_frame], ignore_index=True)
+
+
+def write_company_rollup(rollup: pd.DataFrame, company_name: str):
+    """
+    Stores a company's sentiment rollup as parquet.
+    """
+    write_table(
+        pa.Table.from_pandas(rollup, preserve_index=False),
+        get_company_parquet_path(ROLLUP_DATASET, company_name),
+    )
+
+
+def read_company_rollup(company_name: str) -> pd.DataFrame:
+    """
+    Reads a company's sentiment rollup.
+    """
+    return read_company_table(ROLLUP_DATASET, company_name).to_pandas()
+
+
+def merge_company_rollup(
+    rollup: pd.DataFrame, company_name: str, replaced_files: List[str]
+) -> pd.DataFrame:
+    """
+    Adds the rollup of new tweets to a company's stored rollup, dropping stored rows from
+    replaced raw files.
+    """
+    if not get_company_parquet_path(ROLLUP_DATASET, company_name).exists():
+        return rollup
+    stored = read_company_rollup(company_name)
+    stored = stored[~stored["source_file"].isin(replaced_files)]
+    return merge_rollups([stored, rollup])
+
+
+def read_all_company_tweets(columns: Optional[List[str]] = None) -> List[pd.DataFrame]:
+    """
+    Reads the relevant tweets of every stored company.
+    """
+    return [
+        read_company_tweets(company_name, columns)
+        for company_name in list_companies(TWEETS_DATASET)
+    ]
+
+
+def write_combined_tweets(data_frame: pd.DataFrame):
+    """
+    Stores the combined tweets of all companies as parquet, and as csv unless csv export is off.
+    """
+    write_table(
+        pa.Table.from_pandas(data_frame, preserve_index=False),
+        PARQUET_DIRECTORY / "combined_filtered_data_frame.parquet",
+    )
+    if settings.csv_export:
+        data_frame.to_csv(PROCESSED_DIRECTORY / "combined_filtered_data_frame.csv", index=False)
+
+
+def terms_table(
+    columns: Dict[str, list], schema: pa.Schema, errors: Optional[List[int]]
+) -> pa.Table:
+    """
+    Builds a table of top terms, with the error column only for approximate counts.
+    """
+    if errors is None:
+        return pa.Table.from_pydict(columns, schema=schema.remove(schema.get_field_index("error")))
+    return pa.Table.from_pydict({**columns, "error": errors}, schema=schema)
+
+
+def write_top_terms(
+    top_words: List[Tuple[str, int]],
+    top_bigrams: List[Tuple[Tuple[str, str], int]],
+    company_name: str,
+    word_errors: Optional[List[int]] = None,
+    bigram_errors: Optional[List[int]] = None,
+):
+    """
+    Stores a company's top words and bigrams, keeping bigrams as lists of words.
+    Approximate counts come with an error column, the most each frequency may overcount.
+    """
+    words_table = terms_table(
+        {
+            "word": [word for word, _ in top_words],
+            "frequency": [frequency for _, frequency in top_words],
+        },
+        TOP_WORDS_SCHEMA,
+        word_errors,
+    )
+    bigrams_table = terms_table(
+        {
+            "bigram": [list(bigram) for bigram, _ in top_bigrams],
+            "frequency": [frequency for _, frequency in top_bigrams],
+        },
+        TOP_BIGRAMS_SCHEMA,
+        bigram_errors,
+    )
+    write_table(words_table, get_company_parquet_path(TOP_WORDS_DATASET, company_name))
+    write_table(bigrams_table, get_company_parquet_path(TOP_BIGRAMS_DATASET, company_name))
+    if settings.csv_export:
+        directory_path = COMPANIES_DIRECTORY / company_name
+        directory_path.mkdir(parents=True, exist_ok=True)
+        words_table.to_pandas().to_csv(directory_path / "top_words.csv", index=False)
+        bigrams_data_frame = bigrams_table.to_pandas()
+        bigrams_data_frame["bigram"] = [tuple(bigram) for bigram, _ in top_bigrams]
+        bigrams_data_frame.to_csv(directory_path / "top_bigrams.csv", index=False)
+
+
+def read_top_words(company_name: str) -> List[Tuple[str, int]]:
+    """
+    Reads a company's top words.
+    """
+    table = read_company_table(TOP_WORDS_DATASET, company_name)
+    return list(zip(table["word"].to_pylist(), table["frequency"].to_pylist()))
+
+
+def read_top_bigrams(company_name: str) -> List[Tuple[Tuple[str, ...], int]]:
+    """
+    Reads a company's top bigrams with each bigram as a tuple of words.
+    """
+    table = read_company_table(TOP_BIGRAMS_DATASET, company_name)
+    return [
+        (tuple(bigram), frequency)
+        for bigram, frequency in zip(table["bigram"].to_pylist(), table["frequency"].to_pylist())
+    ]
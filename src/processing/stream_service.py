@@ -0,0 +1,349 @@
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, TextIO, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.processing.instrumentation import LATENCY_PERCENTILES, StageRecord, time_stage
+from src.processing.language_routing import get_tweet_languages, partition_tweets_by_language
+from src.processing.preprocess import remove_twitter_links
+from src.processing.sentiment_analysis import score_texts_by_language
+from src.processing.storage import STREAM_DIRECTORY
+from src.resources.brands_data import brands
+from src.resources.settings import settings
+
+# latencies kept for the percentiles, the most recent ones
+LATENCY_WINDOW = 10_000
+# how often a file source checks for appended lines
+FILE_POLL_SECONDS = 0.05
+
+# a queued tweet: the monotonic time it was received and its JSON record
+QueuedTweet = Tuple[float, dict]
+
+
+@dataclass
+class StreamMetrics:
+    """
+    Throughput and tweet-to-score latency of the service.
+    """
+
+    received: int = 0
+    relevant: int = 0
+    scored: int = 0
+    invalid: int = 0
+    batches: int = 0
+    batched: int = 0
+    # seconds from receiving a tweet to writing its score, for the latest tweets
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    # seconds of each model batch, for the latest batches
+    batch_latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    # counters of the scoring, e.g. tweets routed and scored per language
+    counters: Dict[str, int] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.monotonic)
+
+    def snapshot(self, queue_depth: int = 0) -> dict:
+        """
+        Returns the counts, mean batch size and latency percentiles in milliseconds.
+        """
+        percentiles = (
+            np.percentile(np.array(self.latencies) * 1000, LATENCY_PERCENTILES)
+            if self.latencies
+            else [None] * len(LATENCY_PERCENTILES)
+        )
+        elapsed = time.monotonic() - self.started_at
+        return {
+            "received": self.received,
+            "relevant": self.relevant,
+            "scored": self.scored,
+            "invalid": self.invalid,
+            "batches": self.batches,
+            "mean_batch_size": round(self.batched / self.batches, 1) if self.batches else 0.0,
+            "tweets_per_second": round(self.received / elapsed, 1) if elapsed > 0 else 0.0,
+            "queue_depth": queue_depth,
+            **{
+                f"latency_p{percentile}_ms": None if latency is None else round(float(latency), 1)
+                for percentile, latency in zip(LATENCY_PERCENTILES, percentiles)
+            },
+        }
+
+
+class CompanySinks:
+    """
+    Appends scored tweets as JSON lines to a file per company.
+    """
+
+    def __init__(self, directory: Path = STREAM_DIRECTORY):
+        self.directory = directory
+        self.files: Dict[str, TextIO] = {}
+
+    def write(self, company_name: str, records: List[dict]):
+        """
+        Appends records to a company's file and flushes it so readers see them.
+        """
+        if company_name not in self.files:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.files[company_name] = open(
+                self.directory / f"{company_name}.jsonl", "a", encoding="utf-8"
+            )
+        sink = self.files[company_name]
+        for record in records:
+            sink.write(json.dumps(record, default=str) + "\n")
+        sink.flush()
+
+    def close(self):
+        """
+        Closes every company file.
+        """
+        for sink in self.files.values():
+            sink.close()
+        self.files.clear()
+
+
+def score_stream_batch(records: List[dict]) -> Tuple[int, Dict[str, List[dict]]]:
+    """
+    Keeps the records in a scored language relevant to a brand and scores their sentiment
+    as one model batch per language model. Returns how many records were relevant and
+    the scored records by company; a tweet relevant to several brands goes to each.
+    """
+    data_frame = pd.DataFrame(
+        {
+            "text": [str(record.get("text", "")) for record in records],
+            "lang": [record.get("lang") for record in records],
+        }
+    )
+    data_frame["text"] = remove_twitter_links(data_frame["text"])
+    partition_index = partition_tweets_by_language(data_frame)
+    if partition_index.empty:
+        return 0, {}
+
+    relevant_rows = partition_index["tweet_id"].unique()
+    texts = data_frame["text"].to_numpy()[relevant_rows].tolist()
+    # the batch was sized by the batcher, so the model sees it whole;
+    # per-language records of every micro-batch would swamp the run report
+    keys, results, _ = score_texts_by_language(
+        texts,
+        get_tweet_languages(data_frame)[relevant_rows],
+        report_languages=False,
+        cascade=settings.cascade,
+        max_batch_size=max(len(texts), 1),
+        bucket_by_length=False,
+    )
+    sentiments = dict(zip(relevant_rows, (results[key] for key in keys)))
+
+    company_names = {
+        brand.brand_name: brand.brand_name.lower().replace(" ", "_") for brand in brands.values()
+    }
+    scored: Dict[str, List[dict]] = {}
+    for tweet_id, brand_name in zip(partition_index["tweet_id"], partition_index["brand"]):
+        label, score = sentiments[tweet_id]
+        company_name = company_names[brand_name]
+        scored.setdefault(company_name, []).append(
+            {
+                **records[tweet_id],
+                "company_name": company_name,
+                "sentiment": label,
+                "sentiment_score": float(score),
+            }
+        )
+    return len(relevant_rows), scored
+
+
+def timed_score_stream_batch(
+    records: List[dict],
+) -> Tuple[int, Dict[str, List[dict]], StageRecord]:
+    """
+    Scores a micro-batch like score_stream_batch, also returning the timing of the batch
+    with the model batch latencies and counters measured while scoring it.
+    """
+    with time_stage("stream_batch", rows_in=len(records)) as record:
+        relevant, scored = score_stream_batch(records)
+        record.rows_out = relevant
+    return relevant, scored, record
+
+
+class StreamService:
+    """
+    Scores a live feed of tweet records in micro-batches. Sources put records on a bounded
+    queue and wait while it is full, which is the backpressure: a socket stops being read
+    and a file stops being tailed until the scorer catches up.
+    A batch is closed when it reaches max_batch_size or when its oldest tweet has waited
+    max_wait seconds, so under load batches fill immediately and when idle a tweet waits
+    at most max_wait.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 64,
+        max_wait: float = 0.2,
+        queue_size: int = 10_000,
+        sinks: Optional[CompanySinks] = None,
+        report_interval: float = 10.0,
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue: "asyncio.Queue[Optional[QueuedTweet]]" = asyncio.Queue(maxsize=queue_size)
+        self.sinks = sinks or CompanySinks()
+        self.report_interval = report_interval
+        self.metrics = StreamMetrics()
+        # the model and the sqlite cache are used from this one thread only
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scorer")
+
+    async def put(self, record: dict):
+        """
+        Queues a tweet record, waiting while the queue is full.
+        """
+        self.metrics.received += 1
+        await self.queue.put((time.monotonic(), record))
+
+    async def put_line(self, line: str):
+        """
+        Queues a JSON line holding a tweet record with at least a text, skipping others.
+        """
+        line = line.strip()
+        if not line:
+            return
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            record = None
+        if not isinstance(record, dict) or "text" not in record:
+            self.metrics.invalid += 1
+            return
+        await self.put(record)
+
+    async def close_input(self):
+        """
+        Tells the batcher no more tweets are coming, it stops once the queue is drained.
+        """
+        await self.queue.put(None)
+
+    async def next_batch(self) -> Tuple[List[QueuedTweet], bool]:
+        """
+        Waits for the next micro-batch. Returns it and whether the input was closed.
+        """
+        first = await self.queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = first[0] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if self.queue.empty():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = self.queue.get_nowait()
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def run_batches(self):
+        """
+        Scores micro-batches until the input is closed, writing results to the sinks.
+        The next batch is gathered while the current one is scored.
+        """
+        loop = asyncio.get_running_loop()
+        closed = False
+        while not closed:
+            batch, closed = await self.next_batch()
+            if not batch:
+                continue
+            received_times = [received_at for received_at, _ in batch]
+            records = [record for _, record in batch]
+            relevant, scored, batch_record = await loop.run_in_executor(
+                self.executor, timed_score_stream_batch, records
+            )
+            for company_name, company_records in scored.items():
+                self.sinks.write(company_name, company_records)
+                self.metrics.scored += len(company_records)
+            scored_at = time.monotonic()
+
+            self.metrics.batches += 1
+            self.metrics.batched += len(batch)
+            self.metrics.relevant += relevant
+            self.metrics.latencies.extend(scored_at - received_at for received_at in received_times)
+            self.metrics.batch_latencies.extend(batch_record.batch_latencies)
+            for name, count in batch_record.counters.items():
+                self.metrics.counters[name] = self.metrics.counters.get(name, 0) + count
+
+    async def report_metrics(self):
+        """
+        Prints the metrics every report_interval seconds.
+        """
+        while True:
+            await asyncio.sleep(self.report_interval)
+            print(json.dumps(self.snapshot()))
+
+    def snapshot(self) -> dict:
+        """
+        Returns the current metrics.
+        """
+        return self.metrics.snapshot(self.queue.qsize())
+
+    async def run(self, *sources):
+        """
+        Runs the sources and the batcher until every source is done and the queue is drained.
+        """
+        batcher = asyncio.create_task(self.run_batches())
+        reporter = asyncio.create_task(self.report_metrics())
+        try:
+            await asyncio.gather(*sources)
+            await self.close_input()
+            await batcher
+        finally:
+            reporter.cancel()
+            batcher.cancel()
+            self.executor.shutdown(wait=True)
+            self.sinks.close()
+        return self.snapshot()
+
+
+async def tail_jsonl_file(service: StreamService, path: Path, follow: bool = True):
+    """
+    Feeds the records of an append-only JSON lines file to the service, then keeps
+    reading lines as they are appended unless follow is off. A line is only read
+    once it is complete.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        partial = ""
+        while True:
+            line = file.readline()
+            if line.endswith("\n"):
+                await service.put_line(partial + line)
+                partial = ""
+            elif line:
+                partial += line
+            elif follow:
+                await asyncio.sleep(FILE_POLL_SECONDS)
+            else:
+                await service.put_line(partial)
+                return
+
+
+async def serve_socket(service: StreamService, host: str, port: int):
+    """
+    Accepts connections sending JSON lines of tweet records, until cancelled.
+    """
+
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                await service.put_line(line.decode("utf-8", errors="ignore"))
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle_connection, host, port)
+    print(f"Listening for tweets on {host}:{port}")
+    async with server:
+        await server.serve_forever()
@@ -1,10 +1,17 @@
-from collections import defaultdict
-from typing import List
+import multiprocessing
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import string
 import nltk
 
+from src.features.sketches import TermSketch
+from src.processing.instrumentation import StageRecord, run_report, time_stage
+from src.processing.storage import write_top_terms
 from src.resources.word_lists import (
     food_related_keywords,
     secondary_yogurt_brand_accounts,
@@ -13,15 +20,22 @@ from src.resources.word_lists import (
     yogurt_brand_names,
     yogurt_keywords,
 )
+from src.resources.settings import THEME_WEIGHT_COLUMNS, Settings, settings
 
-nltk.download("punkt")
-nltk.download("stopwords")
-nltk.download("twitter_samples")
-
-from nltk import FreqDist, bigrams
 from nltk.corpus import stopwords
 from nltk.tokenize import TweetTokenizer
 
+# NLTK data used by the theme analysis, by download name and data path
+NLTK_RESOURCES = {
+    "stopwords": "corpora/stopwords",
+}
+
+# tweets encoded at a time when counting with sketches
+THEME_CHUNK_SIZE = 50_000
+# joins the words of an n-gram into one sketch term; TweetTokenizer keeps spaces inside some
+# tokens, such as phone numbers, but never emits control characters
+NGRAM_SEPARATOR = "\x1f"
+
 custom_stopwords = {
     "rt",
     "via",
@@ -29,26 +43,44 @@ custom_stopwords = {
     "that's",
     "...",
     "’",
-
 }
 
 
-def tokenize(tweets: List[str]) -> List[List[str]]:
+@lru_cache(maxsize=None)
+def ensure_nltk_resources():
     """
-    Tokenize the tweets and remove stop words.
+    Downloads missing NLTK data on first use, or fails fast when offline mode is on.
     """
-    tokenizer = TweetTokenizer()
-    tokenized_tweets = [tokenizer.tokenize(tweet) for tweet in tweets]
-    return tokenized_tweets
+    missing = []
+    for name, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
 
+    if missing and settings.offline:
+        raise LookupError(
+            f"NLTK resources {missing} are not installed and offline mode is on, "
+            f"install them with nltk.download first"
+        )
+    for name in missing:
+        nltk.download(name, quiet=True)
 
-def filter_out_non_informative_tokens(tweets: List[List[str]]) -> List[List[str]]:
+
+@lru_cache(maxsize=None)
+def get_tokenizer() -> TweetTokenizer:
     """
-    Filter out non-informative tokens sourced from our word lists resource and stop tokens.
+    Returns the tweet tokenizer shared by every tweet.
     """
-    stop_words = set(stopwords.words("english"))
-    stop_words.update(custom_stopwords)
+    return TweetTokenizer()
 
+
+@lru_cache(maxsize=None)
+def get_non_informative_words() -> FrozenSet[str]:
+    """
+    Returns the lowercased words left out of the themes: our word lists, stop words and punctuation.
+    """
+    ensure_nltk_resources()
     non_informative_words = set(
         food_related_keywords
         + yogurt_brand_names
@@ -57,50 +89,418 @@ def filter_out_non_informative_tokens(tweets: List[List[str]]) -> List[List[str]
         + secondary_yogurt_brand_accounts
         + secondary_yogurt_brands
     )
-    non_informative_words.update(stop_words)
-    non_informative_words.update(set(string.punctuation))
+    non_informative_words.update(stopwords.words("english"))
+    non_informative_words.update(custom_stopwords)
+    non_informative_words.update(string.punctuation)
+    return frozenset(non_informative_words)
 
-    filtered_tweets = [
-        [word.lower() for word in tweet if word.lower() not in non_informative_words]
-        for tweet in tweets
-    ]
+
+def tokenize(tweets: List[str]) -> List[List[str]]:
+    """
+    Tokenize the tweets and remove stop words.
+    """
+    tokenizer = get_tokenizer()
+    tokenized_tweets = [tokenizer.tokenize(tweet) for tweet in tweets]
+    return tokenized_tweets
+
+
+def filter_out_non_informative_tokens(tweets: List[List[str]]) -> List[List[str]]:
+    """
+    Filter out non-informative tokens sourced from our word lists resource and stop tokens.
+    """
+    non_informative_words = get_non_informative_words()
+
+    filtered_tweets = []
+    for tweet in tweets:
+        lowered = [word.lower() for word in tweet]
+        filtered_tweets.append([word for word in lowered if word not in non_informative_words])
     return filtered_tweets
 
 
-def get_frequency_distribution(filtered_tweets: List[List[str]], company_name: str):
+@dataclass
+class EncodedTweets:
     """
-    Getting frequency distribution of individual words and bigrams
+    Informative tokens of a batch of tweets as integer ids into a vocabulary.
+    """
+
+    # ids of every tweet's informative tokens, concatenated in tweet order
+    token_ids: np.ndarray
+    # token_ids[offsets[i]:offsets[i + 1]] are the tokens of tweet i
+    offsets: np.ndarray
+    # words by id, in order of first occurrence
+    vocabulary: List[str]
+
+
+def encode_tweets(
+    tweets: Iterable[str], excluded_words: Optional[FrozenSet[str]] = None
+) -> EncodedTweets:
+    """
+    Tokenizes tweets and maps their informative lowercased tokens to integer ids.
+    Retweets and other repeated texts are tokenized once, and each distinct raw token
+    is lowercased and checked against the word lists once.
+    Pass excluded_words to drop other words than the non-informative ones.
     """
-    flat_list = [word for sublist in filtered_tweets for word in sublist]
+    text_ids, texts = pd.factorize(pd.Series(list(tweets), dtype=object))
+
+    tokenizer = get_tokenizer()
+    tokenized_texts = [tokenizer.tokenize(text) for text in texts]
+    text_lengths = np.fromiter(
+        (len(tokens) for tokens in tokenized_texts),
+        dtype=np.int64,
+        count=len(tokenized_texts),
+    )
 
-    word_freq = defaultdict(int)
-    bigram_freq = defaultdict(int)
+    raw_token_ids: Dict[str, int] = {}
+    raw_ids = np.fromiter(
+        (
+            raw_token_ids.setdefault(token, len(raw_token_ids))
+            for tokens in tokenized_texts
+            for token in tokens
+        ),
+        dtype=np.int64,
+        count=int(text_lengths.sum()),
+    )
+
+    # raw tokens differing only in case share a word id, non-informative tokens map to -1
+    non_informative_words = (
+        get_non_informative_words() if excluded_words is None else excluded_words
+    )
+    word_ids: Dict[str, int] = {}
+    raw_to_word = np.full(len(raw_token_ids), -1, dtype=np.int64)
+    for raw_token, raw_id in raw_token_ids.items():
+        word = raw_token.lower()
+        if word not in non_informative_words:
+            raw_to_word[raw_id] = word_ids.setdefault(word, len(word_ids))
+
+    # informative token ids of each distinct text
+    text_token_ids = raw_to_word[raw_ids]
+    informative = text_token_ids >= 0
+    text_of_token = np.repeat(np.arange(len(texts)), text_lengths)
+    text_lengths = np.bincount(text_of_token[informative], minlength=len(texts))
+    text_token_ids = text_token_ids[informative]
+    text_offsets = np.cumsum(text_lengths) - text_lengths
+
+    # expand the distinct texts back to every tweet in order
+    tweet_lengths = text_lengths[text_ids]
+    offsets = np.zeros(len(text_ids) + 1, dtype=np.int64)
+    np.cumsum(tweet_lengths, out=offsets[1:])
+    token_positions = np.arange(offsets[-1]) + np.repeat(
+        text_offsets[text_ids] - offsets[:-1], tweet_lengths
+    )
+    return EncodedTweets(text_token_ids[token_positions], offsets, list(word_ids))
 
-    for word in flat_list:
-        word_freq[word] += 1
-    for bigram in bigrams(flat_list):
-        bigram_freq[bigram] += 1
 
-    # Getting top 10 words and bigrams
-    top_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:10]
-    top_bigrams = sorted(bigram_freq.items(), key=lambda x: x[1], reverse=True)[:10]
+@dataclass
+class NgramCounts:
+    """
+    Distinct n-grams of a batch of tweets with their (weighted) counts.
+    """
 
-    # Writing to csv
-    df_top_words = pd.DataFrame(top_words, columns=['word', 'frequency'])
-    df_top_bigrams = pd.DataFrame(top_bigrams, columns=['bigram', 'frequency'])
-    df_top_words.to_csv(f'data/processed/companies/{company_name}/top_words.csv', index=False)
-    df_top_bigrams.to_csv(f'data/processed/companies/{company_name}/top_bigrams.csv', index=False)
+    # word ids of each distinct n-gram, one row per n-gram
+    ngrams: np.ndarray
+    counts: np.ndarray
+    # position of each n-gram's first occurrence, used to break ties deterministically
+    first_seen: np.ndarray
+
+
+def get_ngram_windows(encoded_tweets: EncodedTweets, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the start positions of the n-grams that lie within a single tweet,
+    and the tweet each one belongs to.
+    """
+    token_ids = encoded_tweets.token_ids
+    tweet_of_token = np.repeat(
+        np.arange(len(encoded_tweets.offsets) - 1), np.diff(encoded_tweets.offsets)
+    )
+    starts = np.arange(max(len(token_ids) - n + 1, 0))
+    starts = starts[tweet_of_token[starts] == tweet_of_token[starts + n - 1]]
+    return starts, tweet_of_token[starts]
+
+
+def count_ngrams(
+    encoded_tweets: EncodedTweets, n: int, weights: Optional[np.ndarray] = None
+) -> NgramCounts:
+    """
+    Counts the n-grams inside each tweet, never across tweet boundaries.
+    With weights, each occurrence counts the weight of its tweet instead of 1.
+    """
+    if n < 1:
+        raise ValueError(f"n-gram size must be at least 1, got {n}")
+
+    starts, tweets = get_ngram_windows(encoded_tweets, n)
+    windows = encoded_tweets.token_ids[starts[:, None] + np.arange(n)]
+
+    vocabulary_size = max(len(encoded_tweets.vocabulary), 1)
+    if vocabulary_size**n < np.iinfo(np.int64).max:
+        # encode each n-gram as one integer in base vocabulary_size
+        codes = windows @ (vocabulary_size ** np.arange(n - 1, -1, -1, dtype=np.int64))
+        codes, first_seen, inverse = np.unique(codes, return_index=True, return_inverse=True)
+        ngrams = windows[first_seen]
+    else:
+        ngrams, first_seen, inverse = np.unique(
+            windows, axis=0, return_index=True, return_inverse=True
+        )
+
+    tweet_weights = None if weights is None else weights[tweets]
+    counts = np.bincount(inverse.ravel(), weights=tweet_weights, minlength=len(ngrams))
+    return NgramCounts(ngrams, counts.astype(np.int64), starts[first_seen])
+
+
+def top_k_indices(counts: np.ndarray, first_seen: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the indices of the k largest counts, ties going to the earliest seen.
+    Only the candidates argpartition finds at or above the k-th count get sorted.
+    """
+    if k <= 0 or len(counts) == 0:
+        return np.array([], dtype=np.int64)
+    if k < len(counts):
+        kth_count = counts[np.argpartition(-counts, k - 1)[k - 1]]
+        candidates = np.flatnonzero(counts >= kth_count)
+    else:
+        candidates = np.arange(len(counts))
+    order = np.lexsort((first_seen[candidates], -counts[candidates]))
+    return candidates[order[:k]]
+
+
+def get_top_ngrams(
+    encoded_tweets: EncodedTweets,
+    n: int = 1,
+    k: int = 10,
+    weights: Optional[np.ndarray] = None,
+) -> List[Tuple[Tuple[str, ...], int]]:
+    """
+    Returns the k most frequent n-grams as tuples of words with their counts.
+    """
+    ngram_counts = count_ngrams(encoded_tweets, n, weights)
+    vocabulary = encoded_tweets.vocabulary
+    return [
+        (
+            tuple(vocabulary[word_id] for word_id in ngram_counts.ngrams[index]),
+            int(ngram_counts.counts[index]),
+        )
+        for index in top_k_indices(ngram_counts.counts, ngram_counts.first_seen, k)
+    ]
+
+
+def get_tweet_weights(
+    tweet_list_df: pd.DataFrame, weight_column: Optional[str]
+) -> Optional[np.ndarray]:
+    """
+    Returns per-tweet weights: each tweet counts once plus its weight_column value,
+    e.g. its retweets, times the number of duplicates it stands for.
+    None when the counts are not weighted.
+    """
+    weights = None
+    if weight_column is not None:
+        if weight_column not in THEME_WEIGHT_COLUMNS:
+            raise ValueError(
+                f"Unknown theme weight {weight_column!r}, expected one of {THEME_WEIGHT_COLUMNS}"
+            )
+        values = tweet_list_df[weight_column].fillna(0).to_numpy(dtype=np.int64)
+        weights = 1 + np.clip(values, 0, None)
+    if "multiplicity" in tweet_list_df:
+        multiplicity = tweet_list_df["multiplicity"].to_numpy(dtype=np.int64)
+        weights = multiplicity if weights is None else weights * multiplicity
+    return weights
+
+
+def get_top_terms(
+    encoded_tweets: EncodedTweets,
+    top_k: int = 10,
+    weights: Optional[np.ndarray] = None,
+) -> Tuple[List[Tuple[str, int]], List[Tuple[Tuple[str, ...], int]]]:
+    """
+    Returns the top_k words and bigrams of the encoded tweets.
+    """
+    top_words = [
+        (word, frequency)
+        for (word,), frequency in get_top_ngrams(encoded_tweets, 1, top_k, weights)
+    ]
+    top_bigrams = get_top_ngrams(encoded_tweets, 2, top_k, weights)
+    return top_words, top_bigrams
+
+
+def get_frequency_distribution(
+    encoded_tweets: EncodedTweets,
+    company_name: str,
+    top_k: int = 10,
+    weights: Optional[np.ndarray] = None,
+):
+    """
+    Getting frequency distribution of individual words and bigrams
+    """
+    top_words, top_bigrams = get_top_terms(encoded_tweets, top_k, weights)
+    write_top_terms(top_words, top_bigrams, company_name)
 
 
 def theme_analyzer_main(tweet_list_df: pd.DataFrame):
     """
     Process list of company data frames and analyze themes.
     """
-    filtered_tweets = []
+    company_name = tweet_list_df["company_name"].iloc[0]
+    with run_report.stage("themes", company_name, rows_in=len(tweet_list_df)):
+        encoded_tweets = encode_tweets(tweet_list_df["text"])
+        get_frequency_distribution(
+            encoded_tweets,
+            company_name,
+            top_k=settings.top_k,
+            weights=get_tweet_weights(tweet_list_df, settings.theme_weight),
+        )
+
+
+def get_ngram_terms(ngrams: np.ndarray, vocabulary: List[str]) -> List[str]:
+    """
+    Returns each n-gram of word ids as its words joined by NGRAM_SEPARATOR.
+    """
+    return [NGRAM_SEPARATOR.join(vocabulary[word_id] for word_id in ngram) for ngram in ngrams]
+
+
+def sketch_ngrams(
+    texts: pa.StringArray,
+    weights: Optional[np.ndarray],
+    epsilon: float,
+    delta: float,
+    chunk_size: int = THEME_CHUNK_SIZE,
+) -> Dict[int, TermSketch]:
+    """
+    Counts words and bigrams into sketches chunk by chunk, so only one chunk's exact counts
+    are held at a time. Returns the sketches by n-gram size.
+    """
+    sketches = {n: TermSketch(epsilon, delta) for n in (1, 2)}
+    for start in range(0, len(texts), chunk_size):
+        encoded_tweets = encode_tweets(texts.slice(start, chunk_size).to_pylist())
+        chunk_weights = None if weights is None else weights[start : start + chunk_size]
+        for n, sketch in sketches.items():
+            ngram_counts = count_ngrams(encoded_tweets, n, chunk_weights)
+            sketch.update(
+                get_ngram_terms(ngram_counts.ngrams, encoded_tweets.vocabulary),
+                ngram_counts.counts,
+            )
+    return sketches
+
+
+@dataclass
+class CompanyThemeTask:
+    """
+    What a worker needs to extract one company's themes.
+    """
+
+    company_name: str
+    # tweet texts as an arrow string array, which pickles as two flat buffers
+    texts: pa.StringArray
+    weights: Optional[np.ndarray]
+    top_k: int
+    # count with sketches of this relative error instead of exactly
+    sketch_epsilon: Optional[float] = None
+    sketch_delta: float = 0.01
+
+
+@dataclass
+class CompanyThemes:
+    """
+    A company's top words and bigrams.
+    """
+
+    company_name: str
+    top_words: List[Tuple[str, int]]
+    top_bigrams: List[Tuple[Tuple[str, ...], int]]
+    # in approximate mode, how much each frequency may overcount
+    word_errors: Optional[List[int]] = None
+    bigram_errors: Optional[List[int]] = None
+    # timing of the extraction, measured in the process that ran it
+    record: Optional[StageRecord] = None
+
+
+def get_company_theme_task(tweet_list_df: pd.DataFrame) -> CompanyThemeTask:
+    """
+    Packs the columns of a company's tweets the theme extraction reads.
+    """
+    return CompanyThemeTask(
+        company_name=tweet_list_df["company_name"].iloc[0],
+        texts=pa.array(tweet_list_df["text"], type=pa.string(), from_pandas=True),
+        weights=get_tweet_weights(tweet_list_df, settings.theme_weight),
+        top_k=settings.top_k,
+        sketch_epsilon=settings.sketch_epsilon if settings.approximate_themes else None,
+        sketch_delta=settings.sketch_delta,
+    )
+
+
+def extract_company_themes(task: CompanyThemeTask) -> CompanyThemes:
+    """
+    Returns a company's top words and bigrams, exactly or from sketches.
+    """
+    with time_stage("themes", task.company_name, rows_in=len(task.texts)) as record:
+        themes = count_company_themes(task)
+        record.rows_out = len(themes.top_words) + len(themes.top_bigrams)
+    themes.record = record
+    return themes
+
+
+def count_company_themes(task: CompanyThemeTask) -> CompanyThemes:
+    """
+    Counts a company's top words and bigrams, exactly or from sketches.
+    """
+    if task.sketch_epsilon is None:
+        encoded_tweets = encode_tweets(task.texts.to_pylist())
+        return CompanyThemes(
+            task.company_name, *get_top_terms(encoded_tweets, task.top_k, task.weights)
+        )
+
+    sketches = sketch_ngrams(task.texts, task.weights, task.sketch_epsilon, task.sketch_delta)
+    top_words = sketches[1].top_k(task.top_k)
+    top_bigrams = sketches[2].top_k(task.top_k)
+    return CompanyThemes(
+        company_name=task.company_name,
+        top_words=[(estimate.term, estimate.frequency) for estimate in top_words],
+        top_bigrams=[
+            (tuple(estimate.term.split(NGRAM_SEPARATOR)), estimate.frequency)
+            for estimate in top_bigrams
+        ],
+        word_errors=[estimate.error for estimate in top_words],
+        bigram_errors=[estimate.error for estimate in top_bigrams],
+    )
+
+
+def _init_theme_worker(parent_settings: Settings):
+    settings.__dict__.update(parent_settings.__dict__)
+
+
+def run_theme_analysis(data_frames: Iterable[pd.DataFrame], jobs: int = 1):
+    """
+    Extracts every company's themes across jobs processes and writes them from this process,
+    in the order of data_frames. Companies without tweets are skipped.
+    """
+    tasks = [
+        get_company_theme_task(data_frame) for data_frame in data_frames if len(data_frame) > 0
+    ]
+    # fetch missing NLTK data once here, workers then only read it
+    get_non_informative_words()
 
-    for tweet in tweet_list_df["text"]:
-        tokenized_tweet = tokenize([tweet])
-        filtered_tweet = filter_out_non_informative_tokens(tokenized_tweet)
-        filtered_tweets.extend(filtered_tweet)
+    if jobs <= 1 or len(tasks) <= 1:
+        results = map(extract_company_themes, tasks)
+        pool = None
+    else:
+        # spawned, not forked: the parent has already run pyarrow's and possibly torch's
+        # thread pools, which a forked child inherits in a broken state
+        context = multiprocessing.get_context("spawn")
+        pool = context.Pool(
+            processes=min(jobs, len(tasks)),
+            initializer=_init_theme_worker,
+            initargs=(settings,),
+        )
+        results = pool.imap(extract_company_themes, tasks)
 
-    get_frequency_distribution(filtered_tweets, tweet_list_df["company_name"].iloc[0])
+    try:
+        for themes in results:
+            run_report.add(themes.record)
+            write_top_terms(
+                themes.top_words,
+                themes.top_bigrams,
+                themes.company_name,
+                word_errors=themes.word_errors,
+                bigram_errors=themes.bigram_errors,
+            )
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
@@ -0,0 +1,81 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# sentiment model backends, see src/models/sentiment_backends.py
+BACKEND_NAMES = ["pytorch", "quantized", "onnx"]
+REFERENCE_BACKEND = "pytorch"
+
+# tweet columns theme counts can be weighted by, see src/processing/theme_analyzer.py
+THEME_WEIGHT_COLUMNS = ["retweet_count", "user_followers_count"]
+
+
+@dataclass
+class Settings:
+    """
+    Pipeline settings, filled in from the command line by main.py
+    """
+
+    # sentiment inference processes on CPU, 1 keeps inference in the main process
+    workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    # torch threads per inference process, defaults to the cores divided among the workers
+    threads_per_worker: Optional[int] = None
+    # sentiment model backend: "pytorch", "quantized" (int8) or "onnx"
+    backend: str = REFERENCE_BACKEND
+    # use only locally available models and NLTK data, failing fast when they are missing
+    offline: bool = False
+    # also write every parquet output as csv
+    csv_export: bool = True
+    # only process raw files that changed since the last run, see src/processing/manifest.py
+    incremental: bool = False
+    # collapse duplicate and near-duplicate tweets into one row with a multiplicity column
+    dedup: bool = False
+    # estimated Jaccard similarity of character shingles above which tweets collapse
+    dedup_similarity: float = 0.8
+    # theme analysis processes, one company per task
+    jobs: int = field(default_factory=lambda: os.cpu_count() or 1)
+    # number of top words and bigrams kept per company
+    top_k: int = 10
+    # weight theme counts by a tweet column, e.g. "retweet_count", instead of counting each
+    # tweet once
+    theme_weight: Optional[str] = None
+    # count themes with fixed-size sketches instead of exact counts, see src/features/sketches.py
+    approximate_themes: bool = False
+    # sketch counts overcount by at most epsilon times the total, with probability 1 - delta
+    sketch_epsilon: float = 1e-4
+    sketch_delta: float = 0.01
+    # tweet languages, from the raw lang column, scored by the sentiment model; tweets in other
+    # languages are skipped at ingest and counted. "und" is Twitter's undetermined language,
+    # which tweets without a lang count as
+    languages: List[str] = field(default_factory=lambda: ["en", "und"])
+    # languages scored by another model,
+    # e.g. {"es": "cardiffnlp/twitter-xlm-roberta-base-sentiment"}
+    language_models: Dict[str, str] = field(default_factory=dict)
+    # score with the distilled model first and send only tweets it is unsure of to the transformer
+    cascade: bool = False
+    # distilled-model confidence at or above which its label is kept
+    cascade_threshold: float = 0.9
+    # share of the distilled model's confident tweets also scored by the transformer, to measure
+    # agreement
+    cascade_validation_rate: float = 0.02
+    # most tweets labeled by the transformer to train the distilled model on,
+    # see src/processing/distillation.py
+    distill_size: int = 200_000
+    # service mode: tail this JSON lines file and/or listen on this local port for tweet records
+    stream_file: Optional[str] = None
+    stream_port: Optional[int] = None
+    stream_host: str = "127.0.0.1"
+    # keep tailing stream_file for appended lines instead of stopping at its end
+    stream_follow: bool = True
+    # a micro-batch is scored once it holds this many tweets or its oldest tweet waited this long
+    stream_max_batch_size: int = 64
+    stream_max_wait_ms: float = 200.0
+    # tweets queued before the sources wait for the scorer
+    stream_queue_size: int = 10_000
+    # JSON report of per-stage timings, row counts, memory and model batch latencies
+    run_report_path: str = "data/processed/run_report.json"
+    # dump a cProfile of the run here, off by default
+    profile_path: Optional[str] = None
+
+
+settings = Settings()
@@ -1,3 +1,5 @@
+from typing import Dict, List
+
 yogurt_keywords = [
     "yogurt",
     "yoghurt",
@@ -80,3 +82,78 @@ secondary_yogurt_brand_accounts = [
     "@uk_lactalis",
     "@yocrunch",
 ]
+
+# keywords added to the shared lists above for tweets in another language, by Twitter lang code;
+# matching is by substring, so words that are part of common unrelated words are left out
+language_keywords: Dict[str, Dict[str, List[str]]] = {
+    "es": {
+        "yogurt_keywords": ["yogur", "probiótico"],
+        "food_related_keywords": [
+            "delicioso",
+            "sabroso",
+            "saludable",
+            "desayuno",
+            "lácteo",
+            "cremoso",
+            "proteína",
+            "merienda",
+            "postre",
+            "nutritivo",
+        ],
+    },
+    "fr": {
+        "yogurt_keywords": ["yaourt", "yogourt", "probiotique"],
+        "food_related_keywords": [
+            "délicieux",
+            "savoureux",
+            "petit-déjeuner",
+            "petit déjeuner",
+            "laitier",
+            "crémeux",
+            "protéine",
+            "goûter",
+            "nutritif",
+        ],
+    },
+    "de": {
+        "yogurt_keywords": ["joghurt", "jogurt", "probiotisch"],
+        "food_related_keywords": [
+            "lecker",
+            "gesund",
+            "frühstück",
+            "milchprodukt",
+            "cremig",
+            "eiweiß",
+            "nachtisch",
+            "nahrhaft",
+        ],
+    },
+    "pt": {
+        "yogurt_keywords": ["iogurte", "probiótico"],
+        "food_related_keywords": [
+            "delicioso",
+            "gostoso",
+            "saudável",
+            "café da manhã",
+            "laticínio",
+            "cremoso",
+            "proteína",
+            "lanche",
+            "sobremesa",
+            "nutritivo",
+        ],
+    },
+    "it": {
+        "yogurt_keywords": ["probiotico"],
+        "food_related_keywords": [
+            "delizioso",
+            "gustoso",
+            "colazione",
+            "latticini",
+            "cremoso",
+            "proteine",
+            "merenda",
+            "nutriente",
+        ],
+    },
+}
@@ -0,0 +1,38 @@
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from benchmarks.pipeline_scaling import StubSentimentModel, reset_process_state
+from src.processing import sentiment_analysis
+from src.resources.settings import settings
+
+
+@pytest.fixture(autouse=True)
+def restore_settings():
+    """
+    Restores the pipeline settings a test changed.
+    """
+    saved = dict(settings.__dict__)
+    yield
+    settings.__dict__.clear()
+    settings.__dict__.update(saved)
+
+
+@pytest.fixture
+def pipeline_directory(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    Runs the test in an empty working directory with data/raw, as the pipeline uses relative
+    paths, scoring sentiment with the stub model of the benchmarks in this process.
+    """
+    (tmp_path / "data" / "raw").mkdir(parents=True)
+    (tmp_path / "data" / "processed" / "companies").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    settings.workers = 1
+    settings.csv_export = False
+    reset_process_state()
+    with mock.patch.object(
+        sentiment_analysis, "get_sentiment_analyzer", return_value=StubSentimentModel()
+    ):
+        yield tmp_path
+    reset_process_state()
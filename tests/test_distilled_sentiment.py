@@ -0,0 +1,65 @@
+from typing import List, Tuple
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_corpus import CorpusSpec, generate_texts
+from src.models.distilled_sentiment import DistilledSentimentModel
+from src.processing.sentiment_analysis import SENTIMENT_LABELS
+
+ROWS = 20_000
+
+
+def split(texts: List[str], labels: np.ndarray, rng: np.random.Generator) -> List[Tuple]:
+    """
+    Splits texts and labels into train, calibration and validation slices.
+    """
+    slices = np.minimum((rng.random(len(texts)) * 5).astype(int), 2)
+    return [
+        ([text for text, slice_ in zip(texts, slices) if slice_ == part], labels[slices == part])
+        for part in range(3)
+    ]
+
+
+@pytest.fixture(scope="module")
+def texts() -> List[str]:
+    return generate_texts(CorpusSpec(rows=ROWS), ROWS, np.random.default_rng(0)).tolist()
+
+
+def test_calibrated_confidence_of_labels_without_signal(texts: List[str]):
+    rng = np.random.default_rng(1)
+    labels = np.array(SENTIMENT_LABELS, dtype=object)[rng.integers(0, 3, len(texts))]
+    train, calibration, validation = split(texts, labels, rng)
+    model = DistilledSentimentModel.fit(*train, label_names=SENTIMENT_LABELS)
+    model.calibrate(*calibration)
+    confidences = model.predict_proba(validation[0]).max(axis=1)
+    assert (confidences >= 0.9).mean() == 0.0
+
+
+def test_calibrated_confidence_of_labels_with_signal(texts: List[str]):
+    def label(text: str) -> str:
+        words = set(text.split())
+        return "positive" if "love" in words else "negative" if "gross" in words else "neutral"
+
+    rng = np.random.default_rng(1)
+    labels = np.array([label(text) for text in texts], dtype=object)
+    train, calibration, validation = split(texts, labels, rng)
+    model = DistilledSentimentModel.fit(*train, label_names=SENTIMENT_LABELS)
+    model.calibrate(*calibration)
+    probabilities = model.predict_proba(validation[0])
+    kept = probabilities.max(axis=1) >= 0.9
+    predicted = np.array(model.labels, dtype=object)[probabilities.argmax(axis=1)]
+    assert kept.mean() > 0.5
+    assert (predicted[kept] == validation[1][kept]).mean() > 0.95
+
+
+def test_save_and_load_keep_the_temperature(tmp_path, texts: List[str]):
+    labels = np.array(SENTIMENT_LABELS, dtype=object)[np.arange(1000) % 3]
+    model = DistilledSentimentModel.fit(texts[:1000], labels, label_names=SENTIMENT_LABELS)
+    model.temperature = 2.5
+    model.save(tmp_path / "model.npz")
+    loaded = DistilledSentimentModel.load(tmp_path / "model.npz")
+    assert loaded.temperature == 2.5
+    np.testing.assert_allclose(
+        loaded.predict_proba(texts[:50]), model.predict_proba(texts[:50]), rtol=1e-5
+    )
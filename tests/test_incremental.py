@@ -0,0 +1,160 @@
+import shutil
+from pathlib import Path
+from typing import Dict, Tuple
+
+import pandas as pd
+import pytest
+
+from benchmarks.pipeline_scaling import reset_process_state
+from benchmarks.synthetic_corpus import CorpusSpec, iter_corpus_files
+from src.processing.preprocess import preprocess_data
+from src.processing.rollup import ROLLUP_KEYS
+from src.processing.storage import (
+    ROLLUP_DATASET,
+    TWEETS_DATASET,
+    list_companies,
+    read_company_rollup,
+    read_company_tweets,
+)
+from src.resources.settings import settings
+
+# every raw file of the tests, the first run sees a and b
+CORPUS_FILES = ["a.csv", "b.csv", "changed_b.csv", "c.csv"]
+
+
+@pytest.fixture(scope="module")
+def raw_files() -> Dict[str, pd.DataFrame]:
+    """
+    Synthetic raw files with duplicates across them, by name: every later file starts with
+    exact and near copies of tweets of the files before it.
+    """
+    spec = CorpusSpec(rows=4 * 400, rows_per_file=400, duplicate_rate=0.2)
+    files = dict(zip(CORPUS_FILES, iter_corpus_files(spec)))
+    for position, name in enumerate(CORPUS_FILES[1:]):
+        source = files[CORPUS_FILES[position]]
+        copies = files[name]
+        copies.loc[:49, "text"] = source["text"].iloc[100:150].to_numpy()
+        copies.loc[50:99, "text"] = (source["text"].iloc[150:200] + " again").to_numpy()
+    return files
+
+
+def write_raw_files(raw_files: Dict[str, pd.DataFrame], names: Dict[str, str]):
+    """
+    Writes raw files to data/raw, names maps each written name to the corpus file it holds.
+    """
+    raw_directory = Path("data/raw")
+    for stale_file in raw_directory.glob("*.csv"):
+        stale_file.unlink()
+    for name, corpus_file in names.items():
+        raw_files[corpus_file].to_csv(raw_directory / name, index=False)
+
+
+def read_outputs() -> Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
+    """
+    Returns every company's stored tweets and rollup, sorted so that runs can be compared.
+    """
+    tweets = {
+        company_name: read_company_tweets(company_name)
+        .sort_values(["source_file", "Key"], ignore_index=True)
+        .astype({"source_file": str, "sentiment": str, "company_name": str})
+        for company_name in list_companies(TWEETS_DATASET)
+    }
+    rollups = {
+        company_name: read_company_rollup(company_name)
+        .astype({key: str for key in ROLLUP_KEYS if key != "bucket"})
+        .sort_values(ROLLUP_KEYS, ignore_index=True)
+        for company_name in list_companies(ROLLUP_DATASET)
+    }
+    return tweets, rollups
+
+
+def run_pipeline_twice(raw_files: Dict[str, pd.DataFrame]):
+    """
+    Processes a and b, then incrementally the changed b, the new c and the removed a.
+    """
+    settings.incremental = True
+    write_raw_files(raw_files, {"a.csv": "a.csv", "b.csv": "b.csv"})
+    preprocess_data()
+    write_raw_files(raw_files, {"b.csv": "changed_b.csv", "c.csv": "c.csv"})
+    preprocess_data()
+
+
+def run_full_rebuild(
+    raw_files: Dict[str, pd.DataFrame], names: Dict[str, str]
+) -> Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
+    """
+    Processes raw files from scratch, without the outputs and cache of earlier runs,
+    and returns the outputs.
+    """
+    shutil.rmtree("data/processed")
+    shutil.rmtree("data/cache", ignore_errors=True)
+    Path("data/processed/companies").mkdir(parents=True)
+    reset_process_state()
+    settings.incremental = False
+    write_raw_files(raw_files, names)
+    preprocess_data()
+    return read_outputs()
+
+
+def assert_outputs_equal(
+    incremental_outputs: Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]],
+    full_outputs: Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]],
+):
+    incremental_tweets, incremental_rollups = incremental_outputs
+    full_tweets, full_rollups = full_outputs
+    assert incremental_tweets.keys() == full_tweets.keys()
+    assert incremental_rollups.keys() == full_rollups.keys()
+    for company_name, tweets in full_tweets.items():
+        pd.testing.assert_frame_equal(
+            incremental_tweets[company_name], tweets, check_dtype=False, obj=company_name
+        )
+    for company_name, rollup in full_rollups.items():
+        pd.testing.assert_frame_equal(
+            incremental_rollups[company_name], rollup, check_dtype=False, obj=company_name
+        )
+
+
+@pytest.mark.parametrize("dedup", [False, True])
+def test_incremental_run_equals_full_rebuild(
+    pipeline_directory: Path, raw_files: Dict[str, pd.DataFrame], dedup: bool
+):
+    settings.dedup = dedup
+    run_pipeline_twice(raw_files)
+    incremental_outputs = read_outputs()
+    full_outputs = run_full_rebuild(raw_files, {"b.csv": "changed_b.csv", "c.csv": "c.csv"})
+    assert_outputs_equal(incremental_outputs, full_outputs)
+
+
+def test_dedup_collapses_copies_in_an_added_raw_file(
+    pipeline_directory: Path, raw_files: Dict[str, pd.DataFrame]
+):
+    settings.dedup = True
+    first = raw_files["a.csv"]
+    added = raw_files["c.csv"].copy()
+    # exact and near copies of tweets of the file processed first
+    added.loc[:99, "text"] = first["text"].iloc[:100].to_numpy()
+    added.loc[100:199, "text"] = (first["text"].iloc[100:200] + " again").to_numpy()
+    files = {"a.csv": first, "c.csv": added}
+
+    settings.incremental = True
+    write_raw_files(files, {"a.csv": "a.csv"})
+    preprocess_data()
+    write_raw_files(files, {"a.csv": "a.csv", "c.csv": "c.csv"})
+    preprocess_data()
+    incremental_outputs = read_outputs()
+    full_outputs = run_full_rebuild(files, {"a.csv": "a.csv", "c.csv": "c.csv"})
+
+    full_tweets, _ = full_outputs
+    assert any((tweets["multiplicity"] > 1).any() for tweets in full_tweets.values())
+    assert_outputs_equal(incremental_outputs, full_outputs)
+
+
+def test_removed_raw_file_leaves_no_rows(
+    pipeline_directory: Path, raw_files: Dict[str, pd.DataFrame]
+):
+    run_pipeline_twice(raw_files)
+    tweets, rollups = read_outputs()
+    for company_tweets in tweets.values():
+        assert set(company_tweets["source_file"]) <= {"data/raw/b.csv", "data/raw/c.csv"}
+    for rollup in rollups.values():
+        assert set(rollup["source_file"]) <= {"data/raw/b.csv", "data/raw/c.csv"}
@@ -0,0 +1,132 @@
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_corpus import CorpusSpec, generate_texts
+from src.features.inverted_index import (
+    InvertedIndex,
+    decode_varints,
+    encode_varints,
+    tokenize_query_words,
+)
+from src.features.tweet_search import build_tweet_index, search_tweets
+
+
+@pytest.fixture(scope="module")
+def tweets() -> pd.DataFrame:
+    """
+    Scored synthetic tweets of two brands.
+    """
+    rng = np.random.default_rng(0)
+    rows = 2000
+    return pd.DataFrame(
+        {
+            "company_name": rng.choice(["fage", "chobani"], rows),
+            "datetime": pd.Timestamp("2017-06-01") + pd.to_timedelta(np.arange(rows), "min"),
+            "sentiment": rng.choice(["negative", "neutral", "positive"], rows),
+            "sentiment_score": rng.random(rows),
+            "text": generate_texts(CorpusSpec(rows=rows), rows, rng),
+        }
+    )
+
+
+@pytest.fixture(scope="module")
+def tweet_words(tweets: pd.DataFrame) -> List[List[str]]:
+    return [tokenize_query_words(text) for text in tweets["text"]]
+
+
+@pytest.fixture(scope="module")
+def index(tweets: pd.DataFrame, tmp_path_factory: pytest.TempPathFactory) -> InvertedIndex:
+    """
+    The index of the tweets, saved and memory-mapped back as the search CLI opens it.
+    """
+    directory: Path = tmp_path_factory.mktemp("index")
+    InvertedIndex.from_frame(tweets).save(directory)
+    return InvertedIndex.load(directory)
+
+
+def has_phrase(words: List[str], phrase: List[str]) -> bool:
+    return any(
+        words[start : start + len(phrase)] == phrase
+        for start in range(len(words) - len(phrase) + 1)
+    )
+
+
+def brute_force(predicate, tweets: pd.DataFrame, tweet_words: List[List[str]]) -> List[int]:
+    return [
+        position
+        for position, (words, row) in enumerate(zip(tweet_words, tweets.itertuples()))
+        if predicate(words, row)
+    ]
+
+
+def test_varints_round_trip():
+    values = np.array([0, 1, 127, 128, 16383, 16384, 2**21, 2**28 - 1, 2**35 - 1])
+    np.testing.assert_array_equal(decode_varints(encode_varints(values)), values)
+
+
+def test_postings_of_every_word(index: InvertedIndex, tweet_words: List[List[str]]):
+    expected = {}
+    for position, words in enumerate(tweet_words):
+        for word in set(words):
+            expected.setdefault(word, []).append(position)
+    for word, positions in expected.items():
+        assert index.get_postings(word).tolist() == positions, word
+    assert index.get_postings("not-a-word").tolist() == []
+
+
+@pytest.mark.parametrize(
+    "query, predicate",
+    [
+        ("yogurt", lambda words, row: "yogurt" in words),
+        ('"love today"', lambda words, row: has_phrase(words, ["love", "today"])),
+        (
+            "brand:fage sentiment:negative",
+            lambda words, row: row.company_name == "fage" and row.sentiment == "negative",
+        ),
+        (
+            "love OR protein",
+            lambda words, row: "love" in words or "protein" in words,
+        ),
+        (
+            "breakfast AND NOT (brand:chobani OR sentiment:positive)",
+            lambda words, row: "breakfast" in words
+            and not (row.company_name == "chobani" or row.sentiment == "positive"),
+        ),
+    ],
+)
+def test_queries_match_brute_force(
+    index: InvertedIndex, tweets: pd.DataFrame, tweet_words: List[List[str]], query, predicate
+):
+    expected = brute_force(predicate, tweets, tweet_words)
+    assert expected, f"no tweet matches {query!r}, the corpus does not exercise it"
+    results = search_tweets(index, query, page_size=len(tweets))
+    assert results.total == len(expected)
+    pd.testing.assert_frame_equal(
+        results.tweets,
+        tweets.iloc[expected].reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_pages_split_results(index: InvertedIndex):
+    everything = search_tweets(index, "yogurt", page_size=10_000).tweets
+    pages = [search_tweets(index, "yogurt", page=page, page_size=7).tweets for page in (1, 2)]
+    pd.testing.assert_frame_equal(pd.concat(pages, ignore_index=True), everything.iloc[:14])
+
+
+@pytest.mark.parametrize("query", ["", "yogurt AND", "(yogurt", "yogurt )"])
+def test_invalid_queries_raise(index: InvertedIndex, query: str):
+    with pytest.raises(ValueError):
+        search_tweets(index, query)
+
+
+def test_index_of_an_empty_store_finds_nothing(pipeline_directory: Path):
+    build_tweet_index(pipeline_directory / "index")
+    index = InvertedIndex.load(pipeline_directory / "index")
+    results = search_tweets(index, "yogurt brand:fage")
+    assert results.total == 0
+    assert results.tweets.empty
@@ -0,0 +1,99 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_corpus import CorpusSpec, generate_texts
+from src.processing.keyword_matcher import (
+    KeywordMatcher,
+    brand_relevance_mask,
+    get_brand_keywords,
+    get_keyword_matcher,
+    negative_keyword_mask,
+)
+from src.resources.brands_data import Brand, brands
+from src.resources.word_lists import (
+    food_related_keywords,
+    secondary_yogurt_brand_accounts,
+    secondary_yogurt_brands,
+    yogurt_brand_accounts,
+    yogurt_brand_names,
+    yogurt_keywords,
+)
+
+
+def contains_any(texts: pd.Series, keywords: List[str]) -> np.ndarray:
+    """
+    Substring search of every keyword in every lowercased text, as the filters did
+    before the matcher.
+    """
+    lowered = texts.fillna("").str.lower()
+    return np.array(
+        [any(keyword.lower() in text for keyword in keywords if keyword) for text in lowered],
+        dtype=bool,
+    )
+
+
+def baseline_relevance_mask(texts: pd.Series, brand: Brand) -> np.ndarray:
+    """
+    The per-brand relevance filter the matcher replaced, without a keyword scan per brand.
+    """
+    mentions_brand = contains_any(texts, get_brand_keywords(brand))
+    if not brand.is_nonspecific_name:
+        return mentions_brand
+    other_brand_names = [name for name in yogurt_brand_names if name != brand.brand_name.lower()]
+    return mentions_brand & contains_any(
+        texts,
+        yogurt_keywords
+        + food_related_keywords
+        + other_brand_names
+        + yogurt_brand_accounts
+        + secondary_yogurt_brands
+        + secondary_yogurt_brand_accounts,
+    )
+
+
+@pytest.fixture(scope="module")
+def texts() -> pd.Series:
+    """
+    Synthetic tweets mentioning every brand, with some of each brand's negative keywords
+    and upper-case copies.
+    """
+    rng = np.random.default_rng(0)
+    synthetic = generate_texts(CorpusSpec(rows=3000, brand_rate=0.8), 3000, rng).tolist()
+    negative = [
+        f"{brand.brand_name} {keyword} today"
+        for brand in brands.values()
+        for keyword in brand.negative_keywords
+    ]
+    return pd.Series(synthetic + negative + [text.upper() for text in synthetic[:300]] + [None])
+
+
+def test_groups_match_substring_search():
+    keyword_groups = {
+        "greek": ["greek"],
+        "greek_yogurt": ["greek yogurt"],
+        # found inside the longer keywords of the other groups
+        "inner": ["ek yo", "gurt"],
+        "handle": ["@Chobani"],
+        "empty": [],
+    }
+    texts = pd.Series(
+        ["Greek yogurt is great", "greek salad", "@chobani!", "yogurt", "", None, "GREEK YOGURT"]
+    )
+    matches = KeywordMatcher(keyword_groups).match(texts)
+    for group, keywords in keyword_groups.items():
+        np.testing.assert_array_equal(matches.has(group), contains_any(texts, keywords), group)
+
+
+@pytest.mark.parametrize("brand_key", list(brands))
+def test_brand_masks_match_baseline(texts: pd.Series, brand_key: str):
+    brand = brands[brand_key]
+    matches = get_keyword_matcher().match(texts)
+    np.testing.assert_array_equal(
+        brand_relevance_mask(matches, brand), baseline_relevance_mask(texts, brand)
+    )
+    np.testing.assert_array_equal(
+        negative_keyword_mask(matches, brand), contains_any(texts, brand.negative_keywords)
+    )
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.processing.dedup import spread_to_duplicates
+from src.processing.rollup import ROLLUP_KEYS, build_rollup, merge_rollups, summarize_rollup
+from src.processing.storage import merge_company_rollup, write_company_rollup
+
+
+def make_tweets(source_file: str, rows: int, seed: int) -> pd.DataFrame:
+    """
+    Returns scored tweets from one raw file over two weeks, a few without a timestamp.
+    """
+    rng = np.random.default_rng(seed)
+    datetimes = pd.Series(
+        pd.Timestamp("2017-06-01") + pd.to_timedelta(rng.integers(0, 14 * 24 * 3600, rows), "s")
+    )
+    datetimes[rng.random(rows) < 0.05] = pd.NaT
+    return pd.DataFrame(
+        {
+            "datetime": datetimes,
+            "sentiment": rng.choice(["negative", "neutral", "positive"], rows),
+            "sentiment_score": rng.random(rows),
+            "retweet_count": pd.array(rng.integers(0, 5, rows), dtype="Int64"),
+            "user_followers_count": pd.array(rng.integers(0, 1000, rows), dtype="Int64"),
+            "source_file": source_file,
+        }
+    )
+
+
+def sort_rollup(rollup: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns a rollup in key order with plain keys, to compare rollups built differently.
+    """
+    rollup = rollup.astype({key: str for key in ROLLUP_KEYS if key != "bucket"})
+    return rollup.sort_values(ROLLUP_KEYS, ignore_index=True)
+
+
+def assert_rollups_equal(actual: pd.DataFrame, expected: pd.DataFrame):
+    pd.testing.assert_frame_equal(
+        sort_rollup(actual), sort_rollup(expected), check_dtype=False, check_exact=False
+    )
+
+
+def test_merge_equals_rollup_of_all_tweets():
+    first, second = make_tweets("a.csv", 500, 0), make_tweets("b.csv", 300, 1)
+    # the same raw file split in two, so keys are shared and summed
+    third = make_tweets("a.csv", 200, 2)
+    merged = merge_rollups([build_rollup(first), build_rollup(second), build_rollup(third)])
+    assert_rollups_equal(merged, build_rollup(pd.concat([first, second, third])))
+
+
+def test_rollup_counts_tweets_with_a_timestamp():
+    tweets = make_tweets("a.csv", 500, 0)
+    rollup = build_rollup(tweets)
+    for granularity in ["hour", "day", "week"]:
+        counted = rollup.loc[rollup["granularity"] == granularity, "tweets"].sum()
+        assert counted == tweets["datetime"].notna().sum()
+
+
+def test_merge_replaces_stored_rows_of_replaced_files(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.chdir(tmp_path)
+    first, second = make_tweets("a.csv", 400, 0), make_tweets("b.csv", 400, 1)
+    write_company_rollup(build_rollup(pd.concat([first, second])), "fage")
+
+    changed_second, third = make_tweets("b.csv", 250, 3), make_tweets("c.csv", 100, 4)
+    merged = merge_company_rollup(
+        build_rollup(pd.concat([changed_second, third])), "fage", ["b.csv"]
+    )
+    assert_rollups_equal(merged, build_rollup(pd.concat([first, changed_second, third])))
+
+
+def test_summary_shares_sum_to_one():
+    summary = summarize_rollup(build_rollup(make_tweets("a.csv", 500, 0)), "week")
+    np.testing.assert_allclose(summary.groupby("bucket")["share"].sum(), 1.0)
+
+
+def test_spread_to_duplicates_gives_every_copy_its_collapsed_row():
+    collapsed = pd.DataFrame({"sentiment": ["positive", "negative"], "sentiment_score": [0.9, 0.8]})
+    spread = spread_to_duplicates(collapsed, np.array([7, 3]), np.array([3, 7, 7, 3, 3]))
+    assert spread["sentiment"].tolist() == [
+        "negative",
+        "positive",
+        "positive",
+        "negative",
+        "negative",
+    ]
+    assert spread["sentiment_score"].tolist() == [0.8, 0.9, 0.9, 0.8, 0.8]
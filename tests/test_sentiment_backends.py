@@ -0,0 +1,86 @@
+import sys
+from types import SimpleNamespace
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from src.models import sentiment_backends  # pylint: disable=wrong-import-position
+from src.models.sentiment_backends import (  # pylint: disable=wrong-import-position
+    OnnxBackend,
+    load_backend,
+)
+
+LABELS = ["negative", "neutral", "positive"]
+LOGITS = np.array([[2.0, 0.5, -1.0], [-3.0, 0.0, 4.0], [0.1, 0.3, 0.2]], dtype=np.float32)
+
+
+class FakeTokenizer:
+    def __call__(self, texts: List[str], **options) -> Dict[str, np.ndarray]:
+        shape = (len(texts), 4)
+        return {
+            "input_ids": np.ones(shape, dtype=np.int32),
+            "attention_mask": np.ones(shape, dtype=np.int32),
+            "token_type_ids": np.zeros(shape, dtype=np.int32),
+        }
+
+
+class FakeSession:
+    """
+    Stands in for an onnxruntime session of the exported model, returning fixed logits.
+    """
+
+    def __init__(self, *args, **options):
+        self.inputs = None
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask")]
+
+    def run(self, output_names, inputs: Dict[str, np.ndarray]):
+        self.inputs = inputs
+        return [LOGITS[: len(inputs["input_ids"])]]
+
+
+@pytest.fixture
+def onnx_backend(monkeypatch: pytest.MonkeyPatch) -> OnnxBackend:
+    """
+    Loads the ONNX backend without downloading or exporting a model.
+    """
+    monkeypatch.setitem(sys.modules, "onnxruntime", SimpleNamespace(InferenceSession=FakeSession))
+    monkeypatch.setattr(sentiment_backends, "export_onnx_model", lambda *args: "model.onnx")
+    monkeypatch.setattr(
+        sentiment_backends.AutoTokenizer, "from_pretrained", lambda *args: FakeTokenizer()
+    )
+    monkeypatch.setattr(
+        sentiment_backends.AutoConfig,
+        "from_pretrained",
+        lambda *args: SimpleNamespace(id2label=dict(enumerate(LABELS))),
+    )
+    return load_backend(OnnxBackend.name, "some/model", torch.device("cpu"))
+
+
+def test_load_backend_builds_the_named_backend(onnx_backend: OnnxBackend):
+    assert isinstance(onnx_backend, OnnxBackend)
+    assert onnx_backend.labels == LABELS
+
+
+def test_load_backend_rejects_unknown_names():
+    with pytest.raises(ValueError, match="Unknown sentiment backend"):
+        load_backend("tensorrt", "some/model", torch.device("cpu"))
+
+
+def test_onnx_scores_are_the_softmax_of_the_best_logit(onnx_backend: OnnxBackend):
+    results = onnx_backend(["bad", "great", "fine"])
+
+    probabilities = np.exp(LOGITS) / np.exp(LOGITS).sum(axis=1, keepdims=True)
+    assert [label for label, _ in results] == ["negative", "positive", "neutral"]
+    np.testing.assert_allclose(
+        [score for _, score in results], probabilities.max(axis=1), rtol=1e-6
+    )
+    # only the inputs the model declares are fed, as int64
+    inputs = onnx_backend.session.inputs
+    assert set(inputs) == {"input_ids", "attention_mask"}
+    assert all(value.dtype == np.int64 for value in inputs.values())
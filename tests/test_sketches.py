@@ -0,0 +1,71 @@
+from collections import Counter
+from typing import List
+
+import numpy as np
+import pytest
+
+from src.features.sketches import TermSketch
+
+EPSILON = 0.005
+CHUNKS = 8
+
+
+@pytest.fixture(scope="module")
+def chunks() -> List[Counter]:
+    """
+    Exact term counts of chunks of a Zipf-distributed stream, with far more distinct terms
+    than a sketch keeps.
+    """
+    rng = np.random.default_rng(0)
+    ranks = np.minimum(rng.zipf(1.3, 200_000), 20_000)
+    terms = np.array([f"term{rank}" for rank in ranks], dtype=object)
+    return [Counter(chunk) for chunk in np.array_split(terms, CHUNKS)]
+
+
+def sketch_chunk(counts: Counter) -> TermSketch:
+    sketch = TermSketch(EPSILON)
+    sketch.update(list(counts), np.array(list(counts.values())))
+    return sketch
+
+
+def test_true_counts_are_within_error(chunks: List[Counter]):
+    sketch = TermSketch(EPSILON)
+    for counts in chunks:
+        sketch.update(list(counts), np.array(list(counts.values())))
+    true_counts = sum(chunks, Counter())
+    assert len(true_counts) > sketch.heavy_hitters.capacity
+
+    estimates = sketch.top_k(50)
+    for estimate in estimates:
+        true_count = true_counts[estimate.term]
+        assert estimate.frequency - estimate.error <= true_count <= estimate.frequency
+        assert estimate.error <= EPSILON * sum(true_counts.values())
+    exact_top = [term for term, _ in true_counts.most_common(20)]
+    assert [estimate.term for estimate in estimates[:20]] == exact_top
+
+
+def test_merged_chunk_sketches_give_the_same_top_k(chunks: List[Counter]):
+    one_pass = TermSketch(EPSILON)
+    for counts in chunks:
+        one_pass.update(list(counts), np.array(list(counts.values())))
+
+    # pairwise, as partial results of parallel workers would be combined
+    partial = [sketch_chunk(counts) for counts in chunks]
+    while len(partial) > 1:
+        for left, right in zip(partial[::2], partial[1::2]):
+            left.merge(right)
+        partial = partial[::2]
+
+    merged_terms = [estimate.term for estimate in partial[0].top_k(20)]
+    assert merged_terms == [estimate.term for estimate in one_pass.top_k(20)]
+
+
+def test_serialized_sketch_merges_like_the_original(chunks: List[Counter]):
+    sketch = sketch_chunk(chunks[0])
+    restored = TermSketch.from_bytes(sketch.to_bytes())
+    assert restored.top_k(20) == sketch.top_k(20)
+
+    for merged in (sketch, restored):
+        merged.merge(sketch_chunk(chunks[1]))
+    assert restored.top_k(20) == sketch.top_k(20)
+    np.testing.assert_array_equal(restored.count_min.table, sketch.count_min.table)
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from typing import List, Tuple
+
+from src.processing.stream_service import QueuedTweet, StreamService
+
+MAX_WAIT = 0.1
+
+
+async def put_tweets(service: StreamService, count: int):
+    for position in range(count):
+        await service.put({"text": f"tweet {position}"})
+
+
+def run_with_service(scenario, **options):
+    """
+    Runs an async scenario against a new service, shutting its scorer thread down after.
+    """
+
+    async def run():
+        service = StreamService(**options)
+        try:
+            return await scenario(service)
+        finally:
+            service.executor.shutdown(wait=True)
+
+    return asyncio.run(run())
+
+
+def batch_texts(batch: List[QueuedTweet]) -> List[str]:
+    return [record["text"] for _, record in batch]
+
+
+def test_full_batches_are_closed_at_max_batch_size():
+    async def scenario(service: StreamService):
+        await put_tweets(service, 10)
+        return [await service.next_batch() for _ in range(2)]
+
+    batches = run_with_service(scenario, max_batch_size=4, max_wait=60)
+    assert [batch_texts(batch) for batch, _ in batches] == [
+        [f"tweet {position}" for position in range(4)],
+        [f"tweet {position}" for position in range(4, 8)],
+    ]
+    assert not any(closed for _, closed in batches)
+
+
+def test_partial_batch_is_closed_at_deadline():
+    async def scenario(service: StreamService) -> Tuple[List[QueuedTweet], bool, float]:
+        await put_tweets(service, 3)
+        start = time.monotonic()
+        batch, closed = await service.next_batch()
+        return batch, closed, time.monotonic() - start
+
+    batch, closed, waited = run_with_service(scenario, max_batch_size=64, max_wait=MAX_WAIT)
+    assert batch_texts(batch) == ["tweet 0", "tweet 1", "tweet 2"]
+    assert not closed
+    assert MAX_WAIT * 0.8 <= waited < MAX_WAIT + 1.0
+
+
+def test_deadline_counts_from_the_oldest_tweet():
+    async def scenario(service: StreamService) -> Tuple[List[QueuedTweet], float]:
+        await put_tweets(service, 1)
+        await asyncio.sleep(MAX_WAIT * 2)
+        start = time.monotonic()
+        batch, _ = await service.next_batch()
+        return batch, time.monotonic() - start
+
+    batch, waited = run_with_service(scenario, max_batch_size=64, max_wait=MAX_WAIT)
+    assert batch_texts(batch) == ["tweet 0"]
+    assert waited < MAX_WAIT / 2
+
+
+def test_tweets_arriving_before_the_deadline_join_the_batch():
+    async def scenario(service: StreamService) -> List[QueuedTweet]:
+        await put_tweets(service, 1)
+
+        async def put_late():
+            await asyncio.sleep(MAX_WAIT / 4)
+            await service.put({"text": "late"})
+
+        late = asyncio.create_task(put_late())
+        batch, _ = await service.next_batch()
+        await late
+        return batch
+
+    batch = run_with_service(scenario, max_batch_size=64, max_wait=MAX_WAIT)
+    assert batch_texts(batch) == ["tweet 0", "late"]
+
+
+def test_closed_input_ends_the_last_batch():
+    async def scenario(service: StreamService):
+        await put_tweets(service, 2)
+        await service.close_input()
+        return await service.next_batch()
+
+    batch, closed = run_with_service(scenario, max_batch_size=64, max_wait=60)
+    assert batch_texts(batch) == ["tweet 0", "tweet 1"]
+    assert closed
+
+
+def test_closed_empty_input_returns_no_batch():
+    async def scenario(service: StreamService):
+        await service.close_input()
+        return await service.next_batch()
+
+    assert run_with_service(scenario) == ([], True)